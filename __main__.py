@@ -13,6 +13,9 @@
 
 
 # Dependencies
+import time
+# Measure startup time including imports
+startup_started = time.perf_counter()
 import atexit
 import colorama
 # Local dependencies
@@ -27,7 +30,7 @@ hydrabot = None
 # Called on programs shutdown
 def clean_up():
     """Clean up after execution"""
-    print('Cleaning up...')
+    HydraBot.log_and_print('Cleaning up...')
 
     if hydrabot is not None:
         hydrabot.clean_up()
@@ -41,14 +44,21 @@ def main():
     global hydrabot
     hydrabot = HydraBot(**config)
 
+    HydraBot.log_and_print('Started up in {:.0f} ms'.format(
+        (time.perf_counter() - startup_started) * 1000
+    ))
+
     # Register exit handler
     atexit.register(clean_up)
 
+    # Serve all recipients until interrupted
+    hydrabot.run_forever()
+
 
 # Call main method by default
 if __name__ == '__main__':
     try:
         main()
     except KeyboardInterrupt:
-        # Call exit function on keyboard interupt as well
-        clean_up()
+        # Exit handler cleans up on keyboard interrupt as well
+        pass
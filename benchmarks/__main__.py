@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   BENCHMARKS - __main__.py
+
+   Measures scheduling and message building hot paths offline,
+   results are stored as JSON to compare them between commits
+
+   Usage (from repository root):
+     python -m benchmarks [--output FILE] [--compare FILE] [--quick]
+"""
+
+
+# Dependencies
+import argparse
+from datetime import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+# Local dependencies
+from hydrabot_py import config
+from hydrabot_py.lib import HydraBot
+from hydrabot_py.lib.chatmessages import (
+    MessageTemplate, TextMessage, EmojiMessage, MessageDelay
+)
+from hydrabot_py.lib.corpus import FileCorpus
+from hydrabot_py.lib.logqueue import LogQueue
+from hydrabot_py.lib.schedule import SchedulePlanner
+from hydrabot_py.lib.util import Util
+from .stubs import StubChatBot, StubImageSearch
+
+
+# Changes beyond this ratio are reported as regressions/improvements
+SIGNIFICANT_CHANGE = 0.1
+
+# Message exercising every placeholder
+TEMPLATE_TEXT = ('Water is love.{{SPLIT}}Water is life.{{DELAY}}'
+                 + 'Look:{{IMG:https://example.com/water.gif}} Drink up!')
+
+
+def get_commit():
+    """Get short hash of checked out commit, None outside of git"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def generate_messages(count):
+    """Get synthetic message texts"""
+    return ['Message {}: stay hydrated!{{{{SPLIT}}}}Drink water.'.format(i)
+            for i in range(count)]
+
+
+def create_bot(directory, **settings):
+    """Creates a HydraBot which runs offline and prints nothing
+
+    Args:
+      directory (str): Directory for log file
+      **settings: Configuration overriding defaults
+
+    Returns:
+      bot (HydraBot)
+    """
+    bot_config = dict(config)
+    bot_config.update(
+        fb_thread_ids=[],
+        start_time='00:00',
+        end_time='23:59',
+        demo_mode=True,
+        test_mode=True,
+        image_chance_per_message=0,
+        image_cache_file=None,
+        history_file=None,
+        log_file=os.path.join(directory, 'bench.log'),
+        metrics_port=None,
+        metrics_file=None,
+        profile=False,
+        memory_watchdog=False
+    )
+    bot_config.update(settings)
+
+    bot = HydraBot(**bot_config)
+
+    # Records are still enqueued and written, just not printed
+    LogQueue.active.console_handler.setLevel(logging.CRITICAL)
+
+    return bot
+
+
+def go_offline(bot):
+    """Lets bot deliver to stubs without any sleeps
+
+    Args:
+      bot (HydraBot): Bot created in demo mode
+    """
+    async def no_sleep(seconds):
+        pass
+
+    bot.demo_mode = False
+    bot.chatbot = StubChatBot()
+    bot.image_search = StubImageSearch()
+    bot.image_chance_per_message = 0.5
+    bot.delivery.sleep = no_sleep
+    MessageDelay.seconds = 0
+
+
+def measure(function, number, repeat, ops_per_call=1):
+    """Times function, keeping the best of several repeats
+
+    Returns:
+      result (dict): Microseconds and operations per second
+    """
+    random.seed(0)
+    times = timeit.Timer(function).repeat(repeat=repeat, number=number)
+    per_op = min(times) / number / ops_per_call
+
+    return {
+        'per_op_us': per_op * 1e6,
+        'ops_per_sec': 1 / per_op if per_op else None,
+        'number': number * ops_per_call,
+        'repeat': repeat
+    }
+
+
+def run_benchmarks(scale=1):
+    """Runs every benchmark
+
+    Args:
+      scale (float): Multiplier for iterations and pool sizes (1)
+
+    Returns:
+      results (dict): Results by benchmark name
+    """
+    results = {}
+    repeat = 5 if scale >= 1 else 3
+    pool_size = max(1000, int(100000 * scale))
+
+    def count(n):
+        return max(1, int(n * scale))
+
+    # Message building
+    results['message_template_compile'] = measure(
+        lambda: MessageTemplate(TEMPLATE_TEXT), count(20000), repeat
+    )
+
+    template = MessageTemplate(TEMPLATE_TEXT)
+    results['text_message_build'] = measure(
+        lambda: TextMessage(template), count(50000), repeat
+    )
+
+    results['emoji_generate_text'] = measure(
+        lambda: EmojiMessage.generate_text(config['emojis'], '1-4'),
+        count(50000), repeat
+    )
+
+    results['util_get_num_range'] = measure(
+        lambda: Util.get_num_range('1-9', fill=True), count(50000), repeat
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        bot = create_bot(directory)
+
+        results['calculate_intervals'] = measure(
+            lambda: bot.calculate_intervals(
+                timespan_sec=86340, message_ratio=240, message_count=240
+            ),
+            count(500), repeat
+        )
+        bot.clean_up()
+
+        # Every recipient for a month at once
+        recipients = count(1000)
+        planner = SchedulePlanner(seed=0)
+        thread_ids = [str(i) for i in range(recipients)]
+
+        results['schedule_plan_{}x30'.format(recipients)] = measure(
+            lambda: planner.plan(thread_ids, 30, 50400, 1, 2),
+            1, repeat, ops_per_call=recipients * 30
+        )
+
+        # Round start picks a few hundred out of a large pool
+        messages = generate_messages(pool_size)
+        bot = create_bot(directory, messages=messages,
+                         min_message_ratio=10, max_message_ratio=20)
+        recipient = bot.recipients[0]
+
+        results['round_start_list_{}'.format(pool_size)] = measure(
+            lambda: bot.round_start(recipient), count(200), repeat
+        )
+        bot.clean_up()
+
+        messages_file = os.path.join(directory, 'messages.txt')
+        FileCorpus.write(messages_file, messages)
+        bot = create_bot(directory, messages_file=messages_file,
+                         min_message_ratio=10, max_message_ratio=20)
+        recipient = bot.recipients[0]
+
+        results['round_start_file_{}'.format(pool_size)] = measure(
+            lambda: bot.round_start(recipient), count(200), repeat
+        )
+        bot.clean_up()
+
+        # Whole packages from generation to delivery to stubs
+        bot = create_bot(directory, change_emoji_chance=0.2,
+                         announce_chance=0.2, emojis_chance_per_message=0.5)
+        go_offline(bot)
+        recipient = bot.recipients[0]
+        bot.round_start(recipient)
+        packages = count(500)
+
+        def run_packages():
+            futures = []
+
+            for i in range(packages):
+                recipient.run_num = i % len(recipient.round_messages)
+                futures.append(bot.run(recipient))
+
+            for future in futures:
+                future.result()
+
+        results['run_throughput'] = measure(
+            run_packages, 1, repeat, ops_per_call=packages
+        )
+        bot.clean_up()
+        LogQueue.active.stop()
+
+    return results
+
+
+def compare(results, previous):
+    """Prints changes compared to previous results
+
+    Returns:
+      regressions (int): Number of benchmarks getting significantly slower
+    """
+    regressions = 0
+
+    for name, result in results.items():
+        if name not in previous:
+            continue
+
+        before = previous[name]['per_op_us']
+        change = (result['per_op_us'] - before) / before if before else 0
+        note = ''
+
+        if change > SIGNIFICANT_CHANGE:
+            note = '  REGRESSION'
+            regressions += 1
+        elif change < -SIGNIFICANT_CHANGE:
+            note = '  improvement'
+
+        print('{:<32} {:>12.2f} us -> {:>12.2f} us ({:+.1%}){}'.format(
+            name, before, result['per_op_us'], change, note
+        ))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmarks HydraBot hot paths offline'
+    )
+    parser.add_argument('--output', help='JSON file to store results in')
+    parser.add_argument('--compare', help='JSON file of previous results')
+    parser.add_argument('--quick', action='store_true',
+                        help='Fewer iterations and smaller pools')
+    args = parser.parse_args()
+
+    commit = get_commit()
+    results = run_benchmarks(scale=0.1 if args.quick else 1)
+
+    for name, result in results.items():
+        print('{:<32} {:>12.2f} us/op {:>14.1f} ops/s'.format(
+            name, result['per_op_us'], result['ops_per_sec'] or 0
+        ))
+
+    report = {
+        'commit': commit,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'results': results
+    }
+
+    output = args.output or os.path.join(
+        'benchmarks', 'results', '{}.json'.format(commit or 'latest')
+    )
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print('Results stored in {}'.format(output))
+
+    regressions = 0
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+        print('\nCompared to {}:'.format(previous.get('commit')))
+        regressions = compare(results, previous['results'])
+
+    # Non-zero exit status lets scripts catch regressions
+    return 1 if regressions else 0
+
+
+# Call main method by default
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   STUBS - stubs.py
+
+   Offline stand-ins for Facebook Messenger and image search,
+   so benchmarks measure the bot itself instead of the network
+"""
+
+
+# Dependencies
+import itertools
+# Local dependencies
+from hydrabot_py.lib.attachmentcache import AttachmentCache
+from hydrabot_py.lib.chatbot import ChatBot
+from hydrabot_py.lib.threadcache import ThreadCache
+
+
+class StubThread:
+    """Thread info as returned by fbchat's fetchThreadInfo"""
+    emoji = '💧'
+
+
+class StubChatBot(ChatBot):
+    """ChatBot which doesn't log in and drops every Messenger call
+
+    Args:
+      thread_id (str): Default thread ID ("stub")
+    """
+    uid = 'stub'
+    calls = None
+
+    def __init__(self, thread_id='stub'):
+        self.thread_id = thread_id
+        self.thread_type = None
+        self.thread_cache = ThreadCache()
+        self.attachment_cache = AttachmentCache()
+        self.calls = 0
+
+    def setTypingStatus(self, *args, **kwargs):
+        self.calls += 1
+
+    def send(self, *args, **kwargs):
+        self.calls += 1
+
+    def sendRemoteFiles(self, *args, **kwargs):
+        self.calls += 1
+
+    def download_file(self, url):
+        return ('image.gif', url.encode('utf-8'), 'image/gif')
+
+    def _upload(self, files):
+        self.calls += 1
+        return [(str(abs(hash(content))), mimetype)
+                for _, content, mimetype in files]
+
+    def _sendFiles(self, *args, **kwargs):
+        self.calls += 1
+
+    def wave(self, *args, **kwargs):
+        self.calls += 1
+
+    def fetchThreadInfo(self, *thread_ids):
+        self.calls += 1
+        return {thread_id: StubThread() for thread_id in thread_ids}
+
+    def changeThreadEmoji(self, *args, **kwargs):
+        self.calls += 1
+
+    # Never log out of a session which doesn't exist
+    def session_file_exists(self):
+        return True
+
+
+class StubImageSearch:
+    """ImageSearch which hands out made up URLs immediately"""
+    gis_quota = None
+    counter = None
+
+    def __init__(self):
+        self.counter = itertools.count()
+
+    def set_window(self, start_datetime, end_datetime):
+        pass
+
+    def is_ready(self):
+        return True
+
+    def get_random_url(self, gis_giphy_chance=None, history=None):
+        return ('https://example.com/{}.gif'.format(next(self.counter)),
+                'water',
+                'Giphy')
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   HYDRABOT IMAGING - hydrabot_imaging.py
+
+   Downscales and re-encodes images in worker processes. Kept apart
+   from the hydrabot_py package, as importing it would start up the
+   whole bot in every worker
+"""
+
+
+# Dependencies
+from io import BytesIO
+import math
+import os
+# Pillow is imported lazily, it's only needed if images are processed
+
+
+def has_transparency(image):
+    """Indicates whether image (or its current frame) has transparency"""
+    return image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+
+
+def encode_still(image, max_bytes):
+    """Encodes a still image, lowering quality until it fits budget
+
+    Returns:
+      content, format (tuple): Encoded image and its Pillow format
+    """
+    from PIL import Image
+
+    # Transparency only survives as PNG, falling back to a palette
+    if has_transparency(image):
+        image = image.convert('RGBA')
+
+        for candidate in (image, image.quantize(method=Image.FASTOCTREE)):
+            output = BytesIO()
+            candidate.save(output, 'PNG', optimize=True)
+
+            if output.tell() <= max_bytes:
+                break
+
+        return output.getvalue(), 'PNG'
+
+    image = image.convert('RGB')
+
+    for quality in (85, 75, 65, 55):
+        output = BytesIO()
+        image.save(output, 'JPEG', quality=quality, optimize=True)
+
+        if output.tell() <= max_bytes:
+            break
+
+    return output.getvalue(), 'JPEG'
+
+
+def to_palette(frame, colors):
+    """Converts RGB or RGBA frame to a GIF palette, transparent pixels
+    of RGBA frames take up the palette's last color
+
+    Returns:
+      frame, transparency (tuple): Palette frame and index of its
+        transparent color, None if frame has no transparency
+    """
+    from PIL import Image
+
+    if frame.mode != 'RGBA':
+        return frame.convert('P', palette=Image.ADAPTIVE,
+                             colors=colors), None
+
+    transparency = colors - 1
+    palette_frame = frame.convert('RGB').convert(
+        'P', palette=Image.ADAPTIVE, colors=transparency
+    )
+
+    # GIF knows fully transparent pixels only
+    mask = frame.getchannel('A').point(lambda alpha: 255 if alpha < 128
+                                       else 0)
+    palette_frame.paste(transparency, mask=mask)
+
+    return palette_frame, transparency
+
+
+def encode_animation(frames, durations, loop, max_bytes, min_frames=8):
+    """Encodes an animated GIF, dropping frames and colors until it
+    fits budget or neither may be dropped any further
+
+    Args:
+      frames (list): RGB frames, RGBA ones if animation has transparency
+      durations (list): Milliseconds every frame is shown
+      loop (int): Number of loops, 0 loops forever
+      max_bytes (int): Byte budget of encoded image
+      min_frames (int): Frames to keep at least (8)
+
+    Returns:
+      content, format (tuple): Encoded image and its Pillow format
+    """
+    colors = 256
+
+    while True:
+        palette_frames, transparencies = zip(*[
+            to_palette(frame, colors) for frame in frames
+        ])
+        options = {}
+
+        # Clear every frame before drawing the next one, otherwise
+        # previous ones would show through transparent pixels
+        if transparencies[0] is not None:
+            options = {'transparency': transparencies[0], 'disposal': 2}
+
+        output = BytesIO()
+        palette_frames[0].save(
+            output,
+            'GIF',
+            save_all=True,
+            append_images=list(palette_frames[1:]),
+            duration=durations,
+            loop=loop,
+            optimize=True,
+            **options
+        )
+
+        if output.tell() <= max_bytes:
+            break
+
+        # Drop every other frame, remaining ones are shown longer
+        if len(frames) >= min_frames * 2:
+            frames = frames[::2]
+            durations = [sum(durations[i:i + 2])
+                         for i in range(0, len(durations), 2)]
+        # Then make do with fewer colors
+        elif colors > 32:
+            colors //= 2
+        else:
+            break
+
+    return output.getvalue(), 'GIF'
+
+
+def process_image(file, max_dimension, max_bytes, max_frames=100,
+                  max_pixels=100000000):
+    """Downscales and re-encodes an image to fit dimension and byte budget
+
+    Runs in worker processes, so everything is passed as plain values
+
+    Args:
+      file (tuple): File name, content and mimetype
+      max_dimension (int): Maximum width and height in pixels
+      max_bytes (int): Byte budget of encoded image
+      max_frames (int):
+        Frames of animations to process at most, others are
+        skipped and their durations added to the kept ones (100)
+      max_pixels (int): Pixels of all frames to decode at most (100 M)
+
+    Returns:
+      file (tuple): Processed file, the original one if it fits
+        already or processing didn't make it any smaller
+
+    Raises:
+      ValueError: If image has too many pixels to be processed
+    """
+    from PIL import Image, ImageSequence
+
+    file_name, content, mimetype = file
+    image = Image.open(BytesIO(content))
+
+    # Nothing to do
+    if len(content) <= max_bytes and max(image.size) <= max_dimension:
+        return file
+
+    # Only the header was read so far, decoding could take ages
+    frame_count = getattr(image, 'n_frames', 1)
+
+    if image.width * image.height * frame_count > max_pixels:
+        raise ValueError('Too many pixels to process ({}x{}, {} frames)'
+                         .format(image.width, image.height, frame_count))
+
+    scale = min(1, max_dimension / max(image.size))
+    size = (max(1, round(image.width * scale)),
+            max(1, round(image.height * scale)))
+
+    if getattr(image, 'is_animated', False):
+        frames = []
+        durations = []
+        step = math.ceil(frame_count / max_frames)
+
+        # Every kept frame is scaled the same way, skipped ones
+        # extend the duration of the frame kept before
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            duration = frame.info.get('duration', 100)
+
+            if index % step:
+                durations[-1] += duration
+                continue
+
+            frames.append(frame.convert('RGBA').resize(size, Image.LANCZOS))
+            durations.append(duration)
+
+        # Keep alpha of frames only if animation makes use of it
+        if all(frame.getchannel('A').getextrema()[0] >= 128
+               for frame in frames):
+            frames = [frame.convert('RGB') for frame in frames]
+
+        processed, image_format = encode_animation(
+            frames, durations, image.info.get('loop', 0), max_bytes
+        )
+    else:
+        image.thumbnail(size, Image.LANCZOS)
+        processed, image_format = encode_still(image, max_bytes)
+
+    if len(processed) >= len(content):
+        return file
+
+    extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+
+    return (
+        '{}.{}'.format(os.path.splitext(file_name)[0] or 'image', extension),
+        processed,
+        'image/{}'.format(image_format.lower())
+    )
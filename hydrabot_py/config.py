@@ -13,15 +13,30 @@
 CONFIG = {
     # Facebook E-Mail
     'fb_email': '<YOUR_EMAIL_HERE>',
-    # Facebook password (None will lead to password prompt)
+    # Facebook password
+    #  None will lead to password prompt, if no valid session is stored
     'fb_password': None,
+    # Session file holding cookies of every account logged in
+    #  Restarts reuse them instead of logging in again,
+    #  None logs in on every start and out on exit
+    'session_file': 'session.json',
+    # Seconds between checking and storing session cookies
+    'session_refresh_interval': 60 * 60,
+    # Seconds until fetched thread infos (e.g. emoji) expire
+    #  Expired ones are fetched for every thread at once
+    'thread_cache_ttl': 60 * 5,
     # Facebook thread ID (None will lead to user himself)
     #  What it is and how to retrieve it:
     #  https://fbchat.readthedocs.io/en/stable/intro.html#threads
     'fb_thread_id': None,
+    # Additional Facebook thread IDs to serve with the same login
+    #  Every thread gets its own randomly generated rounds
+    'fb_thread_ids': [],
     # Message collection
     #  {{SPLIT}} splits a message into several messages
     #  {{DELAY}} causes a five second DELAY between messages
+    #  {{IMG:<url>}} sends the image found at URL
+    #  Unknown placeholders will be rejected on startup
     'messages': [
         'I thought you needed to watch that now:{{SPLIT}}'
         + 'https://www.youtube.com/watch?v=iIQrPKqisZE',
@@ -42,6 +57,20 @@ CONFIG = {
         + 'annoyed?\ndrink water.\n\n'
         + 'angry?\ndrink water.'
     ],
+    # Message file, replaces "messages" if set
+    #  One message per line, line breaks are written as \\n
+    #  The file is memory-mapped, so it may hold any amount of messages
+    'messages_file': None,
+    # Database remembering recently sent messages and images per thread
+    #  Those are avoided for a while, None forgets them on exit
+    'history_file': 'history.db',
+    # Number of recently sent messages and images to avoid per thread
+    #  Memory used per thread stays fixed (~4 KB at 100)
+    'history_size': 100,
+    # Journal of round plans and completed sends
+    #  Rounds are resumed from it after a crash or restart,
+    #  None starts every round over
+    'journal_file': 'journal.jsonl',
     # Start time
     #  Format: HH:MM
     'start_time': '00:00',
@@ -109,16 +138,104 @@ CONFIG = {
     'gis_api_key': None,
     # Google Image Search Project CX
     'gis_project_cx': None,
+    # Google Image Search requests allowed per day
+    #  Requests are spread evenly across the timespan between start and
+    #  end time, cached results or Giphy are used in between
+    'gis_daily_quota': 100,
     # Provide dummy URL to always use instead of actual search
     # 'image_dummy_url': 'https://upload.wikimedia.org/'
     # + 'wikipedia/en/thumb/6/64/Windows_XP_Luna.png/300px-Windows_XP_Luna.png',
     'image_dummy_url': None,
     # Giphy API key
     'giphy_api_key': None,
+    # Minimum amount of unused search results kept per search phrase
+    #  Every search response is kept and used up before searching again,
+    #  a new search is only made once fewer results are left
+    'image_pool_min_size': 5,
+    # File to keep image search results in across restarts
+    #  Can be shared by several bots on the same machine,
+    #  None will keep results in memory only
+    'image_cache_file': 'imagecache.db',
+    # Seconds until cached image search results expire
+    'image_cache_ttl': 60 * 60 * 24 * 3,
+    # File to keep IDs of images uploaded to Facebook in across restarts
+    #  Images already uploaded are sent again without uploading them,
+    #  None will upload every image sent
+    'attachment_cache_file': 'attachments.db',
+    # Seconds until uploaded images are uploaded anew
+    'attachment_cache_ttl': 60 * 60 * 24 * 7,
+    # Number of cached image URLs and contents, least recently used
+    #  ones are dropped beyond it
+    'attachment_cache_size': 2000,
+    # Shrink images in worker processes before uploading them
+    #  Oversized images are scaled down and animated GIFs lose frames
+    #  and colors until they fit, requires Pillow
+    'image_processing': False,
+    # Maximum width and height of uploaded images in pixels
+    'image_max_dimension': 1024,
+    # Size in bytes uploaded images should fit in
+    'image_max_bytes': 1024 * 1024 * 2,
+    # Worker processes shrinking images
+    'image_processing_workers': 2,
+    # Seconds to wait for shrunk images of a message at most
+    #  Images taking longer are uploaded as they are
+    'image_processing_timeout': 30,
+    # Log file, written as one JSON object per line
+    'log_file': 'hydrabot.log',
+    # Size in bytes at which the log file is rotated
+    'log_max_bytes': 5 * 1024 * 1024,
+    # Number of rotated log files to keep
+    'log_backup_count': 3,
+    # Local port to serve Prometheus metrics on (None disables it)
+    #  Available at http://127.0.0.1:<port>/metrics
+    'metrics_port': None,
+    # File to write Prometheus metrics to (None disables it)
+    #  Useful for node_exporter's textfile collector
+    'metrics_file': None,
+    # Seconds between updates of metrics file
+    'metrics_interval': 15,
+    # Profile rounds, dumps a pstats file per round next to the log
+    #  View with: python -m pstats <file>
+    'profile': False,
+    # Share of rounds to profile if "profile" is enabled
+    #  E.g. 0.1 profiles every tenth round on average
+    'profile_sample_rate': 1,
+    # Trace memory and report allocation sites which keep growing
+    #  Tracing slows the bot down a little and uses extra memory
+    'memory_watchdog': False,
+    # Seconds between memory snapshots
+    'memory_watchdog_interval': 60 * 10,
+    # Growth in bytes between two snapshots which will be reported
+    'memory_growth_threshold': 10 * 1024 * 1024,
+    # Simulate this many days on a virtual clock (0 runs normally)
+    #  Nothing is sent or searched, every package is recorded instead
+    #  Useful to check timespan and message ratio settings quickly
+    'simulation_days': 0,
+    # CSV file to write simulated send timeline to
+    'simulation_file': 'simulation.csv',
+    # Seed to plan rounds with (None plans randomly)
+    #  Same seed, recipient and round always give the same send times
+    #  Requires NumPy
+    'schedule_seed': None,
     # Preview behaviour only, don't actually use FB
     'demo_mode': False,
     # Send messages immediately and ignore timings
     'test_mode': False,
     # Facebook user agent (None will lead to random user agent)
-    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:75.0) Gecko/20100101 Firefox/75.0'
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:75.0) Gecko/20100101 Firefox/75.0',
+    # Maximum threads for blocking Messenger calls
+    #  Typing delays of all conversations are interleaved on one event
+    #  loop, only actual requests occupy one of these threads
+    'delivery_max_workers': 8,
+    # Number of hosts to keep alive HTTP connections for
+    #  Facebook, Giphy and the Google Image Search API share these
+    #  connections, GIS checks every result on its own connections
+    'http_pool_hosts': 10,
+    # Maximum kept alive HTTP connections per host
+    'http_pool_maxsize': 10,
+    # Seconds to wait for HTTP connections to be established
+    'http_connect_timeout': 10,
+    # Seconds to wait for HTTP responses to send data
+    #  Stalled image searches and downloads give up after it
+    'http_read_timeout': 30
 }
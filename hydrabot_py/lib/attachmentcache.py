@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   ATTACHMENT CACHE - attachmentcache.py
+
+   Remembers attachments uploaded to Facebook by image URL and
+   content hash, so every image only needs to be uploaded once
+"""
+
+
+# Dependencies
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+class AttachmentCache:
+    """Persistent cache of uploaded attachment IDs
+
+    Every attachment is stored under its URL and under the hash of its
+    content, so the same image behind another URL is found as well.
+    Attachments expire after a while and the least recently used ones
+    are evicted once the cache is full
+
+    Args:
+      path (str): SQLite database file, None keeps cache in memory (None)
+      ttl (float): Seconds until attachments expire (7 days)
+      max_size (int):
+        Cache entries at most, attachments take up one per URL
+        plus one for their content (2000)
+    """
+    connection = None
+    lock = None
+    ttl = None
+    max_size = None
+
+    # Database schema
+    schema = '''
+        CREATE TABLE IF NOT EXISTS attachments (
+            key TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            mimetype TEXT NOT NULL,
+            uploaded REAL NOT NULL,
+            used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS attachments_used ON attachments (used);
+    '''
+
+    def __init__(self, path=None, ttl=604800, max_size=2000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(
+            path or ':memory:',
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+
+        # Allow other processes to read while one is writing
+        if path:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+
+        self.connection.executescript(self.schema)
+        self.evict()
+
+    @staticmethod
+    def get_content_key(content):
+        """Get cache key of file content"""
+        return 'sha256:' + hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def get_url_key(url):
+        """Get cache key of file URL"""
+        return 'url:' + url
+
+    def get(self, key):
+        """Get attachment, marking it as recently used
+
+        Args:
+          key (str): URL or content key
+
+        Returns:
+          file_id, mimetype (tuple): Uploaded attachment,
+            None if it isn't cached or expired
+        """
+        now = time.time()
+
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT file_id, mimetype FROM attachments '
+                'WHERE key = ? AND uploaded >= ?',
+                (key, now - self.ttl)
+            ).fetchone()
+
+            if row is not None:
+                self.connection.execute(
+                    'UPDATE attachments SET used = ? WHERE key = ?',
+                    (now, key)
+                )
+
+        return tuple(row) if row is not None else None
+
+    def put(self, keys, file_id, mimetype):
+        """Stores a newly uploaded attachment under several keys,
+        evicts others if cache is full
+
+        Args:
+          keys (list): URL and content keys of attachment
+          file_id (str): Facebook's ID of uploaded file
+          mimetype (str): Mimetype of uploaded file
+        """
+        now = time.time()
+
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO attachments VALUES (?, ?, ?, ?, ?)',
+                [(key, file_id, mimetype, now, now) for key in keys]
+            )
+
+        self.evict()
+
+    def alias(self, key, existing_key):
+        """Stores cached attachment under another key, keeping the
+        time it was uploaded at, so both expire together"""
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO attachments '
+                'SELECT ?, file_id, mimetype, uploaded, used '
+                'FROM attachments WHERE key = ?',
+                (key, existing_key)
+            )
+
+        self.evict()
+
+    def invalidate(self, file_id):
+        """Forgets attachment under every key, e.g. once it was rejected"""
+        with self.lock:
+            self.connection.execute(
+                'DELETE FROM attachments WHERE file_id = ?', (file_id,)
+            )
+
+    def evict(self):
+        """Removes expired and least recently used attachments"""
+        with self.lock:
+            self.connection.execute(
+                'DELETE FROM attachments WHERE uploaded < ?',
+                (time.time() - self.ttl,)
+            )
+            self.connection.execute(
+                'DELETE FROM attachments WHERE key IN ('
+                'SELECT key FROM attachments ORDER BY used DESC '
+                'LIMIT -1 OFFSET ?)',
+                (self.max_size,)
+            )
+
+    def close(self):
+        """Closes database connection"""
+        with self.lock:
+            self.connection.close()
@@ -12,43 +12,85 @@
 
 # Dependencies
 from getpass import getpass
-import json
+import mimetypes
 import os
-import time
-from fbchat import Client
+import random
+import threading
+import requests
+from fbchat import Client, FBchatException
+# Not exported by fbchat, raised once content is no longer available
+from fbchat._exception import FBchatInvalidParameters
 from fbchat.models import Message, TypingStatus, ThreadType
 # Local dependencies
-from .chatmeta import ChatAction
-from .chatmessages import TextMessage, ImageMessage, EmojiMessage
+from . import metrics
+from .logqueue import log_and_print
+from .packageplan import PackagePlan
+from .sessions import SessionStore
+from .threadcache import ThreadCache
+from .types import tcolors
 
 
-# Remember to use time.sleep occasionally to mimic user behaviour!
+# Remember to await delays occasionally to mimic user behaviour!
 class ChatBot(Client):
     """Manages communications with Facebook Messenger API
 
     Args:
       email (str): Facebook users email
-      password (str): Facebook users password, None will lead to prompt (None)
-      session_file (str): Default session file path, defaults to "session.json"
+      password (str): Facebook users password, None will lead to prompt
+        if no valid session is stored (None)
+      session_file (str):
+        Session store file holding cookies of every account,
+        None disables storing them ("session.json")
+      session_refresh_interval (float):
+        Seconds between checking and storing session cookies (3600)
+      thread_cache_ttl (float): Seconds until thread infos expire (300)
+      attachment_cache (AttachmentCache):
+        Attachments uploaded before, None uploads every image (None)
+      image_processor (ImageProcessor):
+        Shrinks images before uploading them, requires an attachment
+        cache, None uploads them as they are (None)
       thread_id (str): Facebook thread ID, None -> users own thread (None)
       thread_type (ThreadType): Type of thread (ThreadType.USER)
+      http_pool (HttpPool): Shared connection pools, None -> own ones (None)
       **kwargs (kwargs): Optional arguments for fbchat's Client class
     """
+    email = None
     session_file = None
+    session_store = None
+    session_refresh_interval = None
+    session_stopped = None
+    thread_cache = None
+    attachment_cache = None
+    image_processor = None
     thread_id = None
+    thread_type = None
+    http_pool = None
 
-    def __init__(self, email, password=None, session_file='session.json',
-                 thread_id=None, thread_type=ThreadType.USER,
-                 **kwargs):
-        if password is None:
-            password = getpass('Please enter the password for "{}":'.format(
-                email
-            ))
+    # Threads fetched per request at most
+    thread_batch_size = 50
+    # Seconds to wait for connecting and data of downloads, unless
+    # shared pools with their own timeouts are used
+    download_timeout = (10, 30)
 
+    def __init__(self, email, password=None, session_file='session.json',
+                 session_refresh_interval=3600, thread_cache_ttl=300,
+                 attachment_cache=None, image_processor=None, thread_id=None,
+                 thread_type=ThreadType.USER, http_pool=None, **kwargs):
+        self.email = email
+        self.thread_cache = ThreadCache(ttl=thread_cache_ttl)
+        self.attachment_cache = attachment_cache
+        self.image_processor = image_processor
         self.session_file = session_file
-        session_cookies = self.load_session() if session_file else None
+        self.session_refresh_interval = session_refresh_interval
+        self.http_pool = http_pool
 
-        # Initialize super instance
+        if session_file:
+            self.session_store = SessionStore(session_file)
+
+        session_cookies = self.load_session()
+
+        # Initialize super instance, which only logs in (and prompts
+        # for the password) if stored session turns out to be invalid
         super().__init__(
             email=email,
             password=password,
@@ -61,105 +103,421 @@ class ChatBot(Client):
             thread_id = self.uid
 
         self.thread_id = thread_id
+        self.thread_type = thread_type
         self.setDefaultThread(thread_id, thread_type)
 
-        # Save session if filename was provided
-        if session_file:
+        # Store session if a store was given, keep it fresh meanwhile
+        if self.session_store is not None:
             self.save_session()
+            self.start_session_refresh()
 
-    def session_file_exists(self):
-        """Returns bool indicating whether session file exists"""
-        return os.path.exists(self.session_file)
+    def login(self, email, password, max_tries=5, user_agent=None):
+        """Logs in, prompting for the password only now if none was given"""
+        if password is None:
+            password = getpass('Please enter the password for "{}":'.format(
+                email
+            ))
 
-    def load_session(self, session_file=None):
-        """Loads session from JSON file
+        with metrics.track_messenger('login'):
+            super().login(email, password, max_tries=max_tries,
+                          user_agent=user_agent)
 
-        Args:
-          session_file (string): Path to session file, None uses default (None)
+        self.mount_session()
+
+    def setSession(self, session_cookies, user_agent=None):
+        """Loads session cookies into a new session"""
+        restored = super().setSession(session_cookies, user_agent=user_agent)
+
+        self.mount_session()
+
+        return restored
+
+    def mount_session(self):
+        """Routes session through shared pools, every login and
+        restored session comes with a new one"""
+        state = getattr(self, '_state', None)
+
+        if self.http_pool is not None and state is not None:
+            self.http_pool.mount(state._session)
+
+    def session_file_exists(self):
+        """Returns bool indicating whether session of account is stored"""
+        return (self.session_store is not None
+                and self.session_store.has(self.email))
+
+    def load_session(self):
+        """Loads stored session of account
 
         Returns:
-          session_cookies (dict): Session cookies
+          session_cookies (dict): Session cookies, None if none are
+            stored or they can't be valid anyway
         """
-        session_cookies = None
+        if self.session_store is None:
+            return None
 
-        # No session file parameter given, therefore use class property instead
-        if session_file is None:
-            session_file = self.session_file
+        session_cookies = self.session_store.load(self.email)
 
-        # Session file was found
-        if self.session_file_exists():
-            with open(session_file, 'r') as f:
-                # Load JSON from file contents
-                session_cookies = json.load(f)
+        # Don't waste requests on cookies lacking the login
+        if not SessionStore.is_plausible(session_cookies):
+            return None
 
         return session_cookies
 
-    def save_session(self, session_file=None):
-        """Saves current session to JSON file
+    def save_session(self):
+        """Stores current session cookies, unless they didn't change
 
-        Args:
-          session_file (string): Path to session file, None uses default (None)
+        Returns:
+          saved (bool): Whether session file was written
         """
-        # No session file parameter given, therefore use class property instead
-        if session_file is None:
-            session_file = self.session_file
+        return self.session_store.save(self.email, self.getSession())
+
+    def start_session_refresh(self):
+        """Checks session and stores its cookies in a background thread"""
+        self.session_stopped = threading.Event()
+
+        threading.Thread(
+            target=self.refresh_session_forever,
+            name='session-refresh',
+            daemon=True
+        ).start()
+
+    def refresh_session_forever(self):
+        """Refreshes session until stopped, at slightly random intervals
+        so bots restarted together don't refresh together"""
+        while not self.session_stopped.wait(
+                self.session_refresh_interval * random.uniform(0.8, 1.2)):
+            try:
+                # Request lets Facebook renew cookies about to expire
+                with metrics.track_messenger('isLoggedIn'):
+                    logged_in = self.isLoggedIn()
+
+                if logged_in:
+                    self.save_session()
+                else:
+                    log_and_print(
+                        'Session of "{}" expired, logging in on next '
+                        'start'.format(self.email),
+                        color=tcolors.WARNING
+                    )
+            except Exception as e:
+                log_and_print(
+                    'Refreshing session failed: {!r}'.format(e),
+                    color=tcolors.WARNING
+                )
+
+    def close_session(self):
+        """Stops refreshing session, stores its cookies a last time"""
+        if self.session_stopped is None:
+            return
+
+        self.session_stopped.set()
+        self.session_stopped = None
+        self.save_session()
+
+    def get_thread(self, thread_id=None, thread_type=None):
+        """Resolves thread ID and type, falling back to default thread
 
-        # Open file for writing
-        with open(session_file, 'w') as fp:
-            # Write JSON to file
-            session_cookies = self.getSession()
-            json.dump(session_cookies, fp)
+        Returns:
+          thread_id, thread_type (tuple)
+        """
+        return (
+            thread_id if thread_id is not None else self.thread_id,
+            thread_type if thread_type is not None else self.thread_type
+        )
 
-    def set_typing(self, status):
+    def set_typing(self, status, thread_id=None, thread_type=None):
         """Set typing status
 
         Args:
           status (bool): Indicates whether to set typing on or off
+          thread_id (str): Thread ID, None uses default thread (None)
+          thread_type (ThreadType): Thread type, None uses default (None)
         """
-        self.setTypingStatus(
-            TypingStatus.TYPING if status else TypingStatus.STOPPED
-        )
+        thread_id, thread_type = self.get_thread(thread_id, thread_type)
+
+        with metrics.track_messenger('setTypingStatus'):
+            self.setTypingStatus(
+                TypingStatus.TYPING if status else TypingStatus.STOPPED,
+                thread_id=thread_id,
+                thread_type=thread_type
+            )
+
+    def send_wave(self, thread_id=None, thread_type=None):
+        """Wave at thread"""
+        thread_id, thread_type = self.get_thread(thread_id, thread_type)
+
+        with metrics.track_messenger('wave'):
+            self.wave(thread_id=thread_id, thread_type=thread_type)
+
+    def send_text(self, text, thread_id=None, thread_type=None):
+        """Send plain text"""
+        thread_id, thread_type = self.get_thread(thread_id, thread_type)
 
-    def send_image_url(self, url):
+        with metrics.track_messenger('send'):
+            self.send(Message(text=text), thread_id=thread_id,
+                      thread_type=thread_type)
+
+    def send_image_url(self, url, thread_id=None, thread_type=None):
         """Send image from URL"""
-        self.sendRemoteFiles([url])
+        self.send_image_urls([url], thread_id, thread_type)
+
+    def send_image_urls(self, urls, thread_id=None, thread_type=None):
+        """Send images from URLs in a single request, reusing
+        attachments uploaded before if there's a cache"""
+        thread_id, thread_type = self.get_thread(thread_id, thread_type)
+
+        if self.attachment_cache is None:
+            with metrics.track_messenger('sendRemoteFiles'):
+                self.sendRemoteFiles(urls, thread_id=thread_id,
+                                     thread_type=thread_type)
+            return
+
+        files, cached_ids = self.get_attachments(urls)
+
+        try:
+            with metrics.track_messenger('sendFiles'):
+                self._sendFiles(files, thread_id=thread_id,
+                                thread_type=thread_type)
+        except FBchatInvalidParameters:
+            # Facebook may have dropped cached attachments meanwhile,
+            # any other error isn't solved by uploading them again
+            if not cached_ids:
+                raise
+
+            for file_id in cached_ids:
+                self.attachment_cache.invalidate(file_id)
+
+            files, _ = self.get_attachments(urls)
+
+            with metrics.track_messenger('sendFiles'):
+                self._sendFiles(files, thread_id=thread_id,
+                                thread_type=thread_type)
+
+    def get_attachments(self, urls):
+        """Get attachments of images, only those which aren't
+        cached by URL are downloaded, only new content is uploaded
+
+        Returns:
+          files, cached_ids (tuple): (file_id, mimetype) tuples in order
+            of URLs and IDs of those which were cached
+        """
+        cache = self.attachment_cache
+        files = [cache.get(cache.get_url_key(url)) for url in urls]
+        uploads = []
 
-    def get_thread_emoji(self):
+        for index, url in enumerate(urls):
+            if files[index] is not None:
+                metrics.attachments.inc(source='url')
+                continue
+
+            file = self.download_file(url)
+            content_key = cache.get_content_key(file[1])
+            files[index] = cache.get(content_key)
+
+            # Same image was uploaded from another URL before
+            if files[index] is not None:
+                cache.alias(cache.get_url_key(url), content_key)
+                metrics.attachments.inc(source='content')
+            else:
+                uploads.append((index, content_key, file))
+
+        # Every new image is uploaded in a single request, shrunk in
+        # parallel beforehand. Keys stay those of the original content
+        if uploads:
+            upload_files = [file for _, _, file in uploads]
+
+            if self.image_processor is not None:
+                upload_files = self.image_processor.process(upload_files)
+
+            with metrics.track_messenger('upload'):
+                uploaded = self._upload(upload_files)
+
+            for (index, content_key, _), attachment in zip(uploads, uploaded):
+                files[index] = attachment
+                cache.put([cache.get_url_key(urls[index]), content_key],
+                          *attachment)
+                metrics.attachments.inc(source='upload')
+
+        uploaded_indexes = {index for index, _, _ in uploads}
+
+        return files, [file[0] for index, file in enumerate(files)
+                       if index not in uploaded_indexes]
+
+    def download_file(self, url):
+        """Downloads file through the shared connections, never sending
+        the session's cookies to the image's host
+
+        Returns:
+          file (tuple): File name, content and mimetype, ready for upload
+
+        Raises:
+          requests.HTTPError: If host didn't respond with the file
+        """
+        if self.http_pool is None:
+            response = requests.get(url, timeout=self.download_timeout)
+            response.raise_for_status()
+            content = response.content
+            content_type = response.headers.get('Content-Type')
+        else:
+            response, content = self.http_pool.get_http().request(url)
+
+            # Redirects which weren't followed count as failures as well
+            if not 200 <= response.status < 300:
+                raise requests.HTTPError('{} {} for url: {}'.format(
+                    response.status, response.reason, url
+                ))
+
+            content_type = response.get('content-type')
+
+        file_name = os.path.basename(url).split('?')[0].split('#')[0]
+
+        return (
+            file_name,
+            content,
+            content_type or mimetypes.guess_type(file_name)[0]
+        )
+
+    def add_thread(self, thread_id):
+        """Adds thread whose info is fetched along with others"""
+        self.thread_cache.add(thread_id)
+
+    def fetch_threads(self, *thread_ids):
+        """Fetches thread infos in batches and caches them
+
+        Returns:
+          threads (dict): fbchat Thread instances by thread ID, threads
+            which couldn't be fetched are missing
+        """
+        threads = {}
+
+        for i in range(0, len(thread_ids), self.thread_batch_size):
+            threads.update(
+                self.fetch_batch(thread_ids[i:i + self.thread_batch_size])
+            )
+
+        return threads
+
+    def fetch_batch(self, thread_ids):
+        """Fetches a batch of thread infos, a failing batch is split
+        in halves until threads which can't be fetched are found
+
+        Returns:
+          threads (dict): fbchat Thread instances by thread ID
+        """
+        try:
+            with metrics.track_messenger('fetchThreadInfo'):
+                threads = self.fetchThreadInfo(*thread_ids)
+        except FBchatException as e:
+            # Inaccessible thread is left out of batches from now on
+            if len(thread_ids) == 1:
+                self.thread_cache.put_failure(thread_ids[0], e)
+                return {}
+
+            middle = len(thread_ids) // 2
+            threads = self.fetch_batch(thread_ids[:middle])
+            threads.update(self.fetch_batch(thread_ids[middle:]))
+
+            return threads
+
+        self.thread_cache.put(threads)
+
+        return threads
+
+    def get_thread_info(self, thread_id=None):
+        """Get thread info, fetching it along with every other
+        added thread whose info is missing if it isn't cached
+
+        Returns:
+          thread (Thread): fbchat Thread instance, None if not found
+
+        Raises:
+          FBchatException: If thread couldn't be fetched now or recently
+        """
+        thread_id, _ = self.get_thread(thread_id)
+        thread = self.thread_cache.get(thread_id)
+
+        if thread is not None:
+            return thread
+
+        # Don't ask again for thread which failed recently
+        error = self.thread_cache.get_failure(thread_id)
+
+        if error is not None:
+            raise error
+
+        # Callers missing threads at the same time share a single fetch
+        with self.thread_cache.fetch_lock:
+            thread = self.thread_cache.get(thread_id)
+
+            if (thread is None
+                    and self.thread_cache.get_failure(thread_id) is None):
+                threads = self.fetch_threads(
+                    *self.thread_cache.get_missing(thread_id)
+                )
+                thread = threads.get(thread_id)
+
+        # Thread itself is the one which couldn't be fetched
+        error = self.thread_cache.get_failure(thread_id)
+
+        if thread is None and error is not None:
+            raise error
+
+        return thread
+
+    def get_thread_emoji(self, thread_id=None):
         """Get current emoji"""
-        time.sleep(1)
-        thread = self.fetchThreadInfo(self.thread_id)
+        thread = self.get_thread_info(thread_id)
 
-        if self.thread_id not in thread:
+        if thread is None:
             return None
 
-        return thread[self.thread_id].emoji
+        return thread.emoji
 
-    def set_thread_emoji(self, emoji):
+    def set_thread_emoji(self, emoji, thread_id=None):
         """Set thread emoji"""
-        time.sleep(1)
-        self.changeThreadEmoji(emoji)
-
-    def send_chat_message(self, chatmessage):
-        """Sends a ChatMessage instance"""
-        time.sleep(2)
-
-        # Iterate through single message texts
-        for text in chatmessage.texts:
-            # Single text is chat action
-            if isinstance(text, ChatAction):
-                text.exec()  # Execute chat action
-                continue
+        thread_id, _ = self.get_thread(thread_id)
 
-            # ChatMessage is text or emoji message
-            if isinstance(chatmessage, (TextMessage, EmojiMessage)):
-                self.set_typing(True)
-                time.sleep(len(text) * 0.3)
-                self.set_typing(False)
-                self.send(Message(text=text))
+        try:
+            with metrics.track_messenger('changeThreadEmoji'):
+                self.changeThreadEmoji(emoji, thread_id=thread_id)
+        finally:
+            # Cached emoji is outdated now, even if change failed midway
+            self.thread_cache.invalidate(thread_id)
 
-            # ChatMessage is an image message
-            if isinstance(chatmessage, ImageMessage):
-                self.send_image_url(text)
-                time.sleep(2)
+    async def send_package(self, chat_messages, delivery,
+                           thread_id=None, thread_type=None):
+        """Sends a message package without blocking other deliveries,
+        planned as a whole so redundant Messenger calls are coalesced
 
-            time.sleep(2)
+        Args:
+          chat_messages (list): ChatMessage instances of package
+          delivery (DeliveryEngine): Engine running blocking calls and delays
+          thread_id (str): Thread ID, None uses default thread (None)
+          thread_type (ThreadType): Thread type, None uses default (None)
+
+        Yields:
+          chat_message (ChatMessage): Every chat message once it was sent
+        """
+        plan = PackagePlan(chat_messages)
+
+        for chat_message, steps in zip(chat_messages,
+                                       plan.get_message_steps()):
+            # Whole message including delays is measured
+            with metrics.track(metrics.sends, metrics.send_seconds,
+                               type=type(chat_message).__name__):
+                for kind, value in steps:
+                    if kind == 'sleep':
+                        await delivery.sleep(value)
+                    elif kind == 'action':
+                        await value.exec_async()
+                    elif kind == 'typing':
+                        await delivery.call(self.set_typing, value,
+                                            thread_id, thread_type)
+                    elif kind == 'text':
+                        await delivery.call(self.send_text, value,
+                                            thread_id, thread_type)
+                    elif kind == 'images':
+                        await delivery.call(self.send_image_urls, value,
+                                            thread_id, thread_type)
+
+            yield chat_message
@@ -11,6 +11,7 @@
 
 
 # Dependencies
+import asyncio
 import random
 import re
 import time
@@ -86,57 +87,98 @@ class TextMessage(ChatMessage):
     """Represents a text message containing normal texts
 
     Args:
-      texts (str|list): Text strings
+      texts (str|MessageTemplate|list): Text strings or compiled templates
     """
     texts = []
-    # Placeholder RegExp pattern
-    placeholder_pattern = re.compile(r'\{{2}(\w+):?(.*?)\}{2}')
 
     def __init__(self, texts):
         processed_texts = []
 
         for text in texts if isinstance(texts, list) else [texts]:
-            processed_texts.append(self.process_text(text))
+            # Compile plain strings, templates are already compiled
+            if not isinstance(text, MessageTemplate):
+                text = MessageTemplate(text)
+
+            processed_texts.extend(text.parts)
 
         super(TextMessage, self).__init__(processed_texts)
 
-    def process_text(self, text):
-        """Processes placeholders in a text and allows for text splitting
-        and insertation of special actions"""
-        # Split text based on pattern
-        text_list = text.split('{{SPLIT}}')
-        processed_text_list = []
-
-        # Iterate through single texts
-        for single_text in text_list:
-            skip_text = False
-
-            # Find all placeholder occurances
-            placeholder_matches = re.findall(
-                self.placeholder_pattern,
-                single_text
-            )
 
-            # Iterate through placeholder occurances
-            for placeholder_match in placeholder_matches:
-                placeholder_name, placeholder_value = placeholder_match
+class MessageTemplate:
+    """Immutable, precompiled representation of a message text
+
+    The text is split into single texts by {{SPLIT}}, while {{DELAY}}
+    and {{IMG:<url>}} placeholders are turned into shared part objects
 
-                # DELAY placeholder found
-                if placeholder_name == 'DELAY':
-                    processed_text_list.append(MessageDelay())
-                    skip_text = True
+    Args:
+      text (str): Message text containing placeholders
 
-                # Parameterized IMG placeholder found
-                if placeholder_name == 'IMG' and len(placeholder_value):
-                    print('Image')
-                    # TODO: Add functionality
-                    skip_text = True
+    Raises:
+      ValueError: If text contains an unknown or invalid placeholder
+    """
+    text = None
+    parts = None
+    # Placeholder RegExp pattern
+    placeholder_pattern = re.compile(r'\{{2}(\w+):?(.*?)\}{2}')
 
-            # Text is useable and didn't contain placeholders
-            if not skip_text:
-                processed_text_list.append(single_text)
+    def __init__(self, text):
+        self.text = text
+        self.parts = tuple(self.compile(text))
 
-        return processed_text_list
+    def compile(self, text):
+        """Processes placeholders in a text and allows for text splitting
+        and insertation of special actions
+
+        Returns:
+          parts (list): Text strings, MessageDelay and MessageImage instances
+        """
+        parts = []
+
+        # Split text based on pattern and iterate through single texts
+        for single_text in text.split('{{SPLIT}}'):
+            position = 0
+
+            # Iterate through placeholder occurances
+            for placeholder_match in re.finditer(
+                    self.placeholder_pattern, single_text):
+                placeholder_name, placeholder_value = placeholder_match.groups()
+
+                # Keep text in front of placeholder
+                parts.append(single_text[position:placeholder_match.start()])
+                position = placeholder_match.end()
+
+                parts.append(self.compile_placeholder(
+                    placeholder_name,
+                    placeholder_value
+                ))
+
+            parts.append(single_text[position:])
+
+        # Drop empty texts left over by placeholders
+        return [part for part in parts
+                if not (isinstance(part, str) and not part.strip())]
+
+    def compile_placeholder(self, name, value):
+        """Turns a single placeholder into its part object"""
+        # DELAY placeholder found
+        if name == 'DELAY' and not value:
+            return MessageDelay()
+
+        # Parameterized IMG placeholder found
+        if name == 'IMG' and value.startswith(('http://', 'https://')):
+            return MessageImage(value)
+
+        raise ValueError(
+            'Invalid placeholder "{{{{{}{}}}}}" in message "{}"'.format(
+                name,
+                ':' + value if value else '',
+                self.text
+            )
+        )
+
+    # Convert instance to string
+    def __str__(self):
+        return self.text
 
 
 class ImageMessage(ChatMessage):
@@ -151,13 +193,34 @@ class ImageMessage(ChatMessage):
         super(ImageMessage, self).__init__(images)
 
 
+class MessageImage:
+    """Represents an image inside a text message
+
+    Args:
+      url (str): Image URL
+    """
+    url = None
+
+    def __init__(self, url):
+        self.url = url
+
+    # Convert instance to string
+    def __str__(self):
+        return '<{}>'.format(self.url)
+
+
 class MessageDelay(ChatAction):
     """Represents a message delay"""
+    # Delay in seconds
+    seconds = 5
 
     def __init__(self):
         super().__init__()
 
     # Define acion to execute
     def exec(self):
-        # Sleep for five seconds
-        time.sleep(5)
+        time.sleep(self.seconds)
+
+    # Define action to execute inside an event loop
+    async def exec_async(self):
+        await asyncio.sleep(self.seconds)
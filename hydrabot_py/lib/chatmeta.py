@@ -61,6 +61,11 @@ class ChatAction(ABC):
         """Defines calls to perform upon execution"""
         pass
 
+    async def exec_async(self):
+        """Defines calls to perform upon execution inside an event loop,
+        defaults to synchronous execution"""
+        self.exec()
+
     # Convert instance to string
     def __str__(self):
         return '<<{0}>>'.format(self.__class__.__name__)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   CIRCUIT BREAKER - circuitbreaker.py
+
+   Stops requests to failing services for an exponentially
+   growing amount of time
+"""
+
+
+# Dependencies
+import random
+import threading
+# Local dependencies
+from .timehelper import Clock
+
+
+class CircuitBreaker:
+    """Stops requests to a failing service for an exponentially
+    growing, jittered amount of time
+
+    After failure_threshold consecutive failures the breaker opens,
+    once its delay has passed a single trial request is allowed
+    again (half open), a success closes the breaker. Requests have to
+    be claimed by start_request(), so only one caller gets the trial
+
+    Args:
+      failure_threshold (int): Consecutive failures opening breaker (3)
+      base_delay (float): Seconds to stay open after first opening (5)
+      max_delay (float): Maximum seconds to stay open (900)
+      clock (Clock): Clock to get current time from (Clock())
+    """
+    failure_threshold = None
+    base_delay = None
+    max_delay = None
+    clock = None
+    failures = 0
+    retry_at = None
+    trial = False
+    lock = None
+
+    def __init__(self, failure_threshold=3, base_delay=5, max_delay=900,
+                 clock=None):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock or Clock()
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        """Indicates whether requests are currently blocked"""
+        return (self.retry_at is not None
+                and self.clock.monotonic() < self.retry_at)
+
+    def allows_request(self):
+        """Indicates whether a request may be made now, which isn't
+        the case while the trial request of a half open breaker runs"""
+        if self.is_open():
+            return False
+
+        return self.retry_at is None or not self.trial
+
+    def start_request(self):
+        """Claims a request, granting the trial request of a half open
+        breaker to a single caller only
+
+        Returns:
+          allowed (bool): Whether request may be made
+        """
+        with self.lock:
+            if not self.allows_request():
+                return False
+
+            if self.retry_at is not None:
+                self.trial = True
+
+            return True
+
+    def release(self):
+        """Ends trial request without an outcome, e.g. if it didn't
+        fail because of the service itself"""
+        self.trial = False
+
+    def record_success(self):
+        """Closes breaker after a successful request"""
+        self.failures = 0
+        self.retry_at = None
+        self.trial = False
+
+    def record_failure(self):
+        """Counts failed request and opens breaker if threshold is met"""
+        self.failures += 1
+        self.trial = False
+
+        if self.failures < self.failure_threshold:
+            return
+
+        # Double delay with every failure beyond threshold
+        exponent = self.failures - self.failure_threshold
+        delay = min(self.base_delay * 2 ** exponent, self.max_delay)
+
+        # Jitter delay, so several processes don't retry simultaneously
+        delay = random.uniform(delay / 2, delay)
+
+        self.retry_at = self.clock.monotonic() + delay
+
+    def get_state(self):
+        """Get state as string (closed, open or half open)"""
+        if self.retry_at is None:
+            return 'closed'
+
+        return 'open' if self.is_open() else 'half open'
+
+    # Convert instance to string
+    def __str__(self):
+        return '{} ({} failures)'.format(self.get_state(), self.failures)
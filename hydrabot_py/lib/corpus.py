@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   CORPUS - corpus.py
+
+   Provides message collections to sample rounds from, either
+   held in memory or memory-mapped from a message file
+"""
+
+
+# Dependencies
+from abc import ABC, abstractmethod
+from array import array
+import mmap
+import os
+import random
+import re
+# Local dependencies
+from .chatmessages import MessageTemplate
+
+
+class MessageCorpus(ABC):
+    """A message collection abstract base class"""
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    @abstractmethod
+    def __getitem__(self, index):
+        """Get MessageTemplate at index"""
+        pass
+
+    def sample(self, count, history=None):
+        """Get random messages without copying or shuffling collection
+
+        Args:
+          count (int): Number of messages
+          history (SendHistory):
+            Recently sent messages, which are only picked
+            if there aren't enough other messages (None)
+
+        Returns:
+          messages (list): MessageTemplate instances
+        """
+        count = min(count, len(self))
+        # Every recently sent message might be drawn, draw that many more
+        spare = len(history) if history is not None else 0
+        indexes = random.sample(range(len(self)),
+                                min(count + spare, len(self)))
+        messages = []
+        recent = []
+
+        for index in indexes:
+            message = self[index]
+
+            if history is not None and message.text in history:
+                recent.append(message)
+            else:
+                messages.append(message)
+
+            if len(messages) == count:
+                return messages
+
+        # Not enough other messages, fill up with recently sent ones
+        return messages + recent[:count - len(messages)]
+
+    def close(self):
+        """Releases resources held by collection"""
+        pass
+
+
+class ListCorpus(MessageCorpus):
+    """Message collection held in memory
+
+    Args:
+      messages (list): Message texts
+    """
+    messages = None
+
+    def __init__(self, messages):
+        # Compile messages once, invalid placeholders are rejected here
+        self.messages = [MessageTemplate(message) for message in messages]
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
+
+
+class FileCorpus(MessageCorpus):
+    """Message collection memory-mapped from a message file
+
+    The file holds one message per line, line breaks inside messages
+    are written as "\\n". An index of line offsets is built next to it
+    ("<path>.idx") and memory-mapped as well, so resident memory stays
+    flat regardless of the file's size
+
+    Args:
+      path (str): Path to message file
+
+    Raises:
+      ValueError: If file contains no messages or invalid placeholders
+    """
+    path = None
+    file = None
+    map = None
+    index_file = None
+    index_map = None
+    offsets = None
+    # Escape sequence RegExp pattern
+    escape_pattern = re.compile(r'\\(.)')
+    escapes = {'n': '\n', 't': '\t', '\\': '\\'}
+
+    def __init__(self, path):
+        self.path = path
+        index_path = path + '.idx'
+
+        # Build index if missing or outdated
+        if (not os.path.exists(index_path)
+                or os.path.getmtime(index_path) < os.path.getmtime(path)):
+            self.build_index(path, index_path)
+
+        if not os.path.getsize(index_path):
+            raise ValueError('Message file "{}" is empty'.format(path))
+
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.index_file = open(index_path, 'rb')
+        self.index_map = mmap.mmap(
+            self.index_file.fileno(), 0, access=mmap.ACCESS_READ
+        )
+
+        # Pairs of start and end offsets
+        self.offsets = memoryview(self.index_map).cast('Q')
+
+    @classmethod
+    def unescape(cls, line):
+        """Turns escaped line into message text"""
+        return cls.escape_pattern.sub(
+            lambda match: cls.escapes.get(match.group(1), match.group(0)),
+            line
+        )
+
+    @staticmethod
+    def escape(text):
+        """Turns message text into a single escaped line"""
+        return (text.replace('\\', '\\\\')
+                .replace('\n', '\\n')
+                .replace('\t', '\\t'))
+
+    @classmethod
+    def build_index(cls, path, index_path):
+        """Builds index of message offsets, validates every message"""
+        offsets = array('Q')
+        position = 0
+
+        with open(path, 'rb') as f:
+            for line in f:
+                start = position
+                position += len(line)
+                line = line.rstrip(b'\r\n')
+
+                # Skip blank lines
+                if not line.strip():
+                    continue
+
+                # Rejects invalid placeholders
+                MessageTemplate(cls.unescape(line.decode('utf-8')))
+
+                offsets.append(start)
+                offsets.append(start + len(line))
+
+        # Replace index atomically, as other processes might read it
+        temp_path = '{}.{}.tmp'.format(index_path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            offsets.tofile(f)
+        os.replace(temp_path, index_path)
+
+    @classmethod
+    def write(cls, path, messages):
+        """Writes message texts to a message file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for message in messages:
+                f.write(cls.escape(message) + '\n')
+
+    def __len__(self):
+        return len(self.offsets) // 2
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError('Message index out of range')
+
+        start = self.offsets[index * 2]
+        end = self.offsets[index * 2 + 1]
+        line = self.map[start:end].decode('utf-8')
+
+        return MessageTemplate(self.unescape(line))
+
+    def close(self):
+        """Releases memory maps and files"""
+        self.offsets.release()
+        self.index_map.close()
+        self.index_file.close()
+        self.map.close()
+        self.file.close()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   DELIVERY - delivery.py
+
+   Runs message deliveries of many conversations interleaved
+   on a single asyncio event loop
+"""
+
+
+# Dependencies
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import threading
+
+
+class DeliveryEngine:
+    """Runs message deliveries of many conversations interleaved on a
+    single asyncio event loop inside a background thread
+
+    Typing delays and pauses are awaited on the event loop, while
+    blocking calls (e.g. to fbchat) are run in a bounded thread pool
+
+    Args:
+      max_workers (int): Maximum threads for blocking calls (8)
+    """
+    loop = None
+    executor = None
+    thread = None
+    futures = None
+    locks = None
+
+    def __init__(self, max_workers=8):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='delivery'
+        )
+        self.futures = set()
+        self.locks = {}
+
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.executor)
+
+        self.thread = threading.Thread(
+            target=self.loop.run_forever,
+            name='delivery-loop',
+            daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, coroutine, key=None):
+        """Schedules coroutine on the event loop, coroutines sharing
+        the same key are run one after another
+
+        Args:
+          coroutine (coroutine): Coroutine to run
+          key (hashable): Serialization key, e.g. recipient (None)
+
+        Returns:
+          future (concurrent.futures.Future): Future of coroutine's result
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.run_serialized(coroutine, key),
+            self.loop
+        )
+
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+
+        return future
+
+    async def run_serialized(self, coroutine, key):
+        """Awaits coroutine once previous ones with same key are done"""
+        if key is None:
+            return await coroutine
+
+        # Locks are only ever touched from within the event loop
+        lock = self.locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            return await coroutine
+
+    async def call(self, func, *args, **kwargs):
+        """Runs blocking function in thread pool and awaits its result"""
+        # Function sees context of calling delivery, e.g. its call counts
+        context = contextvars.copy_context()
+
+        return await self.loop.run_in_executor(
+            self.executor,
+            functools.partial(context.run, func, *args, **kwargs)
+        )
+
+    async def sleep(self, seconds):
+        """Pauses current delivery without blocking others"""
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def pending(self):
+        """Counts deliveries which haven't finished yet"""
+        return len(self.futures)
+
+    def wait(self, timeout=None):
+        """Waits for all pending deliveries to finish
+
+        Args:
+          timeout (float): Maximum seconds to wait, None -> no limit (None)
+        """
+        concurrent.futures.wait(list(self.futures), timeout=timeout)
+
+    def shutdown(self):
+        """Stops event loop and thread pool, pending deliveries are dropped"""
+        if not self.loop.is_running():
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.executor.shutdown(wait=False)
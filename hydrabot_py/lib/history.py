@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   HISTORY - history.py
+
+   Remembers which messages and images were recently sent to a
+   conversation within a fixed amount of memory, so they can be
+   avoided for a while, even across restarts
+"""
+
+
+# Dependencies
+from array import array
+import hashlib
+import sqlite3
+import struct
+import threading
+
+
+class SendHistory:
+    """Fixed size history of recently sent items
+
+    The most recent items are kept as 64 bit fingerprints in a ring
+    buffer, a counting Bloom filter answers membership checks in
+    constant time and forgets items once they leave the ring buffer
+
+    Args:
+      capacity (int): Number of recent items to remember (100)
+    """
+    capacity = None
+    fingerprints = None
+    counters = None
+    head = 0
+    size = 0
+
+    # Counters per remembered item, hashes per item
+    counters_per_item = 10
+    hash_count = 7
+    # Header of serialized history (capacity, size, head)
+    header = struct.Struct('<III')
+
+    def __init__(self, capacity=100):
+        self.capacity = max(1, capacity)
+        self.fingerprints = array('Q', bytes(8 * self.capacity))
+        self.counters = array('B', bytes(self.counters_per_item
+                                         * self.capacity))
+
+    @staticmethod
+    def get_fingerprint(item):
+        """Get 64 bit fingerprint of item's string representation"""
+        digest = hashlib.blake2b(
+            str(item).encode('utf-8'), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, 'little')
+
+    def get_slots(self, fingerprint):
+        """Get counter indexes of fingerprint (double hashing)"""
+        low = fingerprint & 0xFFFFFFFF
+        high = (fingerprint >> 32) | 1
+
+        return [(low + i * high) % len(self.counters)
+                for i in range(self.hash_count)]
+
+    def add(self, item):
+        """Remembers item, forgets oldest item if history is full"""
+        # Forget oldest item
+        if self.size == self.capacity:
+            for slot in self.get_slots(self.fingerprints[self.head]):
+                if self.counters[slot] not in (0, 255):
+                    self.counters[slot] -= 1
+        else:
+            self.size += 1
+
+        fingerprint = self.get_fingerprint(item)
+
+        # Counters saturate instead of overflowing
+        for slot in self.get_slots(fingerprint):
+            if self.counters[slot] < 255:
+                self.counters[slot] += 1
+
+        self.fingerprints[self.head] = fingerprint
+        self.head = (self.head + 1) % self.capacity
+
+    def __contains__(self, item):
+        """Indicates whether item was (probably) sent recently"""
+        return all(self.counters[slot]
+                   for slot in self.get_slots(self.get_fingerprint(item)))
+
+    def __len__(self):
+        return self.size
+
+    def to_bytes(self):
+        """Serializes history"""
+        return (self.header.pack(self.capacity, self.size, self.head)
+                + self.fingerprints.tobytes()
+                + self.counters.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data, capacity=100):
+        """Restores history, starts empty if capacity has changed
+
+        Args:
+          data (bytes): Serialized history, may be None
+          capacity (int): Number of recent items to remember (100)
+
+        Returns:
+          history (SendHistory): Restored history
+        """
+        history = cls(capacity)
+
+        if not data or len(data) != len(history.to_bytes()):
+            return history
+
+        stored_capacity, size, head = cls.header.unpack_from(data)
+
+        if stored_capacity != history.capacity:
+            return history
+
+        offset = cls.header.size
+        history.size = size
+        history.head = head
+        history.fingerprints = array('Q')
+        history.fingerprints.frombytes(
+            data[offset:offset + 8 * history.capacity]
+        )
+        history.counters = array('B')
+        history.counters.frombytes(data[offset + 8 * history.capacity:])
+
+        return history
+
+
+class HistoryStore:
+    """Persists histories of every conversation in an SQLite database
+
+    Args:
+      path (str): SQLite database file, None keeps histories in memory (None)
+      capacity (int): Number of recent items to remember per history (100)
+    """
+    connection = None
+    lock = None
+    capacity = None
+
+    # Database schema
+    schema = '''
+        CREATE TABLE IF NOT EXISTS history (
+            thread TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (thread, kind)
+        );
+    '''
+
+    def __init__(self, path=None, capacity=100):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(
+            path or ':memory:',
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+
+        # Allow other processes to read while one is writing
+        if path:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+
+        self.connection.executescript(self.schema)
+
+    def load(self, thread, kind):
+        """Get stored history
+
+        Args:
+          thread (str): Conversation the history belongs to
+          kind (str): Kind of items, e.g. "messages" or "images"
+
+        Returns:
+          history (SendHistory): Stored or new history
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT data FROM history WHERE thread = ? AND kind = ?',
+                (thread, kind)
+            ).fetchone()
+
+        return SendHistory.from_bytes(row and row[0], self.capacity)
+
+    def save(self, thread, kind, history):
+        """Stores history, replacing the previous one"""
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO history (thread, kind, data) '
+                'VALUES (?, ?, ?)',
+                (thread, kind, history.to_bytes())
+            )
+
+    def close(self):
+        """Closes database connection"""
+        with self.lock:
+            self.connection.close()
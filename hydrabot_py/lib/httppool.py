@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   HTTP POOL - httppool.py
+
+   Provides keep-alive connection pools shared by every outbound
+   HTTP client, so connections (and their TLS handshakes) are reused
+"""
+
+
+# Dependencies
+import certifi
+import httplib2
+import urllib3
+from requests.adapters import HTTPAdapter
+
+
+class HttpPool:
+    """Keep-alive connection pools shared by every outbound HTTP client
+
+    Giphy's client uses the pools directly, fbchat's requests session
+    through PooledAdapter and googleapiclient through PooledHttp. Google
+    Image Search checks its results by HEAD requests of its own, which
+    aren't routed, as they go to many hosts which would only crowd out
+    the pools of the API hosts
+
+    Args:
+      num_pools (int): Number of hosts to keep connections for (10)
+      maxsize (int): Maximum kept-alive connections per host (10)
+      connect_timeout (float): Seconds to wait for connecting (10)
+      read_timeout (float):
+        Seconds to wait for data, unless client sets its own (30)
+    """
+    pool_manager = None
+
+    def __init__(self, num_pools=10, maxsize=10, connect_timeout=10,
+                 read_timeout=30):
+        # Stalled connections must not block searches indefinitely
+        self.pool_manager = urllib3.PoolManager(
+            num_pools=num_pools,
+            maxsize=maxsize,
+            timeout=urllib3.Timeout(connect=connect_timeout,
+                                    read=read_timeout),
+            cert_reqs='CERT_REQUIRED',
+            ca_certs=certifi.where()
+        )
+
+    def mount(self, session):
+        """Routes requests session through shared pools"""
+        adapter = PooledAdapter(self.pool_manager)
+
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    def get_http(self):
+        """Get httplib2.Http compatible client using shared pools"""
+        return PooledHttp(self.pool_manager)
+
+    def get_stats(self):
+        """Get connection reuse statistics of currently kept pools
+
+        Returns:
+          stats (dict): Requests, new connections and reused connections
+            by host
+        """
+        stats = {}
+
+        for pool_key in self.pool_manager.pools.keys():
+            pool = self.pool_manager.pools[pool_key]
+
+            stats[pool.host] = {
+                'requests': pool.num_requests,
+                'connections': pool.num_connections,
+                'reused': pool.num_requests - pool.num_connections
+            }
+
+        return stats
+
+    # Convert instance to string
+    def __str__(self):
+        stats = self.get_stats().values()
+        requests = sum(host_stats['requests'] for host_stats in stats)
+        connections = sum(host_stats['connections'] for host_stats in stats)
+
+        return '{} requests over {} connections to {} hosts'.format(
+            requests, connections, len(stats)
+        )
+
+
+class PooledAdapter(HTTPAdapter):
+    """Transport adapter for requests sessions using shared pools
+
+    Args:
+      pool_manager (urllib3.PoolManager): Shared pool manager
+      **kwargs (kwargs): Optional arguments for requests' HTTPAdapter
+    """
+    shared_pool_manager = None
+
+    def __init__(self, pool_manager, **kwargs):
+        self.shared_pool_manager = pool_manager
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        self.poolmanager = self.shared_pool_manager
+
+
+class PooledHttp:
+    """Minimal httplib2.Http compatible client using shared pools,
+    as required by googleapiclient
+
+    Args:
+      pool_manager (urllib3.PoolManager): Shared pool manager
+    """
+    pool_manager = None
+
+    def __init__(self, pool_manager):
+        self.pool_manager = pool_manager
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=5, connection_type=None):
+        """Performs request like httplib2.Http.request
+
+        Returns:
+          response, content (tuple): httplib2.Response and body bytes
+        """
+        response = self.pool_manager.request(
+            method,
+            uri,
+            body=body,
+            headers=headers,
+            retries=urllib3.Retry(
+                total=None, connect=0, read=0, status=0,
+                redirect=redirections, raise_on_redirect=False
+            )
+        )
+
+        info = dict(response.headers)
+        info['status'] = str(response.status)
+
+        http_response = httplib2.Response(info)
+        http_response.reason = response.reason
+
+        return http_response, response.data
@@ -15,21 +15,32 @@
 
 # Dependencies
 from datetime import datetime, time, timedelta
-import time as timeh
 import random
 import math
 import logging
-import sys
-import re
+import os
 # Local dependencies
-from .timehelper import TimeHelper
+from .timehelper import TimeHelper, Clock, VirtualClock
 from .types import tcolors
-from .imagesearch import ImageSearch
-from .chatbot import ChatBot
+from .recipient import Recipient
+from .scheduler import Scheduler
+from .delivery import DeliveryEngine
 from .chatmessages import (
-    ChatMessageHolder,
-    TextMessage, EmojiMessage, ImageMessage
+    ChatMessageHolder, TextMessage, EmojiMessage, ImageMessage,
+    MessageTemplate
 )
+from .corpus import ListCorpus, FileCorpus
+from .history import HistoryStore
+from .journal import SendJournal
+from .attachmentcache import AttachmentCache
+from .logqueue import LogQueue, log_and_print
+from . import metrics
+from .metrics import MetricsExporter
+from .profiler import RoundProfiler
+from .memwatch import MemoryWatchdog
+from .simulation import SendTimeline
+# ChatBot (fbchat), ImageSearch (Giphy/GIS) and HttpPool are imported
+# lazily inside HydraBot.__init__, only if configuration requires them
 
 
 
@@ -46,11 +57,16 @@ class HydraBot:
       fb_email (str):
         Facebook users email
       fb_password (str):
-        Facebook users password, None will lead to prompt
+        Facebook users password, None will lead to prompt if no
+        valid session is stored
       fb_thread_id (str):
         Facebook thread ID, defaults to users own thread
+      fb_thread_ids (list):
+        Additional Facebook thread IDs to serve with the same login (empty)
       messages (list):
         Pool of message texts to choose from
+      messages_file (str):
+        Message file to memory-map instead of messages (None)
       start_time (str):
         Format is HH:MM
       end_time (str):
@@ -101,9 +117,92 @@ class HydraBot:
         Pool of Giphy search phrases (empty)
       image_dummy_url (str):
         Dummy Image URL to use instead of search (None)
+      image_pool_min_size (int):
+        Cached search results per phrase below which a new search is made (5)
+      image_cache_file (str):
+        Image search cache database, None keeps it in memory only (None)
+      history_file (str):
+        Database of recently sent messages and images, None keeps
+        it in memory only (None)
+      history_size (int):
+        Number of recently sent messages and images to avoid per thread (100)
+      journal_file (str):
+        Journal of round plans and completed sends, which rounds are
+        resumed from after a restart, None disables it (None)
+      log_file (str):
+        File to write JSON lines log to ('hydrabot.log')
+      log_max_bytes (int):
+        Size at which the log file is rotated (5 MB)
+      log_backup_count (int):
+        Number of rotated log files to keep (3)
+      metrics_port (int):
+        Local port serving Prometheus metrics, None disables it (None)
+      metrics_file (str):
+        File to write Prometheus metrics to, None disables it (None)
+      metrics_interval (float):
+        Seconds between updates of metrics file (15)
+      profile (bool):
+        Profile rounds, dumping a pstats file per round next to log (False)
+      profile_sample_rate (float):
+        Share of rounds to profile if profiling is enabled (1)
+      memory_watchdog (bool):
+        Trace memory and report allocation sites which keep growing (False)
+      memory_watchdog_interval (float):
+        Seconds between memory snapshots (600)
+      memory_growth_threshold (int):
+        Growth in bytes between snapshots to report (10 MB)
+      simulation_days (float):
+        Simulate this many days on a virtual clock without sending
+        or searching anything, 0 runs normally (0)
+      simulation_file (str):
+        CSV file to write simulated send timeline to ('simulation.csv')
+      schedule_seed (int):
+        Seed to plan rounds with, making send times reproducible per
+        recipient and round, None plans randomly (None)
+      image_cache_ttl (float):
+        Seconds until cached image search results expire (3 days)
+      attachment_cache_file (str):
+        Database of images uploaded to Facebook, which are reused
+        instead of uploaded again, None disables it (None)
+      attachment_cache_ttl (float):
+        Seconds until uploaded images are uploaded anew (7 days)
+      attachment_cache_size (int):
+        Number of cached image URLs and contents (2000)
+      image_processing (bool):
+        Shrink images in worker processes before uploading them,
+        requires Pillow (False)
+      image_max_dimension (int):
+        Maximum width and height of uploaded images in pixels (1024)
+      image_max_bytes (int):
+        Size in bytes uploaded images should fit in (2 MB)
+      image_processing_workers (int): Worker processes shrinking images (2)
+      image_processing_timeout (float):
+        Seconds to wait for shrunk images, which are uploaded as they
+        are otherwise (30)
+      gis_daily_quota (int):
+        GIS requests allowed per day, spread across timespan (100)
+      session_file (str):
+        Session file holding cookies of every account, reused instead
+        of logging in again, None disables it ('session.json')
+      session_refresh_interval (float):
+        Seconds between checking and storing session cookies (3600)
+      thread_cache_ttl (float):
+        Seconds until fetched thread infos (e.g. emoji) expire (300)
       user_agent (str):
         User agent to use for login, None will lead to random agent
+      delivery_max_workers (int):
+        Maximum threads for blocking Messenger calls during delivery (8)
+      http_pool_hosts (int):
+        Number of hosts to keep alive HTTP connections for (10)
+      http_pool_maxsize (int):
+        Maximum kept alive HTTP connections per host (10)
+      http_connect_timeout (float):
+        Seconds to wait for HTTP connections to be established (10)
+      http_read_timeout (float):
+        Seconds to wait for HTTP responses to send data (30)
     """
+    start_time = None
+    end_time = None
     start_datetime = None
     end_datetime = None
     messages = None
@@ -119,20 +218,37 @@ class HydraBot:
     max_messages_per_hour = None
 
     chatbot = None
-    round = 0
-    round_messages = []
-    round_intervals = []
-    run_num = 0
-    active = False
+    http_pool = None
+    clock = None
+    delivery = None
+    recipients = None
+    scheduler = None
+    history_store = None
+    journal = None
+    attachment_cache = None
+    image_processor = None
+    log_queue = None
+    log_file = None
+    log_max_bytes = None
+    log_backup_count = None
+    metrics_exporter = None
+    profiler = None
+    memory_watchdog = None
+    timeline = None
+    simulation_end = None
+    simulation_file = None
+    planner = None
     timespan_sec = 0
     message_ratio = 0
     image_search = None
     demo_mode = None
     test_mode = None
+    cleaned_up = False
 
     def __init__(self, fb_email, fb_password, fb_thread_id,
                  messages,
                  start_time, end_time,
+                 fb_thread_ids=[], messages_file=None,
                  min_message_ratio=0, max_message_ratio=None,
                  text_chance_per_message=1,
                  emojis=[], emojis_count_range='1-1',
@@ -143,12 +259,37 @@ class HydraBot:
                  demo_mode=False, test_mode=False,
                  gis_api_key=None, gis_project_cx=None, gis_search_phrases=[],
                  giphy_api_key=None, giphy_search_phrases=[],
-                 image_dummy_url=None,
-                 user_agent=None):
+                 image_dummy_url=None, image_pool_min_size=5,
+                 image_cache_file=None, image_cache_ttl=259200,
+                 attachment_cache_file=None, attachment_cache_ttl=604800,
+                 attachment_cache_size=2000,
+                 image_processing=False, image_max_dimension=1024,
+                 image_max_bytes=2097152, image_processing_workers=2,
+                 image_processing_timeout=30,
+                 history_file=None, history_size=100, journal_file=None,
+                 log_file='hydrabot.log', log_max_bytes=5242880,
+                 log_backup_count=3,
+                 metrics_port=None, metrics_file=None, metrics_interval=15,
+                 profile=False, profile_sample_rate=1,
+                 memory_watchdog=False, memory_watchdog_interval=600,
+                 memory_growth_threshold=10485760,
+                 simulation_days=0, simulation_file='simulation.csv',
+                 schedule_seed=None,
+                 gis_daily_quota=100,
+                 session_file='session.json', session_refresh_interval=3600,
+                 thread_cache_ttl=300,
+                 user_agent=None,
+                 delivery_max_workers=8,
+                 http_pool_hosts=10, http_pool_maxsize=10,
+                 http_connect_timeout=10, http_read_timeout=30):
         if max_message_ratio is None:
             max_message_ratio = min_message_ratio
 
-        self.messages = messages
+        # Invalid placeholders are rejected here
+        if messages_file:
+            self.messages = FileCorpus(messages_file)
+        else:
+            self.messages = ListCorpus(messages)
         self.text_chance_per_message = text_chance_per_message
         self.emojis = emojis
         self.emojis_chance_per_message = emojis_chance_per_message
@@ -163,27 +304,144 @@ class HydraBot:
         self.image_dummy_url = image_dummy_url
         self.thread_emoji = thread_emoji
         self.change_emoji_chance = change_emoji_chance
-        self.demo_mode = demo_mode
+        # Simulations never touch Messenger
+        self.demo_mode = demo_mode or bool(simulation_days)
         self.test_mode = test_mode
+        self.log_file = log_file
+        self.log_max_bytes = log_max_bytes
+        self.log_backup_count = log_backup_count
+
+        # Set up logging first, so nothing logged on startup gets lost
+        self.config()
+
+        # Trace memory from the start, so everything allocated later
+        # can be compared against it
+        if memory_watchdog:
+            self.memory_watchdog = MemoryWatchdog(
+                interval=memory_watchdog_interval,
+                threshold=memory_growth_threshold
+            )
+            self.memory_watchdog.start()
+
+        # Expose metrics only if asked to
+        if metrics_port is not None or metrics_file is not None:
+            self.metrics_exporter = MetricsExporter(
+                port=metrics_port,
+                path=metrics_file,
+                interval=metrics_interval
+            )
+            self.metrics_exporter.start()
+
+        # Profiles are dumped next to the log
+        self.profiler = RoundProfiler(
+            os.path.dirname(os.path.abspath(log_file)),
+            sample_rate=profile_sample_rate if profile else 0
+        )
+
+        # Images are only searched if they may be sent and an engine is set up
+        uses_images = (
+            image_chance_per_message > 0
+            and not simulation_days
+            and bool(giphy_api_key or (gis_api_key and gis_project_cx))
+        )
+
+        # Every outbound HTTP client shares the same connections
+        if uses_images or not self.demo_mode:
+            from .httppool import HttpPool
+
+            self.http_pool = HttpPool(
+                num_pools=http_pool_hosts,
+                maxsize=http_pool_maxsize,
+                connect_timeout=http_connect_timeout,
+                read_timeout=http_read_timeout
+            )
+
+        # Only connect to Facebook if not in demo mode
+        if not self.demo_mode:
+            from .chatbot import ChatBot
+
+            # Images sent to several recipients are only uploaded once
+            if attachment_cache_file:
+                self.attachment_cache = AttachmentCache(
+                    attachment_cache_file,
+                    ttl=attachment_cache_ttl,
+                    max_size=attachment_cache_size
+                )
+
+            # Shrunk images are uploaded, which requires a cache,
+            # even if it's only kept in memory
+            if image_processing:
+                from .imageprocessor import ImageProcessor
+
+                self.image_processor = ImageProcessor(
+                    max_dimension=image_max_dimension,
+                    max_bytes=image_max_bytes,
+                    workers=image_processing_workers,
+                    timeout=image_processing_timeout
+                )
+
+                if self.attachment_cache is None:
+                    self.attachment_cache = AttachmentCache(
+                        ttl=attachment_cache_ttl,
+                        max_size=attachment_cache_size
+                    )
 
-        if not demo_mode:
             self.chatbot = ChatBot(
                 email=fb_email,
                 password=fb_password,
+                session_file=session_file,
+                session_refresh_interval=session_refresh_interval,
+                thread_cache_ttl=thread_cache_ttl,
+                attachment_cache=self.attachment_cache,
+                image_processor=self.image_processor,
                 thread_id=fb_thread_id,
-                user_agent=user_agent
+                user_agent=user_agent,
+                http_pool=self.http_pool
             )
 
-        start_time, end_time = TimeHelper.strings_to_times(
-            start_time,
-            end_time
-        )
+        # Simulated time passes as soon as the bot sleeps
+        if simulation_days:
+            self.clock = VirtualClock()
+            self.simulation_end = (self.clock.now()
+                                   + timedelta(days=simulation_days))
+            self.simulation_file = simulation_file
+        else:
+            self.clock = Clock()
+        self.delivery = DeliveryEngine(max_workers=delivery_max_workers)
+
+        # Only set up image engines if images are used
+        if uses_images:
+            from .imagesearch import ImageSearch
+
+            self.image_search = ImageSearch(
+                gis_api_key=gis_api_key,
+                gis_project_cx=gis_project_cx,
+                gis_search_phrases=gis_search_phrases,
+                giphy_api_key=giphy_api_key,
+                giphy_search_phrases=giphy_search_phrases,
+                pool_min_size=image_pool_min_size,
+                cache_file=image_cache_file,
+                cache_ttl=image_cache_ttl,
+                gis_daily_quota=gis_daily_quota,
+                http_pool=self.http_pool
+            )
 
-        self.start_datetime, self.end_datetime = self.get_datetimes(
+        self.start_time, self.end_time = TimeHelper.strings_to_times(
             start_time,
             end_time
         )
 
+        if simulation_days:
+            self.timeline = SendTimeline(self.start_time, self.end_time)
+
+        # Seeded rounds are planned with NumPy, which is only needed then
+        if schedule_seed is not None:
+            from .schedule import SchedulePlanner
+
+            self.planner = SchedulePlanner(schedule_seed)
+
+        self.update_window()
+
         self.timespan_sec, _, _ = self.calc_timings(
             self.start_datetime,
             self.end_datetime
@@ -191,33 +449,39 @@ class HydraBot:
 
         self.emojis_count_range_text = emojis_count_range
 
-        self.image_search = ImageSearch(
-            gis_api_key=gis_api_key,
-            gis_project_cx=gis_project_cx,
-            gis_search_phrases=gis_search_phrases,
-            giphy_api_key=giphy_api_key,
-            giphy_search_phrases=giphy_search_phrases
-        )
+        self.recipients = []
+        self.scheduler = Scheduler()
+        self.history_store = HistoryStore(history_file, capacity=history_size)
 
-        self.config()
-        self.start()
+        # Simulated and test rounds mustn't be resumed by real ones
+        if journal_file and not (simulation_days or test_mode):
+            self.journal = SendJournal(journal_file)
+
+        # Serve main thread plus any additional ones
+        self.add_recipient(fb_thread_id)
+
+        for thread_id in fb_thread_ids:
+            self.add_recipient(thread_id)
 
     def config(self):
         """Initial configuration for the bot"""
         # CONFIGURE LOGGERS
-        # Add mode prefixes to logging format
-        prefix = ''
-
-        prefix += (' [DEMO]' if self.demo_mode else '')
-        prefix += (' [TEST]' if self.test_mode else '')
-
-        logging.basicConfig(
-            filename='hydrabot.log',
-            filemode='a',
-            format='[%(asctime)s]{} %(message)s'.format(prefix),
-            datefmt='%d.%m.%Y %H:%M',
-            level=logging.INFO
+        # Add modes to every log entry
+        modes = []
+
+        if self.demo_mode:
+            modes.append('demo')
+        if self.test_mode:
+            modes.append('test')
+
+        # Records are written by a background thread
+        self.log_queue = LogQueue(
+            self.log_file,
+            modes=modes,
+            max_bytes=self.log_max_bytes,
+            backup_count=self.log_backup_count
         )
+        self.log_queue.start()
 
         # Silence Google API Client discovery logger
         logging.getLogger('googleapiclient.discovery').setLevel(logging.ERROR)
@@ -230,22 +494,21 @@ class HydraBot:
         # Silence FB Client logger
         logging.getLogger('client').setLevel(logging.ERROR)
 
-    def get_datetimes(self, start_time, end_time):
-        """Get datetimes for given start and end time objects"""
-        # Check whether time logic and given numbers correspond
-        start_datetime, end_datetime = TimeHelper.combine(start_time, end_time)
-
-        # Time was given across midnight, so we increase end time
-        # by one day
-        if end_datetime < start_datetime:
-            end_datetime += timedelta(days=1)
-
-        # TODO: Check again whether that's required
-        # if start_datetime < datetime.now():
-        #     start_datetime += timedelta(days=1)
-        #     end_datetime += timedelta(days=1)
+    def update_window(self):
+        """Moves designated timespan to the one either running now
+        or following next, also takes care of day rollovers"""
+        self.start_datetime, self.end_datetime = TimeHelper.get_window(
+            self.start_time,
+            self.end_time,
+            self.clock.now()
+        )
 
-        return start_datetime, end_datetime
+        # Spread search quotas across the same timespan
+        if self.image_search is not None:
+            self.image_search.set_window(
+                self.start_datetime,
+                self.end_datetime
+            )
 
     def calc_timings(self, start_time, end_time):
         """Calculate/generate required timings based off time objects"""
@@ -272,7 +535,7 @@ class HydraBot:
         """Indicates wherer current time is in between bot's
         designated timespan as boolean"""
         return TimeHelper.is_between(
-            self.start_datetime, self.end_datetime, datetime.now()
+            self.start_datetime, self.end_datetime, self.clock.now()
         )
 
     def calculate_intervals(self, timespan_sec, message_ratio, message_count):
@@ -317,7 +580,7 @@ class HydraBot:
         message_time_texts = []
 
         for seconds in intervals:
-            time_now = datetime.now()
+            time_now = self.clock.now()
             target_datetime = time_now + timedelta(seconds=seconds)
 
             message_text = target_datetime.strftime('%H:%M')
@@ -330,12 +593,17 @@ class HydraBot:
         HydraBot.log_and_print('Calculated message times: '
                                + (', '.join(message_time_texts)))
 
-    def round_start(self):
-        """Start a new round"""
+    def round_start(self, recipient):
+        """Start a new round
+
+        Args:
+          recipient (Recipient): Recipient to start round for
+        """
         # Caculate timespans
         start_time_diff_sec = TimeHelper.get_start_time_difference_sec(
             self.start_datetime,
-            self.end_datetime
+            self.end_datetime,
+            self.clock.now()
         )
         timespan_sec = self.timespan_sec - start_time_diff_sec
         timespan_hours = timespan_sec / 60 / 60
@@ -343,15 +611,27 @@ class HydraBot:
 
         # Adjust max messages if number was too high
         if timespan_hours * max_messages_ratio >= len(self.messages):
-            max_messages_ratio = len(self.messages) - 1
-
-        # Calculate ratio for messages
-        message_ratio = timespan_hours * random.uniform(
-            self.min_messages_per_hour,
-            max_messages_ratio
-        )
+            max_messages_ratio = (len(self.messages) - 1) / timespan_hours
+
+        # Plan round reproducibly from seed, recipient and round
+        if self.planner is not None:
+            intervals = self.planner.plan_round(
+                str(recipient),
+                recipient.round,
+                timespan_sec,
+                self.min_messages_per_hour,
+                max_messages_ratio
+            )
+            message_count = len(intervals)
+            message_ratio = message_count
+        else:
+            # Calculate ratio for messages
+            message_ratio = timespan_hours * random.uniform(
+                self.min_messages_per_hour,
+                max_messages_ratio
+            )
 
-        message_count = math.floor(message_ratio)
+            message_count = math.floor(message_ratio)
 
         # Less than a single message in total
         if message_count < 1:
@@ -359,72 +639,108 @@ class HydraBot:
             message_ratio = 1
 
             HydraBot.log_and_print(
-                tcolors.WARNING
-                + 'Not enough time for minimum message amount given\n'
-                + tcolors.OKGREEN
-                + 'Forcing at least a single message...'
-                + tcolors.ENDC
+                'Not enough time for minimum message amount given',
+                color=tcolors.WARNING
+            )
+            HydraBot.log_and_print(
+                'Forcing at least a single message...',
+                color=tcolors.OKGREEN
             )
 
         # Calculate intervals
-        intervals = self.calculate_intervals(
-            timespan_sec=timespan_sec,
-            message_ratio=message_ratio,
-            message_count=message_count
-        )
+        if self.planner is None:
+            intervals = self.calculate_intervals(
+                timespan_sec=timespan_sec,
+                message_ratio=message_ratio,
+                message_count=message_count
+            )
 
-        # Prepare shuffled messages
-        messages = self.messages.copy()
-        random.shuffle(messages)
-        messages = messages[slice(0, message_count)]
+        # Pick random messages, only those are read from the collection,
+        # recently sent ones are avoided
+        messages = self.messages.sample(message_count,
+                                        history=recipient.sent_messages)
         # Uncomment bottom line for always forcing first message
         # Useful to perpously debug a single message
         #messages[0] = self.messages[2]  # Debug
 
         # Set round variables
-        self.round_messages = messages
-        self.round_intervals = intervals
+        recipient.round += 1
+        recipient.round_messages = messages
+        recipient.round_intervals = intervals
+        recipient.round_started = self.clock.monotonic()
+        recipient.round_window = self.start_datetime
+        recipient.run_num = 0
+        recipient.done = False
+
+        # Plan is on disk before anything of it is sent
+        if self.journal is not None:
+            self.journal.record_round(
+                str(recipient),
+                recipient.round,
+                recipient.round_window,
+                self.clock.now(),
+                intervals,
+                messages
+            )
 
         # Info about intervals
         HydraBot.log_and_print(
-            tcolors.OKGREEN
-            + ('Generated {} message{}').format(
+            'Generated {} message{} for {}'.format(
                 message_count,
-                's' if message_count > 1 else ''
-            )
-            + tcolors.ENDC
+                's' if message_count > 1 else '',
+                recipient
+            ),
+            color=tcolors.OKGREEN
         )
 
         self.show_datetimes_for_intervals(intervals)
 
+        # Info about connection reuse
+        if self.http_pool is not None:
+            HydraBot.log_and_print('HTTP: {}'.format(self.http_pool))
+
+        # Info about search quota
+        if (self.image_search is not None
+                and self.image_search.gis_quota is not None):
+            HydraBot.log_and_print(
+                'GIS quota: {}'.format(self.image_search.gis_quota)
+            )
+
+        # Info about traced memory
+        if self.memory_watchdog is not None:
+            HydraBot.log_and_print('Memory: {}'.format(self.memory_watchdog))
+
     @staticmethod
-    def log_and_print(*args):
-        """Log and print something"""
-        print(*args)
+    def log_and_print(*args, color=None):
+        """Log and print something, only enqueues it for the log writer
 
-        # Remove ANSI escape characters for logging
-        ansi_re = re.compile(r'\x1b\[[0-9;]*m')
-        logging.info(' '.join(re.sub(ansi_re, '', str(a))
-                              for a in args).encode('utf-8'))
+        Args:
+          *args: Objects to log, joined by spaces
+          color (str): Color to print in, one of tcolors (None)
+        """
+        log_and_print(*args, color=color)
 
     @staticmethod
     def log_and_print_line():
         """Log and print long line"""
         HydraBot.log_and_print('=' * 25)
 
-    def sleep(self, seconds):
-        """Sleep if not in demo mode"""
+    async def sleep(self, seconds):
+        """Sleep without blocking other deliveries if not in test mode"""
         if not self.test_mode:
-            timeh.sleep(seconds)
+            await self.delivery.sleep(seconds)
 
-    def get_text_message(self, run_count):
+    def get_text_message(self, recipient):
         """(Maybe) provides a TextMessage instance"""
         message_uses_text = random.uniform(0, 1) < self.text_chance_per_message
 
         if not message_uses_text:
             return None
 
-        return TextMessage(self.round_messages[run_count])
+        template = recipient.round_messages[recipient.run_num]
+        recipient.sent_messages.add(template.text)
+
+        return TextMessage(template)
 
     def get_emoji_message(self):
         """(Maybe) provides an EmojiMessage instance"""
@@ -447,235 +763,565 @@ class HydraBot:
 
         return EmojiMessage(emoji_message_text)
 
-    def get_image_message(self):
+    def get_image_message(self, recipient):
         """(Maybe) provides an ImageMessage instance"""
         image_search = self.image_search
         image_chance = self.image_chance_per_message
         message_uses_image = random.uniform(0, 1) < image_chance
 
+        # Image search isn't set up
+        if image_search is None:
+            return None
+
         if not (message_uses_image and image_search.is_ready()):
             return None
 
         image_url, search_phrase, engine_name = image_search.get_random_url(
-            gis_giphy_chance=self.image_gis_giphy_chance
+            gis_giphy_chance=self.image_gis_giphy_chance,
+            history=recipient.sent_images
         )
 
+        # No image could be found
+        if image_url is None:
+            return None
+
         # Inform about used search query
         HydraBot.log_and_print(
-            tcolors.OKGREEN
-            + ('Using image search query "{}" ({})'
-                .format(search_phrase, engine_name))
-            + tcolors.ENDC
+            'Using image search query "{}" ({})'.format(search_phrase,
+                                                        engine_name),
+            color=tcolors.OKGREEN
         )
 
+        recipient.sent_images.add(image_url)
+
         return ImageMessage(image_url)
 
-    def send_image_url(self, image_url):
+    def send_image_url(self, image_url, recipient):
         """Sends an image based off an URL"""
         if not self.demo_mode:
-            self.chatbot.send_image_url(image_url)
+            self.chatbot.send_image_url(
+                image_url,
+                thread_id=recipient.thread_id,
+                thread_type=recipient.thread_type
+            )
 
         HydraBot.log_and_print('<{}>'.format(image_url))
 
-    def announce(self):
+    async def announce(self, recipient):
         """Wave and wait a little"""
         HydraBot.log_and_print(
-            tcolors.OKBLUE
-            + '(waves and waits)'
-            + tcolors.ENDC)
+            '(waves and waits)',
+            color=tcolors.OKBLUE
+        )
 
         if not self.demo_mode:
-            self.chatbot.wave()
-            self.sleep(12)
+            await self.delivery.call(
+                self.chatbot.send_wave,
+                thread_id=recipient.thread_id,
+                thread_type=recipient.thread_type
+            )
+            await self.sleep(12)
 
-    def change_emoji(self):
+    async def change_emoji(self, recipient):
         """Changes the conversation emoji and returns the previous one"""
         previous_emoji = ''
 
         if not self.demo_mode:
-            previous_emoji = self.chatbot.get_emoji()
-            self.chatbot.set_thread_emoji(self.thread_emoji)
+            # Mostly cached, fetched along with other recipients otherwise
+            previous_emoji = await self.delivery.call(
+                self.chatbot.get_thread_emoji,
+                thread_id=recipient.thread_id
+            )
+
+            # Changing to the very same emoji is a no-op
+            if previous_emoji != self.thread_emoji:
+                await self.delivery.sleep(1)
+                await self.delivery.call(
+                    self.chatbot.set_thread_emoji,
+                    self.thread_emoji,
+                    thread_id=recipient.thread_id
+                )
 
         # Couldn't fetch previous emoji
         if previous_emoji is None:
             HydraBot.log_and_print(
-                tcolors.FAIL
-                + 'Couldn\'t fetch thread emoji :('
-                + tcolors.ENDC
+                'Couldn\'t fetch thread emoji :(',
+                color=tcolors.FAIL
             )
         else:  # Successfully fetched old emoji
             HydraBot.log_and_print(
-                tcolors.OKBLUE
-                + '(changes emoji to {})'.format(self.thread_emoji)
-                + tcolors.ENDC
+                '(changes emoji to {})'.format(self.thread_emoji),
+                color=tcolors.OKBLUE
             )
 
-            self.sleep(5)
+            await self.sleep(5)
 
         return previous_emoji
 
-    def run(self, run_count):
-        """Send single message package
+    def run(self, recipient):
+        """Prepare single message package and hand it over for delivery
 
         Args:
-          run_count (int): Number of bot runs
+          recipient (Recipient): Recipient to send package to
+
+        Returns:
+          future (concurrent.futures.Future): Future of the delivery,
+            None if package was only recorded by a simulation
         """
         chat_message_holder = None
 
         # Iterate until at least one text, image or emoji message was generated
         while not (chat_message_holder and chat_message_holder.count()):
+            if chat_message_holder is not None:
+                metrics.retries.inc(operation='package')
+
             chat_message_holder = ChatMessageHolder(
-                self.get_text_message(run_count),
-                self.get_image_message(),
+                self.get_text_message(recipient),
+                self.get_image_message(recipient),
                 self.get_emoji_message()
             )
 
-        # Log/print line
-        HydraBot.log_and_print_line()
+        self.save_history(recipient)
 
-        # Maybe change conversation emoji
-        changes_emoji = random.uniform(0, 1) < self.change_emoji_chance
-        previous_emoji = None
-
-        # Emoji for change was given and decided to perform change
-        if changes_emoji and self.thread_emoji is not None:
-            previous_emoji = self.change_emoji()
+        # Maybe change conversation emoji, if emoji for change was given
+        changes_emoji = (random.uniform(0, 1) < self.change_emoji_chance
+                         and self.thread_emoji is not None)
 
         # Maybe announce by waving before
         announces_itself = random.uniform(0, 1) < self.announce_chance
-        if announces_itself:
-            self.announce()
 
-        # Perform schedules
-        chat_messages = chat_message_holder.get_messages(shuffle=True)
-        for chat_message in chat_messages:
-            if not self.demo_mode:
-                self.chatbot.send(chat_message)
+        # Simulated packages are only recorded
+        if self.timeline is not None:
+            self.timeline.add(self.clock.now(), recipient,
+                              chat_message_holder.get_messages())
+            return None
 
+        # Packages for the same recipient are delivered one after another
+        return self.delivery.submit(
+            self.deliver(
+                recipient,
+                chat_message_holder.get_messages(shuffle=True),
+                changes_emoji=changes_emoji,
+                announces_itself=announces_itself,
+                round_num=recipient.round,
+                run_num=recipient.run_num
+            ),
+            key=recipient
+        )
+
+    async def deliver(self, recipient, chat_messages,
+                      changes_emoji=False, announces_itself=False,
+                      round_num=None, run_num=None):
+        """Deliver single message package without blocking other recipients
+
+        Args:
+          recipient (Recipient): Recipient to send package to
+          chat_messages (list): ChatMessage instances to send
+          changes_emoji (bool): Change emoji for messaging duration (False)
+          announces_itself (bool): Announce by waving before (False)
+          round_num (int): Round of package, journaled once sent (None)
+          run_num (int): Number of package within round (None)
+        """
+        try:
+            # Whole package including delays is measured
+            with metrics.track(metrics.packages, metrics.package_seconds), \
+                    metrics.count_messenger_calls() as calls:
+                # Log/print line
+                HydraBot.log_and_print_line()
+
+                previous_emoji = None
+
+                if changes_emoji:
+                    previous_emoji = await self.change_emoji(recipient)
+
+                if announces_itself:
+                    await self.announce(recipient)
+
+                # Perform schedules, package is sent as a whole
+                if self.demo_mode:
+                    for chat_message in chat_messages:
+                        HydraBot.log_and_print(
+                            str(chat_message),
+                            color=tcolors.OKBLUE
+                        )
+                else:
+                    async for chat_message in self.chatbot.send_package(
+                        chat_messages,
+                        self.delivery,
+                        thread_id=recipient.thread_id,
+                        thread_type=recipient.thread_type
+                    ):
+                        HydraBot.log_and_print(
+                            str(chat_message),
+                            color=tcolors.OKBLUE
+                        )
+
+                # Previous emoji was provided, therefore change it back
+                if previous_emoji is not None:
+                    # Changing to the very same emoji is a no-op
+                    if (not self.demo_mode
+                            and previous_emoji != self.thread_emoji):
+                        await self.delivery.sleep(1)
+                        await self.delivery.call(
+                            self.chatbot.set_thread_emoji,
+                            previous_emoji,
+                            thread_id=recipient.thread_id
+                        )
+
+                    HydraBot.log_and_print(
+                        '(changes emoji back)',
+                        color=tcolors.OKBLUE
+                    )
+
+                # Messenger limits requests per account
+                if not self.demo_mode:
+                    self.log_calls(calls)
+
+                HydraBot.log_and_print_line()
+
+            # Sent packages aren't sent again when resuming, journal
+            # may sync or compact, which mustn't block the event loop
+            if self.journal is not None and run_num is not None:
+                await self.delivery.call(self.journal.record_send,
+                                         str(recipient), round_num, run_num)
+
+        # A failed delivery mustn't stop others from being delivered
+        except Exception as e:
             HydraBot.log_and_print(
-                tcolors.OKBLUE
-                + str(chat_message)
-                + tcolors.ENDC
+                'Delivery to {} failed: {!r}'.format(recipient, e),
+                color=tcolors.FAIL
             )
 
-        # Previous emoji was provided, therefore change it back
-        if previous_emoji is not None:
-            if not self.demo_mode:
-                self.chatbot.set_thread_emoji(previous_emoji)
+    @staticmethod
+    def log_calls(calls):
+        """Inform about Messenger calls of a package
+
+        Args:
+          calls (dict): Calls by fbchat method
+        """
+        metrics.package_calls.observe(sum(calls.values()))
+
+        HydraBot.log_and_print('Messenger requests: {} ({})'.format(
+            sum(calls.values()),
+            ', '.join('{} {}'.format(call, count)
+                      for call, count in sorted(calls.items())) or 'none'
+        ))
+
+    def add_recipient(self, thread_id=None, thread_type=None):
+        """Adds a conversation to be served by this bot
+
+        Args:
+          thread_id (str): Facebook thread ID, None -> users own thread (None)
+          thread_type (ThreadType): Type of thread, None -> default (None)
+
+        Returns:
+          recipient (Recipient): The newly scheduled recipient
+        """
+        # Use user's own thread ID if none was given
+        if thread_id is None and self.chatbot is not None:
+            thread_id = self.chatbot.uid
+
+        recipient = Recipient(thread_id=thread_id, thread_type=thread_type)
+
+        # Thread infos of every recipient are fetched at once
+        if self.chatbot is not None:
+            self.chatbot.add_thread(thread_id)
+
+        recipient.sent_messages = self.history_store.load(
+            str(recipient), 'messages'
+        )
+        recipient.sent_images = self.history_store.load(
+            str(recipient), 'images'
+        )
+        self.recipients.append(recipient)
+
+        # Resumed recipient is due once its next message is,
+        # otherwise immediately to check for an active round
+        if self.resume_round(recipient) and not recipient.done:
+            deadline = self.get_send_deadline(recipient)
+            self.inform_send_deadline(recipient, deadline)
+        else:
+            deadline = self.clock.monotonic()
+
+        self.scheduler.push(deadline, recipient)
+
+        return recipient
+
+    def resume_round(self, recipient):
+        """Restores recipient's round of current timespan from journal
+
+        Args:
+          recipient (Recipient): Recipient which was just added
+
+        Returns:
+          resumed (bool): Whether a journaled round was resumed
+        """
+        if self.journal is None:
+            return False
+
+        state = self.journal.get(str(recipient))
+
+        if state is None:
+            return False
+
+        # Keep counting rounds, seeded schedules depend on them
+        recipient.round = state['round']
+
+        # Round of an earlier timespan is over anyway
+        if state['window'] != self.start_datetime.isoformat():
+            return False
+
+        # Wall clock time passed since round started counts as well
+        elapsed = self.clock.now().timestamp() - state['started']
+
+        recipient.round_messages = [MessageTemplate(text)
+                                    for text in state['messages']]
+        recipient.round_intervals = state['intervals']
+        recipient.round_started = self.clock.monotonic() - elapsed
+        recipient.round_window = self.start_datetime
+        recipient.run_num = state['sent']
+        recipient.done = not recipient.has_runs_left()
+
+        HydraBot.log_and_print(
+            'Resumed round of {} after {} of {} message{}'.format(
+                recipient,
+                recipient.run_num,
+                len(recipient.round_intervals),
+                's' if len(recipient.round_intervals) != 1 else ''
+            ),
+            color=tcolors.OKGREEN
+        )
+
+        return True
+
+    def save_history(self, recipient):
+        """Persists recently sent messages and images of recipient"""
+        self.history_store.save(str(recipient), 'messages',
+                                recipient.sent_messages)
+        self.history_store.save(str(recipient), 'images',
+                                recipient.sent_images)
+
+    def get_send_deadline(self, recipient):
+        """Get monotonic deadline of recipient's next message"""
+        if self.test_mode:
+            return self.clock.monotonic()
+
+        return (recipient.round_started
+                + recipient.round_intervals[recipient.run_num])
+
+    def get_window_deadline(self):
+        """Get monotonic deadline of next designated timespan's beginning"""
+        start_datetime = self.start_datetime
+
+        # Current timespan is already running, so wait for the next one
+        if self.is_currently_active():
+            start_datetime += timedelta(days=1)
+
+        return self.clock.deadline_at(start_datetime)
+
+    def inform_send_deadline(self, recipient, deadline):
+        """Inform about when recipient's next message is due"""
+        # Inform about actions
+        if self.demo_mode or self.test_mode:
+            if self.demo_mode and self.test_mode:
+                action = 'demo and test'
+            elif self.demo_mode:
+                action = 'demo'
+            elif self.test_mode:
+                action = 'test'
+
+            HydraBot.log_and_print(
+                'Will ' + tcolors.BOLD + action + tcolors.ENDC + ' now...')
+
+        if not self.test_mode:
+            time_now = self.clock.now()
+            time_to_sleep = deadline - self.clock.monotonic()
+            time_when_send = self.clock.datetime_at(deadline)
+            time_when_send_text = time_when_send.strftime('%H:%M')
+
+            if time_when_send.date() > time_now.date():
+                time_when_send_text = '(+1) ' + time_when_send_text
 
             HydraBot.log_and_print(
-                tcolors.OKBLUE
-                + '(changes emoji back)'
-                + tcolors.ENDC
+                'Will send to {} in {} minutes... ({})'.format(
+                    recipient,
+                    math.floor(max(time_to_sleep, 0) / 60),
+                    time_when_send_text
+                )
             )
 
-        HydraBot.log_and_print_line()
+    def serve(self, recipient):
+        """Serves a recipient whose deadline is due
 
-    def start(self):
-        """Get everything going"""
-        # Variables to keep track of rounds
-        done = False
-        active = False
-        run_num = 0
+        Args:
+          recipient (Recipient): Recipient to serve
 
-        # Main loop
-        while True:
-            current_day = datetime.now().date()
-            if current_day > self.start_datetime.date():
-                self.start_datetime += timedelta(day=1)
-                self.end_datetime += timedelta(day=1)
-
-                # TODO: Remove if working
-                HydraBot.log_and_print('Day has increased ({})'.format(
-                    str(current_day)
-                ))
-                HydraBot.log_and_print('Start=' + str(self.start_datetime))
-                HydraBot.log_and_print('End=' + str(self.end_datetime))
-
-            active_now = self.is_currently_active() or self.test_mode
-
-            # A new round has begun
-            if active_now is True and active_now != active:
-                run_num = 0
-                done = False
-                active = active_now
-                self.round_start()
-
-            if active_now is False or done is True:
-                # TODO: Sleep once for precise amount of time
-                print('Inactive...')
-                timeh.sleep(5)
-                continue
-
-            # Behaviour starts
-            time_before_run = datetime.now()
-
-            # Sleep
-            time_to_sleep = 0
-
-            # Inform about actions
-            if self.demo_mode or self.test_mode:
-                if self.demo_mode and self.test_mode:
-                    action = 'demo and test'
-                elif self.demo_mode:
-                    action = 'demo'
-                elif self.test_mode:
-                    action = 'test'
-
-                HydraBot.log_and_print(
-                    'Will ' + tcolors.BOLD + action + tcolors.ENDC + ' now...')
-
-            if not self.test_mode:
-                time_to_sleep = self.round_intervals[run_num]
-                time_now = datetime.now()
-
-                time_when_send = time_now + timedelta(seconds=time_to_sleep)
-                time_when_send_text = time_when_send.strftime('%H:%M')
-
-                if time_when_send.date() > time_now.date():
-                    time_when_send_text = '(+1) ' + time_when_send_text
-
-                HydraBot.log_and_print(
-                    'Will send in {} minutes... ({})'.format(
-                        math.floor(time_to_sleep / 60),
-                        time_when_send_text
-                    )
+        Returns:
+          deadline (float): Monotonic deadline to serve recipient again,
+            None if it shouldn't be served anymore
+        """
+        self.update_window()
+
+        active_now = self.is_currently_active() or self.test_mode
+        new_round = (active_now
+                     and recipient.round_window != self.start_datetime)
+
+        # A new round has begun
+        if new_round:
+            self.profiler.start_round(recipient)
+
+            with self.profiler.measure(recipient):
+                self.round_start(recipient)
+
+        # Sleep until next designated timespan begins
+        if not active_now or recipient.done:
+            deadline = self.get_window_deadline()
+
+            HydraBot.log_and_print(
+                'Inactive for {} until {}'.format(
+                    recipient,
+                    self.clock.datetime_at(deadline).strftime('%d.%m. %H:%M')
                 )
+            )
 
-            self.sleep(time_to_sleep)
+            return deadline
 
-            # Will message now
-            self.run(run_num)
+        # Will message now, unless waiting for first message of this round
+        if not new_round:
+            with self.profiler.measure(recipient):
+                self.run(recipient)
 
             # Increase run count
-            run_num += 1
-
-            # Not the last run
-            if run_num < len(self.round_intervals):
-                # Substract time used for requests/calculations/etc
-                # from next interval
-                seconds_difference = TimeHelper.secs_since(time_before_run)
-                self.round_intervals[run_num] -= seconds_difference
-            else:
-                done = True
-
-                HydraBot.log_and_print(
-                    tcolors.OKGREEN
-                    + 'All messages sent, done for now'
-                    + tcolors.ENDC
-                )
+            recipient.run_num += 1
 
-                if self.test_mode:
-                    HydraBot.log_and_print(
-                        tcolors.FAIL
-                        + 'Shutting down due to test mode'
-                        + tcolors.ENDC
-                    )
+        # Not the last run
+        if recipient.has_runs_left():
+            deadline = self.get_send_deadline(recipient)
+            self.inform_send_deadline(recipient, deadline)
+            return deadline
 
-                    sys.exit()
+        recipient.done = True
+
+        HydraBot.log_and_print(
+            'All messages sent to {}, done for now'.format(recipient),
+            color=tcolors.OKGREEN
+        )
+
+        self.log_profile(self.profiler.finish_round(recipient))
+
+        # Test mode only sends a single round
+        if self.test_mode:
+            return None
+
+        return self.get_window_deadline()
+
+    @staticmethod
+    def log_profile(result):
+        """Inform about dumped round profile, if any"""
+        if result is None:
+            return
+
+        path, seconds = result
+
+        HydraBot.log_and_print(
+            'Profiled {:.3f} s of round, see {}'.format(seconds, path)
+        )
+
+    def step(self):
+        """Serves every recipient being due without waiting for others
+
+        Returns:
+          seconds (float): Seconds until next deadline,
+            None if no recipient is scheduled anymore
+        """
+        while self.scheduler.is_due(self.clock.monotonic()):
+            _, recipient = self.scheduler.pop()
+            deadline = self.serve(recipient)
+
+            if deadline is not None:
+                self.scheduler.push(deadline, recipient)
+
+        next_deadline = self.scheduler.next_deadline()
+
+        if next_deadline is None:
+            return None
+
+        return max(next_deadline - self.clock.monotonic(), 0)
+
+    def run_forever(self):
+        """Get everything going and serve recipients until none is left"""
+        while True:
+            seconds = self.step()
+
+            # No recipient is scheduled anymore
+            if seconds is None:
+                break
+
+            # Simulated days are over
+            if (self.simulation_end is not None
+                    and self.clock.now() + timedelta(seconds=seconds)
+                    > self.simulation_end):
+                break
+
+            # Sleep exactly until next recipient is due
+            self.clock.sleep(seconds)
+
+        # Let deliveries which are still going on finish
+        self.delivery.wait()
+
+        if self.timeline is not None:
+            self.finish_simulation()
+
+        if self.test_mode:
+            HydraBot.log_and_print(
+                'Shutting down due to test mode',
+                color=tcolors.FAIL
+            )
+
+    def finish_simulation(self):
+        """Writes simulated send timeline and informs about it"""
+        self.timeline.write(self.simulation_file)
+
+        for line in self.timeline.summarize():
+            HydraBot.log_and_print(line, color=tcolors.OKGREEN)
+
+        HydraBot.log_and_print(
+            'Send timeline written to {}'.format(self.simulation_file)
+        )
 
     def clean_up(self):
-        """Cleans up (suitable for program exit)"""
+        """Cleans up (suitable for program exit), only once"""
+        if self.cleaned_up:
+            return
+
+        self.cleaned_up = True
+        self.delivery.shutdown()
+        self.messages.close()
+        self.history_store.close()
+
+        if self.journal is not None:
+            self.journal.close()
+
+        if self.attachment_cache is not None:
+            self.attachment_cache.close()
+
+        if self.image_processor is not None:
+            self.image_processor.shutdown()
+
+        # Dump profiles of unfinished rounds
+        for result in self.profiler.finish():
+            self.log_profile(result)
+
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+
+        if self.memory_watchdog is not None:
+            self.memory_watchdog.stop()
+
+        # Keep session for next start
+        if not self.demo_mode:
+            self.chatbot.close_session()
+
         # Logout from Facebook if possible and session isn't used
         if (not self.demo_mode
                 and not self.chatbot.session_file_exists()):
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   IMAGE CACHE - imagecache.py
+
+   Keeps image search results, already fetched result pages and
+   daily API usage in an SQLite database, so they survive restarts
+   and can be shared by several bot processes on one host
+"""
+
+
+# Dependencies
+from contextlib import contextmanager
+import random
+import sqlite3
+import threading
+import time
+
+
+class ImageCache:
+    """Persistent cache of image search results and fetched pages
+
+    Results are taken out of the cache once used, pages are
+    remembered so new searches go to pages which weren't fetched yet
+
+    Args:
+      path (str): SQLite database file, None keeps cache in memory (None)
+      ttl (float): Seconds until results and fetched pages expire (3 days)
+    """
+    connection = None
+    lock = None
+    ttl = None
+    # Results to choose from when avoiding recently sent ones
+    take_candidates = 10
+
+    # Database schema
+    schema = '''
+        CREATE TABLE IF NOT EXISTS results (
+            engine INTEGER NOT NULL,
+            phrase TEXT NOT NULL,
+            url TEXT NOT NULL,
+            fetched REAL NOT NULL,
+            PRIMARY KEY (engine, phrase, url)
+        );
+        CREATE TABLE IF NOT EXISTS pages (
+            engine INTEGER NOT NULL,
+            phrase TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            fetched REAL NOT NULL,
+            PRIMARY KEY (engine, phrase, page)
+        );
+        CREATE TABLE IF NOT EXISTS usage (
+            engine INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            used INTEGER NOT NULL,
+            PRIMARY KEY (engine, day)
+        );
+    '''
+
+    def __init__(self, path=None, ttl=259200):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        # Transactions are handled explicitly, see transaction()
+        self.connection = sqlite3.connect(
+            path or ':memory:',
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+
+        # Allow other processes to read while one is writing
+        if path:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+
+        self.connection.executescript(self.schema)
+        self.expire()
+
+    @contextmanager
+    def transaction(self):
+        """Context manager for a transaction which holds the write lock
+        from its beginning, so concurrent processes can't interleave"""
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+
+            self.connection.execute('COMMIT')
+
+    def get_expiry(self):
+        """Timestamp before which entries are considered expired"""
+        return time.time() - self.ttl
+
+    def expire(self):
+        """Removes expired results and pages"""
+        expiry = self.get_expiry()
+
+        with self.transaction() as db:
+            db.execute('DELETE FROM results WHERE fetched < ?', (expiry,))
+            db.execute('DELETE FROM pages WHERE fetched < ?', (expiry,))
+            db.execute('DELETE FROM usage WHERE day < ?', (
+                time.strftime('%Y-%m-%d', time.localtime(expiry)),
+            ))
+
+    def count(self, engine, phrase):
+        """Counts unused results for image engine and search phrase"""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT COUNT(*) FROM results '
+                'WHERE engine = ? AND phrase = ? AND fetched >= ?',
+                (engine, phrase, self.get_expiry())
+            ).fetchone()
+
+        return row[0]
+
+    def add(self, engine, phrase, urls):
+        """Adds result URLs for image engine and search phrase"""
+        fetched = time.time()
+
+        with self.transaction() as db:
+            db.executemany(
+                'INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?)',
+                [(engine, phrase, url, fetched) for url in urls]
+            )
+
+    def take(self, engine, phrase, history=None):
+        """Takes a random unused result out of the cache
+
+        Args:
+          engine (int): Image engine
+          phrase (str): Search phrase
+          history (SendHistory):
+            Recently sent URLs, which are only taken if
+            no other result turns up among a few candidates (None)
+
+        Returns:
+          url (str): Result URL, None if none is left
+        """
+        with self.transaction() as db:
+            rows = db.execute(
+                'SELECT url FROM results '
+                'WHERE engine = ? AND phrase = ? AND fetched >= ? '
+                'ORDER BY RANDOM() LIMIT ?',
+                (engine, phrase, self.get_expiry(),
+                 1 if history is None else self.take_candidates)
+            ).fetchall()
+
+            if not rows:
+                return None
+
+            # Prefer results which weren't sent recently
+            url = next(
+                (row[0] for row in rows
+                 if history is None or row[0] not in history),
+                rows[0][0]
+            )
+
+            db.execute(
+                'DELETE FROM results '
+                'WHERE engine = ? AND phrase = ? AND url = ?',
+                (engine, phrase, url)
+            )
+
+        return url
+
+    def next_page(self, engine, phrase, page_count):
+        """Get a page which wasn't fetched yet, if every page was
+        already fetched the least recently fetched one is used
+
+        Args:
+          engine (int): Image engine
+          phrase (str): Search phrase
+          page_count (int): Number of available pages
+
+        Returns:
+          page (int): Page number between 0 and page_count - 1
+        """
+        with self.lock:
+            fetched_pages = dict(self.connection.execute(
+                'SELECT page, fetched FROM pages '
+                'WHERE engine = ? AND phrase = ? AND fetched >= ?',
+                (engine, phrase, self.get_expiry())
+            ).fetchall())
+
+        unseen_pages = [page for page in range(page_count)
+                        if page not in fetched_pages]
+
+        if unseen_pages:
+            return random.choice(unseen_pages)
+
+        return min(fetched_pages, key=fetched_pages.get)
+
+    def mark_page(self, engine, phrase, page):
+        """Remembers page as fetched for image engine and search phrase"""
+        with self.transaction() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                (engine, phrase, page, time.time())
+            )
+
+    def get_phrases(self, engine):
+        """Get search phrases having unused results for image engine"""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT DISTINCT phrase FROM results '
+                'WHERE engine = ? AND fetched >= ?',
+                (engine, self.get_expiry())
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def get_usage(self, engine, day):
+        """Get number of requests made to image engine on given day
+
+        Args:
+          engine (int): Image engine
+          day (str): Day in format YYYY-MM-DD
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT used FROM usage WHERE engine = ? AND day = ?',
+                (engine, day)
+            ).fetchone()
+
+        return row[0] if row else 0
+
+    def add_usage(self, engine, day, count=1, minimum=0):
+        """Adds to number of requests made to image engine on given day
+
+        Args:
+          engine (int): Image engine
+          day (str): Day in format YYYY-MM-DD
+          count (int): Number of requests to add (1)
+          minimum (int): Usage to raise number to at least (0)
+
+        Returns:
+          used (int): Number of requests made on that day
+        """
+        with self.transaction() as db:
+            db.execute(
+                'INSERT OR IGNORE INTO usage VALUES (?, ?, 0)',
+                (engine, day)
+            )
+            db.execute(
+                'UPDATE usage SET used = MAX(used + ?, ?) '
+                'WHERE engine = ? AND day = ?',
+                (count, minimum, engine, day)
+            )
+            row = db.execute(
+                'SELECT used FROM usage WHERE engine = ? AND day = ?',
+                (engine, day)
+            ).fetchone()
+
+        return row[0]
+
+    def close(self):
+        """Closes database connection"""
+        with self.lock:
+            self.connection.close()
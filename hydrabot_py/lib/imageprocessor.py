@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   IMAGE PROCESSOR - imageprocessor.py
+
+   Shrinks downloaded images in worker processes before they are
+   uploaded, so large search results cost less upload time and bandwidth
+"""
+
+
+# Dependencies
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import time
+# Workers only import this module, not the whole bot
+from hydrabot_imaging import process_image
+# Local dependencies
+from .logqueue import log_and_print
+from .types import tcolors
+
+
+class ImageProcessor:
+    """Processes downloaded images in worker processes
+
+    Pillow is optional, it's only needed if images are processed. Images
+    which can't be processed in time are uploaded as they are, a pool
+    broken by a crashed worker or stuck on an image is replaced
+
+    Args:
+      max_dimension (int): Maximum width and height in pixels (1024)
+      max_bytes (int): Byte budget of every image (2 MB)
+      workers (int): Worker processes (2)
+      timeout (float): Seconds to wait for images of a call at most (30)
+    """
+    max_dimension = None
+    max_bytes = None
+    workers = None
+    timeout = None
+    executor = None
+    lock = None
+
+    # Animation frames to process and pixels to decode at most
+    max_frames = 100
+    max_pixels = 100000000
+
+    def __init__(self, max_dimension=1024, max_bytes=2097152, workers=2,
+                 timeout=30):
+        # Fail on startup already if Pillow is missing
+        import PIL  # noqa: F401
+
+        self.max_dimension = max_dimension
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.executor = self.create_executor()
+
+    def create_executor(self):
+        """Starts a pool of worker processes"""
+        # Fresh interpreters, forking would copy the bot's threads
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def replace_executor(self, executor, reason):
+        """Replaces pool, unless another call did so already, and
+        terminates its workers, which might be stuck on an image
+
+        Args:
+          executor (ProcessPoolExecutor): Pool to replace
+          reason (str): Why pool is replaced, for logging
+        """
+        with self.lock:
+            if self.executor is not executor:
+                return
+
+            log_and_print('Restarting image processing pool, {}'.format(
+                              reason),
+                          color=tcolors.WARNING)
+
+            # Running tasks can't be cancelled, only their processes
+            processes = list((executor._processes or {}).values())
+            executor.shutdown(wait=False)
+
+            for process in processes:
+                process.terminate()
+
+            self.executor = self.create_executor()
+
+    def process(self, files):
+        """Processes several images in parallel
+
+        Args:
+          files (list): Tuples of file name, content and mimetype
+
+        Returns:
+          files (list): Processed files in same order, those which
+            couldn't be processed (in time) are kept as they are
+        """
+        executor = self.executor
+
+        try:
+            futures = [
+                executor.submit(process_image, file, self.max_dimension,
+                                self.max_bytes, self.max_frames,
+                                self.max_pixels)
+                for file in files
+            ]
+        except BrokenProcessPool:
+            self.replace_executor(executor, 'as it broke')
+            return list(files)
+
+        deadline = time.monotonic() + self.timeout
+        processed = []
+
+        for file, future in zip(files, futures):
+            try:
+                processed.append(future.result(
+                    timeout=max(0, deadline - time.monotonic())
+                ))
+            except Exception as e:
+                # A worker crashed, e.g. killed for using too much memory
+                if isinstance(e, BrokenProcessPool):
+                    self.replace_executor(executor, 'as it broke')
+                # Worker is stuck and would keep its slot otherwise
+                elif isinstance(e, TimeoutError) and not future.cancel():
+                    self.replace_executor(executor, 'as it got stuck')
+
+                log_and_print(
+                    'Couldn\'t process image "{}": {!r}'.format(file[0], e),
+                    color=tcolors.WARNING
+                )
+                processed.append(file)
+
+        return processed
+
+    def shutdown(self):
+        """Stops worker processes"""
+        self.executor.shutdown(wait=False)
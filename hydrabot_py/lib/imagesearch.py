@@ -11,11 +11,16 @@
 
 # Dependencies
 import random
-import giphy_client
+import time
 import requests
-import googleapiclient
-from google_images_search import GoogleImagesSearch
+import urllib3
+# Giphy and GIS clients are imported lazily, only if they were configured
 # Local dependencies
+from . import metrics
+from .circuitbreaker import CircuitBreaker
+from .imagecache import ImageCache
+from .logqueue import log_and_print
+from .quota import QuotaBudget
 from .types import hydra_image_engines, tcolors
 
 
@@ -28,32 +33,105 @@ class ImageSearch:
       gis_search_phrases (list): Pool of GIS search phrases (empty)
       giphy_api_key (str): Giphy API key
       giphy_search_phrases (list): Pool of Giphy search phrases (empty)
+      pool_min_size (int): Result pool size below which it gets refilled (5)
+      cache_file (str): Result cache database, None -> memory only (None)
+      cache_ttl (float): Seconds until cached results expire (3 days)
+      gis_daily_quota (int): GIS requests allowed per day (100)
+      max_attempts (int): Maximum search attempts per image (5)
+      max_search_sec (float): Maximum seconds to search per image (20)
+      http_pool (HttpPool): Shared connection pools, None -> own ones (None)
     """
     giphy = None
     giphy_api_key = None
     giphy_search_phrases = None
     gis = None
     gis_search_phrases = None
+    gis_api_key = None
+    gis_quota = None
+    cache = None
+    pool_min_size = None
+    breakers = None
+    search_errors = None
+    quota_errors = None
+    http_pool = None
+    max_attempts = None
+    max_search_sec = None
+
+    # Results per page and number of pages to search through
+    giphy_page_size = 100
+    giphy_page_count = 5
+    gis_page_size = 10
+    gis_page_count = 10
+
+    # Seconds to back off after first failed attempt, doubled after
+    # every further one
+    retry_base_delay = 0.5
 
     def __init__(self,
                  gis_api_key=None, gis_project_cx=None, gis_search_phrases=[],
-                 giphy_api_key=None, giphy_search_phrases=[]):
+                 giphy_api_key=None, giphy_search_phrases=[],
+                 pool_min_size=5, cache_file=None, cache_ttl=259200,
+                 gis_daily_quota=100, max_attempts=5, max_search_sec=20,
+                 http_pool=None):
+        # Result URLs by image engine and search phrase
+        self.cache = ImageCache(path=cache_file, ttl=cache_ttl)
+        self.pool_min_size = pool_min_size
+        self.max_attempts = max_attempts
+        self.max_search_sec = max_search_sec
+        self.http_pool = http_pool
+
+        # Stop searching engines which keep failing for a while
+        self.breakers = {
+            hydra_image_engines.GIS: CircuitBreaker(),
+            hydra_image_engines.GIPHY: CircuitBreaker()
+        }
+
+        # Exceptions indicating temporary search failures
+        self.search_errors = (
+            requests.exceptions.RequestException,
+            urllib3.exceptions.HTTPError,
+            OSError
+        )
+
+        # Exceptions indicating a used up quota
+        self.quota_errors = ()
+
         # GIS API key and project CX were given
         if gis_api_key and gis_project_cx:
+            from google_images_search import GoogleImagesSearch
+            from googleapiclient.errors import HttpError
+
+            self.quota_errors += (HttpError,)
             self.gis = GoogleImagesSearch(gis_api_key, gis_project_cx)
             # ENABLE GOOGLE IMAGE SEARCH "START" PARAMETER
             self.gis._google_custom_search._search_params_keys['start'] = 0
+            self.gis_api_key = gis_api_key
+            self.gis_quota = QuotaBudget(
+                cache=self.cache,
+                engine=hydra_image_engines.GIS,
+                daily_limit=gis_daily_quota
+            )
 
         self.gis_search_phrases = gis_search_phrases
 
         # Giphy API key was provided
         if giphy_api_key:
-            self.giphy = giphy_client.DefaultApi()
+            import giphy_client
+
+            self.search_errors += (giphy_client.rest.ApiException,)
+            giphy_api_client = giphy_client.ApiClient()
+
+            # Route Giphy client through shared pools
+            if http_pool is not None:
+                giphy_api_client.rest_client.pool_manager = (
+                    http_pool.pool_manager
+                )
+
+            self.giphy = giphy_client.DefaultApi(giphy_api_client)
             self.giphy_api_key = giphy_api_key
 
         self.giphy_search_phrases = giphy_search_phrases
 
-
     def can_use_gis(self):
         """Indicates whether Google Image Search
         is available"""
@@ -63,14 +141,125 @@ class ImageSearch:
         """Indicates whether Giphy is available"""
         return bool(self.giphy and self.giphy_search_phrases)
 
+    def can_use(self, image_engine):
+        """Indicates whether image engine is available"""
+        if image_engine is hydra_image_engines.GIS:
+            return self.can_use_gis()
+
+        return self.can_use_giphy()
+
+    def can_search(self, image_engine):
+        """Indicates whether a search request may be made now"""
+        if not self.breakers[image_engine].allows_request():
+            return False
+
+        if image_engine is hydra_image_engines.GIS:
+            return self.gis_quota.can_spend()
+
+        return True
+
+    def is_healthy(self, image_engine):
+        """Indicates whether image engine is able to provide images now,
+        either by searching or from cached results"""
+        return self.can_use(image_engine) and (
+            self.breakers[image_engine].allows_request()
+            or bool(self.cache.get_phrases(image_engine))
+        )
+
+    @staticmethod
+    def get_engine_name(image_engine):
+        """Get image engine name as string"""
+        if image_engine is hydra_image_engines.GIS:
+            return 'Google Image Search'
+
+        return 'Giphy'
+
+    @staticmethod
+    def get_other_engine(image_engine):
+        """Get the image engine which isn't the given one"""
+        if image_engine is hydra_image_engines.GIS:
+            return hydra_image_engines.GIPHY
+
+        return hydra_image_engines.GIS
+
+    def set_window(self, start_datetime, end_datetime):
+        """Sets designated timespan to spread search quotas across"""
+        if self.gis_quota is not None:
+            self.gis_quota.set_window(start_datetime, end_datetime)
+
     def is_ready(self):
         """Indicates as bool whether values required for Image Search
-        to work were properly set"""
-        return (self.can_use_gis() or self.can_use_giphy())
+        to work were properly set and any engine is healthy"""
+        return (self.is_healthy(hydra_image_engines.GIS)
+                or self.is_healthy(hydra_image_engines.GIPHY))
+
+    def get_search_phrases(self, image_engine):
+        """Get pool of search phrases for image engine"""
+        if image_engine is hydra_image_engines.GIPHY:
+            return self.giphy_search_phrases
+
+        return self.gis_search_phrases
+
+    def search_giphy(self, search_phrase, page):
+        """Search Giphy for a page of image URLs"""
+        # Search Endpoint
+        giphy_response = self.giphy.gifs_search_get(
+            self.giphy_api_key,
+            search_phrase,
+            limit=self.giphy_page_size,
+            offset=page * self.giphy_page_size,
+        )
+
+        # Use downsized version of every image
+        return [found_giphy.images.downsized.url
+                for found_giphy in giphy_response.data]
+
+    def search_gis(self, search_phrase, page):
+        """Search Google Image Search for a page of image URLs"""
+        custom_search = self.gis._google_custom_search
+
+        # Build API client on first use to route it through shared pools
+        if (custom_search._google_build is None
+                and self.http_pool is not None):
+            from googleapiclient.discovery import build
+
+            custom_search._google_build = build(
+                'customsearch', 'v1',
+                developerKey=self.gis_api_key,
+                http=self.http_pool.get_http(),
+                cache_discovery=False
+            )
+
+        self.gis.search(search_params={
+            'q': search_phrase,
+            'num': self.gis_page_size,
+            'start': page * self.gis_page_size + 1
+        })
+
+        return [search_result.url for search_result in self.gis.results()]
+
+    def fill_pool(self, image_engine, search_phrase):
+        """Adds every URL of a page of results, which wasn't
+        fetched yet, to the cache"""
+        if image_engine is hydra_image_engines.GIPHY:
+            search, page_count = self.search_giphy, self.giphy_page_count
+        else:
+            search, page_count = self.search_gis, self.gis_page_count
+
+        page = self.cache.next_page(image_engine, search_phrase, page_count)
+
+        # Count request towards quota, even if it fails
+        if image_engine is hydra_image_engines.GIS:
+            self.gis_quota.spend()
+
+        image_urls = search(search_phrase, page)
+
+        self.cache.add(image_engine, search_phrase, image_urls)
+        self.cache.mark_page(image_engine, search_phrase, page)
 
     # This is the actual method used for performing requests  to
     # seach online for an image
-    def get_random_url(self, gis_giphy_chance=None):
+    def get_random_url(self, gis_giphy_chance=None, history=None):
         """Get random image URL
 
         Args:
@@ -80,9 +269,12 @@ class ImageSearch:
             The closer the number is to 0, the higher the chance for GIS gets
             The closer the number is to 1, the higher the chance for Giphy will be
             Example: 0 = 100% GIS/0% Giphy; 0.2 = 80% GIS/20% Giphy
+          history (SendHistory):
+            Recently sent URLs to avoid if possible (None)
 
         Returns:
-            url (str): An image URL
+            url (str): An image URL, None if quota or failures didn't
+              allow for finding any
         """
         # Use random bit if no specific chance for either Giphy or
         # GIS was given
@@ -90,100 +282,148 @@ class ImageSearch:
             gis_giphy_chance = random.getrandbits(1)
 
         image_url = None
+        search_started = time.perf_counter()
 
         # Choose either Giphy or GIS based off chance
         image_engine = hydra_image_engines.GIPHY
         if random.uniform(0, 1) < 1 - gis_giphy_chance:
             image_engine = hydra_image_engines.GIS
-        if (image_engine is hydra_image_engines.GIS and not self.can_use_gis()):
-            image_engine = hydra_image_engines.GIPHY
-
-            print(tcolors.FAIL
-                  + 'GIS wasn\'t properly configured, therefore '
-                  + 'switching to Giphy now...'
-                  + tcolors.ENDC)
-        elif (image_engine is hydra_image_engines.GIPHY and not self.can_use_giphy()):
-            image_engine = hydra_image_engines.GIS
 
-            print(tcolors.FAIL
-                  + 'Giphy wasn\'t properly configured, therefore '
-                  + 'switching to GIS now...'
-                  + tcolors.ENDC)
+        # Switch engines if chosen one isn't configured or keeps failing
+        if not self.is_healthy(image_engine):
+            other_engine = self.get_other_engine(image_engine)
+
+            if self.is_healthy(other_engine):
+                log_and_print('{} isn\'t available, therefore '.format(
+                                  self.get_engine_name(image_engine))
+                              + 'switching to {} now...'.format(
+                                  self.get_engine_name(other_engine)),
+                              color=tcolors.FAIL)
+
+                image_engine = other_engine
 
         # Select random search query
         search_query_used = None
 
-        # Perform image search
+        # Limit attempts and time spent on searching
+        attempts = 0
+        backs_off = False
+        search_deadline = time.monotonic() + self.max_search_sec
+
+        # Take image from pool, search only if pool runs low
         while image_url is None:
-            if image_engine is hydra_image_engines.GIPHY:
-                try:
-                    search_phrases = self.giphy_search_phrases
-                    search_query_used = random.choice(search_phrases)
-
-                    # Search Endpoint
-                    giphy_response = self.giphy.gifs_search_get(
-                        self.giphy_api_key,
-                        search_query_used,
-                        limit=100,
-                        offset=random.randint(0, 100),
-                    )
+            if (attempts >= self.max_attempts
+                    or time.monotonic() > search_deadline):
+                log_and_print('Image search gave up after {} attempts'.format(
+                                  attempts),
+                              color=tcolors.FAIL)
+
+                break
+
+            # Back off with full jitter, but not beyond search deadline
+            if backs_off:
+                delay = random.uniform(
+                    0, self.retry_base_delay * 2 ** (attempts - 1)
+                )
+                time.sleep(min(delay,
+                               max(0, search_deadline - time.monotonic())))
+
+            attempts += 1
+            backs_off = True
+
+            search_phrases = self.get_search_phrases(image_engine)
+            search_query_used = random.choice(search_phrases)
+            pool_size = self.cache.count(image_engine, search_query_used)
+            breaker = self.breakers[image_engine]
+
+            # Refill pool only once it runs low, quota allows for it
+            # and engine didn't keep failing
+            if (pool_size < self.pool_min_size
+                    and self.can_search(image_engine)
+                    and breaker.start_request()):
+                engine_name = self.get_engine_name(image_engine)
 
-                    # No images could be retrieved, therefore skip to
-                    # next iteration
-                    if not len(giphy_response.data):
-                        continue
+                try:
+                    self.fill_pool(image_engine, search_query_used)
+                    breaker.record_success()
+                    metrics.image_requests.inc(engine=engine_name,
+                                               result='ok')
+
+                # Keep using pool if Giphy ApiException or common request
+                # exceptions occured
+                except self.search_errors:
+                    breaker.record_failure()
+                    metrics.image_requests.inc(engine=engine_name,
+                                               result='error')
 
-                    # Choose random image based of response
-                    found_giphy = random.choice(giphy_response.data)
-                    # Set image URL to downsized version
-                    image_url = found_giphy.images.downsized.url
+                # GIS HttpError exception normally indicated reaching of
+                # maximum search queries per day
+                except self.quota_errors:
+                    # Don't waste any more requests today
+                    self.gis_quota.exhaust()
+                    metrics.image_requests.inc(engine=engine_name,
+                                               result='quota')
+
+                    log_and_print('GIS returned HTTP error, probably because '
+                                  + 'daily request limit has been reached',
+                                  color=tcolors.FAIL)
+
+                # Let another caller try if request had no outcome
+                finally:
+                    breaker.release()
+
+            # Neither quota nor engine allow for refilling an empty pool
+            elif not pool_size:
+                cached_phrases = self.cache.get_phrases(image_engine)
+                other_engine = self.get_other_engine(image_engine)
+
+                # Prefer cached results of another search phrase
+                if cached_phrases:
+                    search_query_used = random.choice(cached_phrases)
+
+                # Switch to other engine instead
+                elif self.is_healthy(other_engine):
+                    log_and_print(
+                        '{} is unavailable for now, therefore '.format(
+                            self.get_engine_name(image_engine))
+                        + 'switching to {} now...'.format(
+                            self.get_engine_name(other_engine)),
+                        color=tcolors.WARNING
+                    )
 
-                # Continue to next iteration if Giphy ApiException occured
-                except giphy_client.rest.ApiException:
+                    image_engine = other_engine
+                    # Other engine may be tried right away
+                    backs_off = False
                     continue
-            else:
-                try:
-                    search_phrases = self.gis_search_phrases
-                    search_query_used = random.choice(search_phrases)
 
-                    self.gis.search(search_params={
-                        'q': search_query_used,
-                        'num': 10,
-                        'start': random.randint(0, 90)
-                    })
+                # Neither cache nor other engine are left
+                else:
+                    log_and_print('No image engine is available for now, '
+                                  + 'therefore skipping image...',
+                                  color=tcolors.FAIL)
 
-                    search_results = self.gis.results()
+                    break
 
-                    # No image could be found
-                    if not len(search_results):
-                        continue
+            # Take random image out of pool, so it won't be used again,
+            # if no images could be retrieved skip to next iteration
+            image_url = self.cache.take(image_engine, search_query_used,
+                                        history=history)
 
-                    # Set image URL randomly based on results
-                    image_url = random.choice(search_results).url
+        engine_name = self.get_engine_name(image_engine)
 
-                # Continue to next iteration if common request exceptions
-                # occured
-                except (requests.exceptions.ReadTimeout,
-                        requests.exceptions.ConnectionError):
-                    continue
+        # Measure lookup by engine finally used
+        metrics.image_search_seconds.observe(
+            time.perf_counter() - search_started, engine=engine_name
+        )
+        metrics.image_searches.inc(
+            engine=engine_name,
+            result='found' if image_url is not None else 'none'
+        )
 
-                # GIS HttpError exception normally indicated reaching of
-                # maximum search queries per day
-                except googleapiclient.errors.HttpError:
-                    # Switch to Giphy instead
-                    image_engine = hydra_image_engines.GIPHY
-
-                    print(tcolors.FAIL
-                          + 'GIS returned HTTP error, probably because '
-                          + 'daily request limit has been reached. '
-                          + 'Therefore switching to Giphy now...'
-                          + tcolors.ENDC)
-
-        # Get image engine name as string
-        # TODO: Improve model logic to provide for this there instead
-        image_engine_name = 'Giphy'
-        if image_engine is hydra_image_engines.GIS:
-            image_engine_name = 'Google Image Search'
+        if attempts > 1:
+            metrics.retries.inc(attempts - 1, operation='image_search')
 
         # Return tuple of found URL, plus useful information
-        return image_url, search_query_used, image_engine_name
+        return (image_url,
+                search_query_used,
+                engine_name)
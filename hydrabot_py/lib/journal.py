@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   JOURNAL - journal.py
+
+   Write-ahead journal of round plans and completed sends, which lets
+   a restarted bot resume its rounds instead of starting them over
+"""
+
+
+# Dependencies
+import json
+import os
+import threading
+import time
+# Local dependencies
+from .logqueue import log_and_print
+from .types import tcolors
+
+
+class SendJournal:
+    """Append-only journal of round plans and completed sends
+
+    Every record is a single JSON line. Records are flushed right away,
+    so they survive the process crashing, while syncing them to disk
+    is batched. Round plans are synced at once, as they are rare and
+    everything else depends on them
+
+    Only the latest round of every thread matters for resuming, so the
+    journal is rewritten holding nothing else from time to time
+
+    Args:
+      path (str): Journal file, created if missing
+      sync_every (int): Pending sends after which file is synced (10)
+      sync_interval (float):
+        Seconds since last sync after which the next send is synced (5)
+      compact_after (int): Records after which journal is compacted (1000)
+    """
+    path = None
+    sync_every = None
+    sync_interval = None
+    compact_after = None
+    file = None
+    states = None
+    lock = None
+    # Records not synced to disk yet
+    pending = 0
+    # Records appended since last compaction
+    records = 0
+    last_sync = 0
+
+    # Fields of round records besides type
+    round_fields = ('thread', 'round', 'window', 'started',
+                    'intervals', 'messages')
+
+    def __init__(self, path, sync_every=10, sync_interval=5,
+                 compact_after=1000):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_after = compact_after
+        self.states = {}
+        self.lock = threading.RLock()
+
+        self.replay()
+
+        # Start off with a compact journal
+        self.compact()
+
+    def replay(self):
+        """Reads journal, restoring latest round of every thread"""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    self.apply(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    # Last line may be torn by a crash
+                    log_and_print(
+                        'Skipping broken line {} of journal {}'.format(
+                            number, self.path
+                        ),
+                        color=tcolors.WARNING
+                    )
+
+    def apply(self, record):
+        """Applies a record to the state of its thread"""
+        thread = record['thread']
+
+        if record['type'] == 'round':
+            state = {field: record[field] for field in self.round_fields}
+            state['sent'] = 0
+            self.states[thread] = state
+
+        elif record['type'] == 'send':
+            state = self.states.get(thread)
+
+            # Sends of earlier rounds are irrelevant
+            if state is not None and state['round'] == record['round']:
+                state['sent'] = max(state['sent'], record['run'] + 1)
+
+    def get(self, thread):
+        """Get latest round of thread
+
+        Returns:
+          state (dict): Round record fields plus number of completed
+            sends as "sent", None if thread has no round yet
+        """
+        with self.lock:
+            state = self.states.get(thread)
+            return dict(state) if state is not None else None
+
+    def append(self, record, sync=False):
+        """Appends record, syncs and compacts journal when due
+
+        Args:
+          record (dict): Record having a type and thread
+          sync (bool): Sync to disk right away (False)
+        """
+        with self.lock:
+            self.apply(record)
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.file.flush()
+            self.pending += 1
+            self.records += 1
+
+            if (sync
+                    or self.pending >= self.sync_every
+                    or time.monotonic() - self.last_sync
+                    >= self.sync_interval):
+                self.sync()
+
+            if self.records >= self.compact_after:
+                self.compact()
+
+    def record_round(self, thread, round_num, window, started,
+                     intervals, messages):
+        """Records plan of a new round
+
+        Args:
+          thread (str): Conversation the round belongs to
+          round_num (int): Number of round
+          window (datetime): Beginning of designated timespan
+          started (datetime): Wall clock time round started at
+          intervals (list): Send times in seconds after round's start
+          messages (list): MessageTemplate instances of round
+        """
+        self.append({
+            'type': 'round',
+            'thread': thread,
+            'round': round_num,
+            'window': window.isoformat(),
+            'started': started.timestamp(),
+            'intervals': list(intervals),
+            'messages': [message.text for message in messages]
+        }, sync=True)
+
+    def record_send(self, thread, round_num, run_num):
+        """Records a completed message package
+
+        Args:
+          thread (str): Conversation package was sent to
+          round_num (int): Number of round
+          run_num (int): Number of package within round
+        """
+        self.append({
+            'type': 'send',
+            'thread': thread,
+            'round': round_num,
+            'run': run_num
+        })
+
+    def sync(self):
+        """Syncs appended records to disk"""
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+            self.last_sync = time.monotonic()
+
+    def compact(self):
+        """Rewrites journal atomically, keeping only latest rounds"""
+        with self.lock:
+            temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for thread, state in self.states.items():
+                    record = {'type': 'round'}
+                    record.update(
+                        (field, state[field]) for field in self.round_fields
+                    )
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+                    # Last completed send stands for all earlier ones
+                    if state['sent']:
+                        f.write(json.dumps({
+                            'type': 'send',
+                            'thread': thread,
+                            'round': state['round'],
+                            'run': state['sent'] - 1
+                        }) + '\n')
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            if self.file is not None:
+                self.file.close()
+
+            os.replace(temp_path, self.path)
+
+            self.file = open(self.path, 'a', encoding='utf-8')
+            self.pending = 0
+            self.records = 0
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        """Syncs remaining records and closes journal"""
+        with self.lock:
+            if self.file is None:
+                return
+
+            self.sync()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   LOG QUEUE - logqueue.py
+
+   Hands log records over to a background thread, which prints them
+   and writes them as JSON lines to a rotating log file, so logging
+   never stalls the calling thread on a slow disk or terminal
+"""
+
+
+# Dependencies
+import atexit
+from datetime import datetime
+import json
+import logging
+from logging.handlers import QueueHandler, RotatingFileHandler
+import queue
+import re
+import sys
+import threading
+# Local dependencies
+from .types import tcolors
+
+
+# Logger of the bot itself, libraries log to their own loggers
+logger = logging.getLogger('hydrabot')
+
+
+def log_and_print(*args, color=None):
+    """Log something and print it to the console
+
+    Args:
+      *args: Objects to log, joined by spaces
+      color (str): Color to print in, one of tcolors (None)
+    """
+    logger.info(
+        ' '.join(str(a) for a in args),
+        extra={'color': color, 'console': True}
+    )
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single JSON lines without ANSI escapes
+
+    Args:
+      modes (list): Modes the bot runs in, e.g. ["demo"] (empty)
+    """
+    modes = None
+    # ANSI escape characters RegExp pattern
+    ansi_pattern = re.compile(r'\x1b\[[0-9;]*m')
+
+    def __init__(self, modes=[]):
+        super().__init__()
+        self.modes = modes
+
+    def format(self, record):
+        created = datetime.fromtimestamp(record.created)
+        entry = {
+            'time': created.isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': self.ansi_pattern.sub('', record.getMessage())
+        }
+
+        if self.modes:
+            entry['modes'] = self.modes
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Formats records for the terminal, applying their color"""
+
+    def format(self, record):
+        color = getattr(record, 'color', None)
+
+        if color is None:
+            return record.getMessage()
+
+        return color + record.getMessage() + tcolors.ENDC
+
+
+class BatchFileHandler(RotatingFileHandler):
+    """Rotating file handler which only flushes once per batch"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        """Flushes records written since the last batch"""
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class LogQueue:
+    """Routes every log record through a queue to a writer thread
+
+    The writer drains all records queued up at once, writes them to
+    the console and the log file, then flushes the file a single time
+
+    Args:
+      path (str): Log file, rotated once it grows too large
+      modes (list): Modes the bot runs in, e.g. ["demo"] (empty)
+      max_bytes (int): Size at which the log file is rotated (5 MB)
+      backup_count (int): Number of rotated log files to keep (3)
+    """
+    queue = None
+    queue_handler = None
+    file_handler = None
+    console_handler = None
+    thread = None
+    # Queue currently receiving records
+    active = None
+
+    # Records written per batch at most
+    batch_size = 500
+
+    def __init__(self, path, modes=[], max_bytes=5242880, backup_count=3):
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = QueueHandler(self.queue)
+
+        self.file_handler = BatchFileHandler(
+            path,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding='utf-8',
+            delay=True
+        )
+        self.file_handler.setFormatter(JsonFormatter(modes))
+
+        # Only the bot's own messages are printed
+        self.console_handler = logging.StreamHandler(sys.stdout)
+        self.console_handler.setFormatter(ConsoleFormatter())
+        self.console_handler.addFilter(
+            lambda record: getattr(record, 'console', False)
+        )
+
+    def start(self):
+        """Starts writer thread and routes root logger through queue"""
+        if LogQueue.active is not None:
+            LogQueue.active.stop()
+
+        LogQueue.active = self
+
+        self.thread = threading.Thread(
+            target=self.write, name='log-writer', daemon=True
+        )
+        self.thread.start()
+
+        root = logging.getLogger()
+        root.addHandler(self.queue_handler)
+        root.setLevel(logging.INFO)
+
+        # Write remaining records on exit
+        atexit.register(self.stop)
+
+    def write(self):
+        """Writes queued records in batches until stopped"""
+        while True:
+            records = [self.queue.get()]
+
+            # Take everything else queued up meanwhile
+            while records[-1] is not None and len(records) < self.batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for record in records:
+                if record is None:
+                    break
+
+                for handler in (self.console_handler, self.file_handler):
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+            self.file_handler.flush_batch()
+
+            # Stop signal
+            if records[-1] is None:
+                return
+
+    def stop(self):
+        """Writes remaining records and stops writer thread"""
+        if self.thread is None:
+            return
+
+        logging.getLogger().removeHandler(self.queue_handler)
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.file_handler.close()
+
+        if LogQueue.active is self:
+            LogQueue.active = None
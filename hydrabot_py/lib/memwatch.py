@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   MEMORY WATCH - memwatch.py
+
+   Watches memory of long running bots, logs allocation sites which
+   keep growing, so leaks are found before the process gets killed
+"""
+
+
+# Dependencies
+import threading
+import tracemalloc
+# Local dependencies
+from .logqueue import log_and_print
+from .types import tcolors
+
+
+class MemoryWatchdog:
+    """Compares tracemalloc snapshots periodically in a background thread
+
+    Args:
+      interval (float): Seconds between snapshots (600)
+      threshold (int): Growth in bytes between snapshots to report (10 MB)
+      top (int): Number of growing allocation sites to report (10)
+      frames (int): Stack frames stored per allocation (1)
+    """
+    interval = None
+    threshold = None
+    top = None
+    frames = None
+    snapshot = None
+    thread = None
+    stopped = None
+    started_tracing = False
+
+    # Allocations of tracemalloc itself and importing are no leaks
+    filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>')
+    )
+
+    def __init__(self, interval=600, threshold=10485760, top=10, frames=1):
+        self.interval = interval
+        self.threshold = threshold
+        self.top = top
+        self.frames = frames
+        self.stopped = threading.Event()
+
+    def start(self):
+        """Starts tracing and the watchdog thread"""
+        # Tracing started by someone else is left running on stop()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started_tracing = True
+
+        self.snapshot = self.take_snapshot()
+
+        self.thread = threading.Thread(
+            target=self.watch, name='memory-watchdog', daemon=True
+        )
+        self.thread.start()
+
+    def take_snapshot(self):
+        """Get snapshot without allocations which aren't of interest"""
+        return tracemalloc.take_snapshot().filter_traces(self.filters)
+
+    def watch(self):
+        """Checks memory growth until stopped"""
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """Compares a new snapshot to the previous one, reports growth
+
+        Returns:
+          growth (int): Bytes allocated since previous snapshot
+        """
+        snapshot = self.take_snapshot()
+        differences = snapshot.compare_to(self.snapshot, 'lineno')
+        self.snapshot = snapshot
+
+        growth = sum(difference.size_diff for difference in differences)
+
+        if growth < self.threshold:
+            return growth
+
+        log_and_print(
+            'Memory grew by {:.1f} MB ({}), top allocation sites:'.format(
+                growth / 1048576, self
+            ),
+            color=tcolors.WARNING
+        )
+
+        growing = [difference for difference in differences
+                   if difference.size_diff > 0]
+
+        for difference in growing[:self.top]:
+            frame = difference.traceback[0]
+
+            log_and_print('  {}:{} +{:.1f} KB ({:+d} blocks)'.format(
+                frame.filename,
+                frame.lineno,
+                difference.size_diff / 1024,
+                difference.count_diff
+            ))
+
+        return growth
+
+    def get_memory(self):
+        """Get traced memory
+
+        Returns:
+          current, peak (tuple): Bytes currently and at most allocated
+        """
+        return tracemalloc.get_traced_memory()
+
+    def stop(self):
+        """Stops watchdog thread and tracing, if it started tracing"""
+        self.stopped.set()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    # Convert instance to string
+    def __str__(self):
+        current, peak = self.get_memory()
+
+        return 'current {:.1f} MB, peak {:.1f} MB'.format(
+            current / 1048576,
+            peak / 1048576
+        )
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   METRICS - metrics.py
+
+   Counts calls and measures their latencies, exposes them in
+   Prometheus text format on a local HTTP port or in a scrape file
+"""
+
+
+# Dependencies
+from bisect import bisect_left
+from contextlib import contextmanager
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+
+
+class Metric:
+    """A metric abstract base class, holding one value per label set
+
+    Args:
+      name (str): Metric name
+      description (str): Help text
+      label_names (tuple): Names of labels, their order is kept (empty)
+    """
+    name = None
+    description = None
+    label_names = None
+    values = None
+    lock = None
+    type_name = None
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, labels):
+        """Get label values in order of label names"""
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def format_labels(self, key, extra=()):
+        """Formats label set as {name="value",...}"""
+        pairs = list(zip(self.label_names, key)) + list(extra)
+
+        if not pairs:
+            return ''
+
+        return '{' + ','.join(
+            '{}="{}"'.format(name, value.replace('\\', '\\\\')
+                             .replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in pairs
+        ) + '}'
+
+    def render(self):
+        """Renders metric in Prometheus text format"""
+        lines = [
+            '# HELP {} {}'.format(self.name, self.description),
+            '# TYPE {} {}'.format(self.name, self.type_name)
+        ]
+
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.extend(self.render_value(key, value))
+
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Increases count of label set"""
+        key = self.get_key(labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        """Get count of label set"""
+        with self.lock:
+            return self.values.get(self.get_key(labels), 0)
+
+    def render_value(self, key, value):
+        return ['{}{} {}'.format(self.name, self.format_labels(key), value)]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets
+
+    Args:
+      buckets (tuple): Upper bounds of buckets, in seconds by default
+    """
+    buckets = None
+
+    type_name = 'histogram'
+    default_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+    def __init__(self, name, description, label_names=(), buckets=None):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets or self.default_buckets))
+
+    def observe(self, value, **labels):
+        """Adds observed value to label set"""
+        key = self.get_key(labels)
+
+        with self.lock:
+            # Counts per bucket (last one is +Inf), sum of values
+            counts, total = self.values.get(
+                key, ([0] * (len(self.buckets) + 1), 0)
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def get_count(self, **labels):
+        """Get number of observed values of label set"""
+        with self.lock:
+            counts, _ = self.values.get(self.get_key(labels), ([0], 0))
+            return sum(counts)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes duration of the enclosed block"""
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render_value(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            lines.append('{}_bucket{} {}'.format(
+                self.name,
+                self.format_labels(key, [('le', str(bound))]),
+                cumulative
+            ))
+
+        labels = self.format_labels(key)
+        lines.append('{}_sum{} {}'.format(self.name, labels, total))
+        lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+
+        return lines
+
+
+class Registry:
+    """Collection of metrics, renders all of them at once"""
+    metrics = None
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, description, label_names=()):
+        """Registers a new Counter"""
+        metric = Counter(name, description, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, description, label_names=(), buckets=None):
+        """Registers a new Histogram"""
+        metric = Histogram(name, description, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Renders every metric in Prometheus text format"""
+        lines = []
+
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Writes rendered metrics to a scrape file atomically"""
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+
+        os.replace(temp_path, path)
+
+
+# Metrics of the bot
+default_registry = Registry()
+
+messenger_calls = default_registry.counter(
+    'hydrabot_messenger_calls_total',
+    'Messenger API calls by result',
+    ('call', 'result')
+)
+messenger_seconds = default_registry.histogram(
+    'hydrabot_messenger_call_seconds',
+    'Latency of Messenger API calls',
+    ('call',)
+)
+sends = default_registry.counter(
+    'hydrabot_chat_messages_total',
+    'Chat messages sent by type and result',
+    ('type', 'result')
+)
+send_seconds = default_registry.histogram(
+    'hydrabot_send_chat_message_seconds',
+    'Time to send a chat message including delays',
+    ('type',)
+)
+packages = default_registry.counter(
+    'hydrabot_packages_total',
+    'Delivered message packages by result',
+    ('result',)
+)
+package_seconds = default_registry.histogram(
+    'hydrabot_package_seconds',
+    'Time to deliver a message package including delays',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600)
+)
+image_searches = default_registry.counter(
+    'hydrabot_image_searches_total',
+    'Random image lookups by engine and result',
+    ('engine', 'result')
+)
+image_search_seconds = default_registry.histogram(
+    'hydrabot_image_search_seconds',
+    'Latency of random image lookups by engine',
+    ('engine',)
+)
+image_requests = default_registry.counter(
+    'hydrabot_image_search_requests_total',
+    'Requests to image search APIs by engine and result',
+    ('engine', 'result')
+)
+attachments = default_registry.counter(
+    'hydrabot_attachments_total',
+    'Images sent by where their attachment came from',
+    ('source',)
+)
+package_calls = default_registry.histogram(
+    'hydrabot_package_messenger_calls',
+    'Messenger API calls per delivered package',
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+retries = default_registry.counter(
+    'hydrabot_retries_total',
+    'Attempts repeated after an earlier one came up empty or failed',
+    ('operation',)
+)
+
+
+@contextmanager
+def track(counter, histogram, **labels):
+    """Counts enclosed block by result and observes its duration
+
+    Args:
+      counter (Counter): Counter with a "result" label
+      histogram (Histogram): Histogram without "result" label
+      **labels: Labels shared by both metrics
+    """
+    started = time.perf_counter()
+
+    try:
+        yield
+    except BaseException:
+        counter.inc(result='error', **labels)
+        raise
+    else:
+        counter.inc(result='ok', **labels)
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+# Messenger calls of the package being delivered
+call_counts = contextvars.ContextVar('call_counts', default=None)
+
+
+def track_messenger(call):
+    """Counts and times a single Messenger API call
+
+    Args:
+      call (str): Name of fbchat method, e.g. "send"
+    """
+    counts = call_counts.get()
+
+    if counts is not None:
+        counts[call] = counts.get(call, 0) + 1
+
+    return track(messenger_calls, messenger_seconds, call=call)
+
+
+@contextmanager
+def count_messenger_calls():
+    """Counts Messenger calls of enclosed block, including those run
+    in threads by DeliveryEngine.call
+
+    Yields:
+      counts (dict): Calls by fbchat method, filled in as they happen
+    """
+    counts = {}
+    token = call_counts.set(counts)
+
+    try:
+        yield counts
+    finally:
+        call_counts.reset(token)
+
+
+class MetricsExporter:
+    """Exposes a registry on a local HTTP port and/or in a scrape file
+
+    Args:
+      port (int): Local port to serve /metrics on, None disables (None)
+      path (str): Scrape file to write to, None disables (None)
+      interval (float): Seconds between scrape file updates (15)
+      registry (Registry): Metrics to expose, defaults to bot metrics
+    """
+    port = None
+    path = None
+    interval = None
+    registry = None
+    server = None
+    stopped = None
+
+    def __init__(self, port=None, path=None, interval=15, registry=None):
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self.registry = registry or default_registry
+        self.stopped = threading.Event()
+
+    def start(self):
+        """Starts serving and writing metrics in background threads"""
+        if self.port is not None:
+            self.server = ThreadingHTTPServer(
+                ('127.0.0.1', self.port),
+                self.get_handler()
+            )
+            self.server.daemon_threads = True
+
+            threading.Thread(
+                target=self.server.serve_forever,
+                name='metrics-server',
+                daemon=True
+            ).start()
+
+        if self.path is not None:
+            threading.Thread(
+                target=self.write_forever,
+                name='metrics-writer',
+                daemon=True
+            ).start()
+
+    def get_handler(self):
+        """Get HTTP request handler class serving the registry"""
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            # Scrapes mustn't flood the console
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+    def write_forever(self):
+        """Updates scrape file until stopped"""
+        while not self.stopped.wait(self.interval):
+            self.registry.write(self.path)
+
+    def stop(self):
+        """Stops serving, writes scrape file a last time"""
+        self.stopped.set()
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        if self.path is not None:
+            self.registry.write(self.path)
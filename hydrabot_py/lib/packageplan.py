@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   PACKAGE PLAN - packageplan.py
+
+   Plans Messenger calls and delays of a whole message package at
+   once, so calls which would be redundant are coalesced or dropped
+"""
+
+
+# Local dependencies
+from .chatmeta import ChatAction
+from .chatmessages import ImageMessage, MessageImage
+
+
+class PackagePlan:
+    """Steps to send a message package with as few calls as possible
+
+    Consecutive texts share a single typing session, consecutive
+    images of a chat message are sent in a single request and typing
+    status is only changed if it actually changes. Delays add up to
+    those of sending every part on its own, pauses of images sent
+    together follow their request
+
+    Steps are (kind, value) tuples, where kind is one of "typing"
+    (bool), "text" (str), "images" (list of URLs), "sleep" (seconds)
+    and "action" (ChatAction)
+
+    Args:
+      chat_messages (list): ChatMessage instances of package
+    """
+    steps = None
+    boundaries = None
+    typing = False
+
+    # Seconds to type per character
+    typing_speed = 0.3
+    # Seconds to pause after every part and before every chat message
+    pause = 2
+
+    def __init__(self, chat_messages):
+        self.steps = []
+        self.boundaries = []
+
+        for chat_message in chat_messages:
+            # Chat message starts with a pause of its own
+            self.boundaries.append(len(self.steps))
+            self.steps.append(('sleep', self.pause))
+
+            for text in chat_message.texts:
+                if isinstance(text, ChatAction):
+                    self.add_action(text)
+                elif isinstance(text, MessageImage):
+                    self.add_image(text.url, self.pause)
+                elif isinstance(chat_message, ImageMessage):
+                    # Image messages pause twice after every image
+                    self.add_image(text, self.pause * 2)
+                else:
+                    self.add_text(text)
+
+        self.set_typing(False)
+
+    def add_sleep(self, seconds):
+        """Adds a delay, merging it into a directly preceding one"""
+        if self.steps and self.steps[-1][0] == 'sleep':
+            self.steps[-1] = ('sleep', self.steps[-1][1] + seconds)
+        else:
+            self.steps.append(('sleep', seconds))
+
+    def set_typing(self, status):
+        """Changes typing status, unless it's already set"""
+        if status == self.typing:
+            return
+
+        self.typing = status
+
+        if status:
+            self.steps.append(('typing', status))
+            return
+
+        # Stop typing right after the last text, not after its pauses
+        position = len(self.steps)
+
+        while position > 0 and self.steps[position - 1][0] == 'sleep':
+            position -= 1
+
+        self.steps.insert(position, ('typing', status))
+
+        # Step belongs to chat message the last text belongs to
+        self.boundaries = [boundary + 1 if boundary >= position else boundary
+                           for boundary in self.boundaries]
+
+    def add_text(self, text):
+        """Adds a text, typed within the current typing session"""
+        # Empty parts would be empty requests
+        if not text.strip():
+            return
+
+        self.set_typing(True)
+        self.add_sleep(len(text) * self.typing_speed)
+        self.steps.append(('text', text))
+        self.add_sleep(self.pause)
+
+    def add_image(self, url, pause):
+        """Adds an image, joining images of the same chat message
+        which directly precede it
+
+        Args:
+          url (str): Image URL
+          pause (float): Seconds to pause after image
+        """
+        start = self.boundaries[-1] if self.boundaries else 0
+        previous = next(
+            (step for step in reversed(self.steps[start:])
+             if step[0] != 'sleep'),
+            None
+        )
+
+        if previous is not None and previous[0] == 'images':
+            previous[1].append(url)
+            self.add_sleep(pause)
+            return
+
+        self.set_typing(False)
+        self.steps.append(('images', [url]))
+        self.add_sleep(pause)
+
+    def add_action(self, action):
+        """Adds a chat action, e.g. a delay, which isn't spent typing"""
+        self.set_typing(False)
+        self.steps.append(('action', action))
+
+    def get_message_steps(self):
+        """Get steps split up by chat message they belong to
+
+        Returns:
+          steps (list): List of step lists, one per chat message
+        """
+        ends = self.boundaries[1:] + [len(self.steps)]
+
+        return [self.steps[start:end]
+                for start, end in zip(self.boundaries, ends)]
+
+    def count_calls(self):
+        """Counts Messenger calls of plan"""
+        return sum(kind in ('typing', 'text', 'images')
+                   for kind, _ in self.steps)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   PROFILER - profiler.py
+
+   Profiles a random sample of rounds, so finding out where a round
+   spends its time is cheap enough to stay enabled in production
+"""
+
+
+# Dependencies
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+import os
+import pstats
+import random
+import re
+
+
+class RoundProfiler:
+    """Profiles sampled rounds and dumps one pstats file per round
+
+    Args:
+      directory (str): Directory to dump pstats files into
+      sample_rate (float): Share of rounds to profile, 0 disables (1)
+    """
+    directory = None
+    sample_rate = None
+    profiles = None
+
+    def __init__(self, directory, sample_rate=1):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.profiles = {}
+
+    def start_round(self, recipient):
+        """Decides whether recipient's new round is profiled"""
+        # Previous round wasn't finished
+        self.finish_round(recipient)
+
+        if random.uniform(0, 1) < self.sample_rate:
+            self.profiles[recipient] = cProfile.Profile()
+
+    @contextmanager
+    def measure(self, recipient):
+        """Profiles enclosed block if recipient's round is sampled"""
+        profile = self.profiles.get(recipient)
+
+        if profile is None:
+            yield
+            return
+
+        profile.enable()
+
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def finish_round(self, recipient):
+        """Dumps profile of recipient's round
+
+        Returns:
+          path, seconds (tuple): pstats file and profiled seconds,
+            None if round wasn't profiled
+        """
+        profile = self.profiles.pop(recipient, None)
+
+        if profile is None:
+            return None
+
+        # Keep thread IDs and the like file name safe
+        name = re.sub(r'[^\w-]', '_', str(recipient))
+        path = os.path.join(
+            self.directory,
+            'round-{}-{}-{}.pstats'.format(
+                name,
+                recipient.round,
+                datetime.now().strftime('%Y%m%d-%H%M%S')
+            )
+        )
+
+        stats = pstats.Stats(profile)
+        stats.dump_stats(path)
+
+        return path, stats.total_tt
+
+    def finish(self):
+        """Dumps profiles of every unfinished round
+
+        Returns:
+          results (list): Tuples of pstats file and profiled seconds
+        """
+        return [self.finish_round(recipient)
+                for recipient in list(self.profiles)]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   QUOTA - quota.py
+
+   Spreads a daily API request quota across the bot's
+   designated timespan
+"""
+
+
+# Dependencies
+import math
+# Local dependencies
+from .timehelper import Clock
+
+
+class QuotaBudget:
+    """Spreads a daily API request quota evenly across the designated
+    timespan, so requests remain available until its end
+
+    Usage is counted per designated timespan, keyed by the day it
+    starts on, so a timespan crossing midnight doesn't get a second
+    share of the quota. It's persisted in the image cache and therefore
+    shared with other processes using the same cache file
+
+    Args:
+      cache (ImageCache): Cache to persist today's usage in
+      engine (int): Image engine the quota belongs to
+      daily_limit (int): Requests allowed per day
+      burst (int): Requests allowed ahead of an even spread (3)
+      clock (Clock): Clock to get current time from (Clock())
+    """
+    cache = None
+    engine = None
+    daily_limit = None
+    burst = None
+    clock = None
+    start_datetime = None
+    end_datetime = None
+
+    def __init__(self, cache, engine, daily_limit, burst=3, clock=None):
+        self.cache = cache
+        self.engine = engine
+        self.daily_limit = daily_limit
+        self.burst = burst
+        self.clock = clock or Clock()
+
+    def set_window(self, start_datetime, end_datetime):
+        """Sets designated timespan to spread requests across"""
+        self.start_datetime = start_datetime
+        self.end_datetime = end_datetime
+
+    def get_day(self):
+        """Get day usage is counted on in format YYYY-MM-DD, the one
+        designated timespan starts on or today's without a timespan"""
+        if self.start_datetime is not None:
+            return self.start_datetime.strftime('%Y-%m-%d')
+
+        return self.clock.now().strftime('%Y-%m-%d')
+
+    def get_used(self):
+        """Get number of requests made on usage day"""
+        return self.cache.get_usage(self.engine, self.get_day())
+
+    def get_allowance(self):
+        """Get number of requests allowed to be made by now
+
+        Returns:
+          allowance (int): Requests allowed in total today by now
+        """
+        # No timespan was given, therefore allow the whole quota
+        if self.start_datetime is None or self.end_datetime is None:
+            return self.daily_limit
+
+        timespan_sec = (self.end_datetime - self.start_datetime).total_seconds()
+        passed_sec = (self.clock.now() - self.start_datetime).total_seconds()
+
+        progress = 1
+        if timespan_sec > 0:
+            progress = min(max(passed_sec / timespan_sec, 0), 1)
+
+        return min(
+            self.daily_limit,
+            math.ceil(self.daily_limit * progress) + self.burst
+        )
+
+    def can_spend(self):
+        """Indicates whether a request may be made now without
+        exhausting quota before end of designated timespan"""
+        return self.get_used() < self.get_allowance()
+
+    def spend(self, count=1):
+        """Counts requests made"""
+        self.cache.add_usage(self.engine, self.get_day(), count)
+
+    def exhaust(self):
+        """Marks quota of usage day as used up, e.g. after API refused
+        requests"""
+        self.cache.add_usage(
+            self.engine,
+            self.get_day(),
+            count=0,
+            minimum=self.daily_limit
+        )
+
+    def __str__(self):
+        return '{} of {} used on {}, {} allowed by now'.format(
+            self.get_used(),
+            self.daily_limit,
+            self.get_day(),
+            self.get_allowance()
+        )
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   RECIPIENT - recipient.py
+
+   Holds the round state of a single conversation, which allows
+   one HydraBot instance to serve many threads at once
+"""
+
+
+# Local dependencies
+from .history import SendHistory
+
+
+class Recipient:
+    """Holds the round state of a single conversation
+
+    Args:
+      thread_id (str): Facebook thread ID, None -> users own thread (None)
+      thread_type (ThreadType): Type of thread, None -> ChatBot's default
+    """
+    thread_id = None
+    thread_type = None
+    round = 0
+    round_messages = None
+    round_intervals = None
+    round_started = None
+    round_window = None
+    run_num = 0
+    done = False
+    sent_messages = None
+    sent_images = None
+
+    def __init__(self, thread_id=None, thread_type=None):
+        self.thread_id = thread_id
+        self.thread_type = thread_type
+        self.round_messages = []
+        self.round_intervals = []
+        self.sent_messages = SendHistory()
+        self.sent_images = SendHistory()
+
+    def has_runs_left(self):
+        """Indicates whether messages of current round are left to send"""
+        return self.run_num < len(self.round_intervals)
+
+    # Convert instance to string
+    def __str__(self):
+        return str(self.thread_id) if self.thread_id is not None else 'self'
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   SCHEDULE - schedule.py
+
+   Plans send times for many recipients and days at once, using
+   NumPy and reproducible random streams per recipient
+"""
+
+
+# Dependencies
+import hashlib
+import random
+
+
+class Schedule:
+    """Planned send times of many recipients and days
+
+    Args:
+      recipient_ids (list): Recipient IDs in order of first axis
+      offsets (numpy.ndarray):
+        Seconds after timespan's beginning per recipient, day and
+        message (float32, recipients x days x messages, NaN padded)
+      counts (numpy.ndarray): Messages per recipient and day (int32)
+    """
+    recipient_ids = None
+    offsets = None
+    counts = None
+
+    def __init__(self, recipient_ids, offsets, counts):
+        self.recipient_ids = list(recipient_ids)
+        self.offsets = offsets
+        self.counts = counts
+
+    def get_intervals(self, recipient_index, day):
+        """Get send times of a single round
+
+        Returns:
+          intervals (list): Seconds after timespan's beginning
+        """
+        count = self.counts[recipient_index, day]
+        return self.offsets[recipient_index, day, :count].tolist()
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+
+class SchedulePlanner:
+    """Plans rounds the way HydraBot.calculate_intervals does,
+    for recipients x days in a single pass
+
+    Random numbers come from a counter-based generator keyed by seed,
+    recipient ID, day, message and draw. Every recipient therefore
+    gets its own stream, which doesn't change when other recipients
+    are added or removed, and plans are reproducible from the seed
+
+    Args:
+      seed (int): Seed of random streams, None -> random seed (None)
+    """
+    seed = None
+    numpy = None
+
+    # Draws per message (threshold, sign, base) and per round (ratio)
+    draws = 4
+
+    def __init__(self, seed=None):
+        # NumPy is optional, it's only needed for planning ahead
+        import numpy
+
+        self.numpy = numpy
+        self.seed = seed if seed is not None else random.getrandbits(63)
+
+    def get_keys(self, recipient_ids):
+        """Get 64 bit stream keys of recipients"""
+        return self.numpy.array([
+            int.from_bytes(hashlib.blake2b(
+                '{}:{}'.format(self.seed, recipient_id).encode('utf-8'),
+                digest_size=8
+            ).digest(), 'little')
+            for recipient_id in recipient_ids
+        ], dtype=self.numpy.uint64)
+
+    def get_uniform(self, counters, low=0.0, high=1.0):
+        """Turns unique 64 bit counters into uniform floats (SplitMix64)"""
+        np = self.numpy
+        z = counters + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+
+        # Upper 53 bits make up a double in [0, 1)
+        uniform = (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+        return low + uniform * (high - low)
+
+    def plan(self, recipient_ids, days, timespan_sec,
+             min_message_ratio, max_message_ratio, max_count=None,
+             first_day=0):
+        """Plans rounds of every recipient for several days
+
+        Args:
+          recipient_ids (list): Recipient IDs, e.g. thread IDs
+          days (int): Number of rounds per recipient
+          timespan_sec (float): Length of designated timespan
+          min_message_ratio (float): Minimum messages per hour
+          max_message_ratio (float): Maximum messages per hour
+          max_count (int): Messages per round at most, e.g. pool size (None)
+          first_day (int): Number of first round to plan (0)
+
+        Returns:
+          schedule (Schedule)
+        """
+        np = self.numpy
+        recipient_ids = list(recipient_ids)
+        timespan_hours = timespan_sec / 60 / 60
+
+        # Same cap as HydraBot.round_start
+        if (max_count is not None
+                and timespan_hours * max_message_ratio >= max_count):
+            max_message_ratio = (max_count - 1) / timespan_hours
+
+        # Counter layout: key + day * 2^32 + (message + 1) * draws + draw
+        keys = self.get_keys(recipient_ids)[:, None, None]
+        day_index = np.arange(
+            first_day, first_day + days, dtype=np.uint64
+        )[None, :, None]
+
+        # Messages per round, slot 0 of every day is reserved for it
+        ratio = timespan_hours * self.get_uniform(
+            keys + day_index * np.uint64(1 << 32),
+            min_message_ratio,
+            max_message_ratio
+        )[:, :, 0]
+        counts = np.maximum(np.floor(ratio), 1).astype(np.int32)
+        ratio = np.where(ratio < 1, 1.0, ratio)
+
+        if max_count is not None:
+            counts = np.minimum(counts, max(max_count, 1))
+
+        slots = int(counts.max()) if counts.size else 0
+        message_index = np.arange(slots, dtype=np.uint64)[None, None, :]
+        counters = (keys + day_index * np.uint64(1 << 32)
+                    + (message_index + np.uint64(1)) * np.uint64(self.draws))
+
+        # Same distribution as HydraBot.calculate_intervals
+        average_interval = np.floor(timespan_sec / ratio)[:, :, None]
+        def_interval = (timespan_sec / counts)[:, :, None]
+        interval_treshold = def_interval - average_interval
+
+        random_treshold = self.get_uniform(counters) * interval_treshold
+        sign = np.where(
+            self.get_uniform(counters + np.uint64(1)) < 0.5, -1.0, 1.0
+        )
+        base = average_interval * self.get_uniform(
+            counters + np.uint64(2), 0.4, 1.0
+        )
+
+        intervals = base + random_treshold * sign
+        offsets = np.cumsum(intervals, axis=2).astype(np.float32)
+
+        # Pad beyond each round's message count
+        offsets[np.arange(slots)[None, None, :]
+                >= counts[:, :, None]] = np.nan
+
+        return Schedule(recipient_ids, offsets, counts)
+
+    def plan_round(self, recipient_id, day, timespan_sec,
+                   min_message_ratio, max_message_ratio, max_count=None):
+        """Plans a single round
+
+        Returns:
+          intervals (list): Seconds after round's beginning
+        """
+        schedule = self.plan([recipient_id], 1, timespan_sec,
+                             min_message_ratio, max_message_ratio,
+                             max_count=max_count, first_day=day)
+
+        return schedule.get_intervals(0, 0)
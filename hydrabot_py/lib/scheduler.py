@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   SCHEDULER - scheduler.py
+
+   Provides a priority queue of deadlines, so the recipient
+   being due next can always be retrieved in O(log n)
+"""
+
+
+# Dependencies
+import heapq
+import itertools
+
+
+class Scheduler:
+    """Priority queue of deadlines and the items being due at them
+
+    Items sharing the same deadline are popped in insertion order
+    """
+    queue = None
+    counter = None
+
+    def __init__(self):
+        self.queue = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def push(self, deadline, item):
+        """Schedule item for given deadline"""
+        heapq.heappush(self.queue, (deadline, next(self.counter), item))
+
+    def pop(self):
+        """Removes the item being due next
+
+        Returns:
+          deadline, item (tuple)
+        """
+        deadline, _, item = heapq.heappop(self.queue)
+        return deadline, item
+
+    def next_deadline(self):
+        """Deadline of the item being due next, None if queue is empty"""
+        if not self.queue:
+            return None
+
+        return self.queue[0][0]
+
+    def is_due(self, now):
+        """Indicates whether the next item is due at given time"""
+        deadline = self.next_deadline()
+        return deadline is not None and deadline <= now
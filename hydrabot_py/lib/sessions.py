@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   SESSIONS - sessions.py
+
+   Stores Facebook session cookies of any number of accounts in a
+   single JSON file, so restarts don't require logging in again
+"""
+
+
+# Dependencies
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+# File locks are only available on Unix
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class SessionStore:
+    """JSON file holding one cookie set per account
+
+    The file is always replaced atomically, so a crash while saving
+    never leaves it half written. Bots of different accounts may share
+    it, reading and replacing it is therefore guarded by a lock file.
+    Files of former versions, which held the cookies of a single
+    account, are still read, their session is handed over to the first
+    account asking for one and removed, so no other account uses it
+
+    Args:
+      path (str): Session file, created on first save
+    """
+    path = None
+    lock = None
+
+    # Cookies a logged in session can't do without
+    required_cookies = ('c_user', 'xs')
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        """Locks session file against other threads and processes"""
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+
+            with open(self.path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read(self):
+        """Get every stored session by account"""
+        if not os.path.exists(self.path):
+            return {}
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                sessions = json.load(f)
+        except ValueError:
+            return {}
+
+        # Former single session file, it belongs to whoever asks
+        if not all(isinstance(session, dict)
+                   for session in sessions.values()):
+            return {None: {'cookies': sessions, 'saved': 0}}
+
+        return sessions
+
+    def load(self, account):
+        """Get stored cookies of account, taking over the session of a
+        former single session file if account has none yet
+
+        Args:
+          account (str): Facebook users email
+
+        Returns:
+          session_cookies (dict): Session cookies, None if none are stored
+        """
+        with self.locked():
+            sessions = self.read()
+
+            if self.claim(sessions, account):
+                self.write(sessions)
+
+        session = sessions.get(account)
+
+        return session['cookies'] if session else None
+
+    def save(self, account, session_cookies):
+        """Stores cookies of account, unless they didn't change
+
+        Args:
+          account (str): Facebook users email
+          session_cookies (dict): Session cookies
+
+        Returns:
+          saved (bool): Whether file was written
+        """
+        with self.locked():
+            # Read again, other processes may have saved meanwhile
+            sessions = self.read()
+            self.claim(sessions, account)
+            session = sessions.get(account)
+
+            if session is not None and session['cookies'] == session_cookies:
+                return False
+
+            sessions[account] = {
+                'cookies': session_cookies,
+                'saved': time.time()
+            }
+            self.write(sessions)
+
+        return True
+
+    @staticmethod
+    def claim(sessions, account):
+        """Hands session of a former single session file over to
+        account, unless it has one of its own already
+
+        Returns:
+          claimed (bool): Whether session was handed over
+        """
+        # Former single session belongs to a single account only
+        if account in sessions or None not in sessions:
+            return False
+
+        sessions[account] = sessions.pop(None)
+
+        return True
+
+    def write(self, sessions):
+        """Replaces session file atomically, requires lock to be held"""
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(sessions, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, self.path)
+
+    def has(self, account):
+        """Indicates whether cookies of account are stored or
+        those of a former single session file may be taken over"""
+        with self.locked():
+            sessions = self.read()
+
+        return account in sessions or None in sessions
+
+    @classmethod
+    def is_plausible(cls, session_cookies):
+        """Indicates whether cookies may belong to a logged in session,
+        checked offline so obviously invalid ones aren't sent anywhere"""
+        return bool(session_cookies) and all(
+            session_cookies.get(name) for name in cls.required_cookies
+        )
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   SIMULATION - simulation.py
+
+   Records when message packages would have been sent while
+   simulating, summarizes them to validate timing settings
+"""
+
+
+# Dependencies
+import csv
+from collections import defaultdict
+# Local dependencies
+from .timehelper import TimeHelper
+
+
+class SendTimeline:
+    """Timeline of simulated message packages
+
+    Args:
+      start_time (time): Beginning of designated timespan
+      end_time (time): End of designated timespan
+    """
+    start_time = None
+    end_time = None
+    entries = None
+
+    # Columns of written timeline
+    fields = ('datetime', 'recipient', 'round', 'run', 'types',
+              'in_window', 'text')
+
+    def __init__(self, start_time, end_time):
+        self.start_time = start_time
+        self.end_time = end_time
+        self.entries = []
+
+    def add(self, send_datetime, recipient, chat_messages):
+        """Records a message package
+
+        Args:
+          send_datetime (datetime): Virtual datetime package is sent at
+          recipient (Recipient): Recipient of package
+          chat_messages (list): ChatMessage instances of package
+        """
+        texts = [str(text) for chat_message in chat_messages
+                 for text in chat_message.texts]
+
+        self.entries.append({
+            'datetime': send_datetime,
+            'recipient': str(recipient),
+            'round': recipient.round,
+            'run': recipient.run_num,
+            'types': '+'.join(chat_message.__class__.__name__
+                              for chat_message in chat_messages),
+            'in_window': TimeHelper.is_between(
+                self.start_time, self.end_time, send_datetime.time()
+            ),
+            'text': ' | '.join(texts).replace('\n', ' ')[:80]
+        })
+
+    def write(self, path):
+        """Writes timeline as CSV file"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fields)
+            writer.writeheader()
+
+            for entry in self.entries:
+                writer.writerow(dict(
+                    entry,
+                    datetime=entry['datetime'].isoformat(timespec='seconds')
+                ))
+
+    def summarize(self):
+        """Summarizes timeline per recipient
+
+        Returns:
+          lines (list): Readable summary lines
+        """
+        by_recipient = defaultdict(list)
+
+        for entry in self.entries:
+            by_recipient[entry['recipient']].append(entry)
+
+        lines = ['Simulated {} packages for {} recipient{}'.format(
+            len(self.entries),
+            len(by_recipient),
+            's' if len(by_recipient) != 1 else ''
+        )]
+
+        for recipient, entries in sorted(by_recipient.items()):
+            per_day = defaultdict(int)
+
+            for entry in entries:
+                per_day[entry['datetime'].date()] += 1
+
+            gaps = [(later['datetime'] - earlier['datetime']).total_seconds()
+                    for earlier, later in zip(entries, entries[1:])]
+            outside = sum(not entry['in_window'] for entry in entries)
+
+            lines.append(
+                '{}: {} packages on {} days ({}-{} per day), '
+                'shortest gap {:.0f} min, {} outside timespan'.format(
+                    recipient,
+                    len(entries),
+                    len(per_day),
+                    min(per_day.values()),
+                    max(per_day.values()),
+                    min(gaps) / 60 if gaps else 0,
+                    outside
+                )
+            )
+
+        return lines
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   THREAD CACHE - threadcache.py
+
+   Keeps thread infos fetched from Messenger for a while, so they
+   can be fetched for many threads at once instead of one by one
+"""
+
+
+# Dependencies
+import threading
+import time
+
+
+class ThreadCache:
+    """Thread infos by thread ID, expiring after a while
+
+    Threads added to the cache are fetched along with any other
+    thread whose info is missing, so a single request covers all.
+    Threads which couldn't be fetched are remembered for a while as
+    well and left out of batches meanwhile, as they fail a whole batch
+
+    Args:
+      ttl (float): Seconds until thread infos expire (300)
+    """
+    ttl = None
+    threads = None
+    thread_ids = None
+    failures = None
+    lock = None
+    # Held while fetching, so callers missing threads share a fetch
+    fetch_lock = None
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.threads = {}
+        self.thread_ids = []
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+
+    def add(self, thread_id):
+        """Adds thread to be fetched along with others"""
+        with self.lock:
+            if thread_id not in self.thread_ids:
+                self.thread_ids.append(thread_id)
+
+    def get(self, thread_id):
+        """Get thread info, None if it's missing or expired"""
+        with self.lock:
+            thread, fetched = self.threads.get(thread_id, (None, 0))
+
+        if time.monotonic() - fetched >= self.ttl:
+            return None
+
+        return thread
+
+    def get_failure(self, thread_id):
+        """Get error thread couldn't be fetched with recently, None if
+        it wasn't or the failure expired"""
+        with self.lock:
+            error, failed = self.failures.get(thread_id, (None, 0))
+
+        if time.monotonic() - failed >= self.ttl:
+            return None
+
+        return error
+
+    def get_missing(self, thread_id):
+        """Get thread IDs to fetch along with thread
+
+        Returns:
+          thread_ids (list): Thread itself first, then every added one
+            whose info is missing or expired and which didn't fail
+            recently
+        """
+        with self.lock:
+            thread_ids = list(self.thread_ids)
+
+        return [thread_id] + [
+            other_id for other_id in thread_ids
+            if other_id != thread_id
+            and self.get(other_id) is None
+            and self.get_failure(other_id) is None
+        ]
+
+    def put(self, threads):
+        """Stores fetched thread infos
+
+        Args:
+          threads (dict): fbchat Thread instances by thread ID
+        """
+        fetched = time.monotonic()
+
+        with self.lock:
+            for thread_id, thread in threads.items():
+                self.threads[thread_id] = (thread, fetched)
+                self.failures.pop(thread_id, None)
+
+    def put_failure(self, thread_id, error):
+        """Remembers thread which couldn't be fetched
+
+        Args:
+          thread_id (str): Thread ID
+          error (Exception): Error fetching it failed with
+        """
+        with self.lock:
+            self.failures[thread_id] = (error, time.monotonic())
+
+    def invalidate(self, thread_id):
+        """Forgets thread info, e.g. after changing it"""
+        with self.lock:
+            self.threads.pop(thread_id, None)
@@ -12,7 +12,8 @@
 
 # Dependencies
 import math
-from datetime import datetime, date
+import time
+from datetime import datetime, date, timedelta
 
 
 class TimeHelper:
@@ -56,23 +57,121 @@ class TimeHelper:
         return tuple(times)
 
     @staticmethod
-    def get_start_time_difference_sec(start_datetime, end_datetime):
+    def get_start_time_difference_sec(start_datetime, end_datetime,
+                                      datetime_now=None):
         """Get time passed since start time in seconds
 
         Args:
           start_datetime (datetime)
           end_datetime (datetime)
+          datetime_now (datetime): Current datetime, None -> now (None)
 
         Returns:
           difference_in_sec (int)
         """
         start_difference_sec = 0
-        datetime_now = datetime.now()
+
+        if datetime_now is None:
+            datetime_now = datetime.now()
 
         # Calculate time difference if round was started
         # between designated times
         if (datetime_now > start_datetime
                 and datetime_now < end_datetime):
-            start_difference_sec = TimeHelper.secs_since(start_datetime)
+            start_difference_sec = (
+                datetime_now - start_datetime
+            ).total_seconds()
 
         return start_difference_sec
+
+    @staticmethod
+    def get_window(start_time, end_time, compare_datetime):
+        """Get designated timespan which is either running at or
+        following after given datetime, handles timespans across midnight
+
+        Args:
+          start_time (time)
+          end_time (time)
+          compare_datetime (datetime)
+
+        Returns:
+          start_datetime, end_datetime (tuple)
+        """
+        # Begin with yesterday's timespan as it might still be running
+        start_datetime = datetime.combine(
+            compare_datetime.date() - timedelta(days=1),
+            start_time
+        )
+        end_datetime = datetime.combine(start_datetime.date(), end_time)
+
+        # Time was given across midnight, so we increase end time
+        # by one day
+        if end_datetime < start_datetime:
+            end_datetime += timedelta(days=1)
+
+        # Move forward day by day until timespan hasn't ended yet
+        while end_datetime < compare_datetime:
+            start_datetime += timedelta(days=1)
+            end_datetime += timedelta(days=1)
+
+        return start_datetime, end_datetime
+
+
+class Clock:
+    """Provides current time, deadlines and sleeping
+
+    Deadlines are absolute seconds of a monotonic clock, therefore
+    they neither drift nor jump when the system time is changed
+    """
+
+    def now(self):
+        """Current datetime"""
+        return datetime.now()
+
+    def monotonic(self):
+        """Current seconds of monotonic clock"""
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        """Sleep for given seconds"""
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def deadline_at(self, target_datetime):
+        """Converts datetime to a monotonic deadline"""
+        seconds = (target_datetime - self.now()).total_seconds()
+        return self.monotonic() + seconds
+
+    def datetime_at(self, deadline):
+        """Converts monotonic deadline to a datetime"""
+        seconds = deadline - self.monotonic()
+        return self.now() + timedelta(seconds=seconds)
+
+
+class VirtualClock(Clock):
+    """Clock whose time only passes by sleeping, which happens instantly
+
+    Allows for simulating days of schedules within seconds
+
+    Args:
+      start (datetime): Datetime the clock starts at, None -> now (None)
+    """
+    start = None
+    elapsed = 0.0
+
+    def __init__(self, start=None):
+        self.start = start if start is not None else datetime.now()
+        self.elapsed = 0.0
+
+    def now(self):
+        """Current virtual datetime"""
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+        """Virtual seconds passed since start"""
+        return self.elapsed
+
+    def sleep(self, seconds):
+        """Move time forward without waiting"""
+        if seconds > 0:
+            self.elapsed += seconds
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   ATTACHMENT CACHE TESTS - test_attachmentcache.py
+
+   Expiring, evicting and aliasing cached attachments
+"""
+
+
+# Dependencies
+import os
+import tempfile
+import unittest
+from unittest import mock
+# Local dependencies
+from hydrabot_py.lib.attachmentcache import AttachmentCache
+
+
+class AttachmentCacheTest(unittest.TestCase):
+    """Attachments expire after their TTL, least recently used ones
+    are evicted once the cache is full"""
+
+    def setUp(self):
+        self.now = 1000000.0
+        patcher = mock.patch('hydrabot_py.lib.attachmentcache.time.time',
+                             lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open_cache(self, **kwargs):
+        cache = AttachmentCache(**kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_attachments_expire_after_ttl(self):
+        cache = self.open_cache(ttl=60)
+        cache.put(['url:a', 'sha256:a'], '1', 'image/gif')
+
+        self.now += 59
+        self.assertEqual(cache.get('url:a'), ('1', 'image/gif'))
+
+        # Using an attachment doesn't extend its lifetime
+        self.now += 2
+        self.assertIsNone(cache.get('url:a'))
+        self.assertIsNone(cache.get('sha256:a'))
+
+    def test_least_recently_used_are_evicted(self):
+        cache = self.open_cache(max_size=3)
+
+        for key in 'abc':
+            self.now += 1
+            cache.put(['url:' + key], key, 'image/gif')
+
+        # Use "a", so "b" is the least recently used one
+        self.now += 1
+        cache.get('url:a')
+
+        self.now += 1
+        cache.put(['url:d'], 'd', 'image/gif')
+
+        self.assertIsNone(cache.get('url:b'))
+        for key in 'acd':
+            self.assertEqual(cache.get('url:' + key), (key, 'image/gif'))
+
+    def test_alias_expires_with_original(self):
+        cache = self.open_cache(ttl=60)
+        cache.put(['sha256:a'], '1', 'image/gif')
+
+        self.now += 30
+        cache.alias('url:b', 'sha256:a')
+
+        self.assertEqual(cache.get('url:b'), ('1', 'image/gif'))
+
+        self.now += 31
+        self.assertIsNone(cache.get('url:b'))
+
+    def test_invalidate_forgets_every_key(self):
+        cache = self.open_cache()
+        cache.put(['url:a', 'sha256:a'], '1', 'image/gif')
+        cache.put(['url:b'], '2', 'image/png')
+        cache.invalidate('1')
+
+        self.assertIsNone(cache.get('url:a'))
+        self.assertIsNone(cache.get('sha256:a'))
+        self.assertEqual(cache.get('url:b'), ('2', 'image/png'))
+
+    def test_expired_attachments_are_evicted_on_open(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'attachments.sqlite')
+
+        cache = AttachmentCache(path, ttl=60)
+        cache.put(['url:a'], '1', 'image/gif')
+        cache.close()
+
+        self.now += 61
+        cache = self.open_cache(path=path, ttl=60)
+        row = cache.connection.execute(
+            'SELECT COUNT(*) FROM attachments'
+        ).fetchone()
+
+        self.assertEqual(row[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
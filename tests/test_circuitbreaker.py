@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   CIRCUIT BREAKER TESTS - test_circuitbreaker.py
+
+   Opening, half opening and closing the breaker of failing services
+"""
+
+
+# Dependencies
+import threading
+import unittest
+# Local dependencies
+from hydrabot_py.lib.circuitbreaker import CircuitBreaker
+from hydrabot_py.lib.timehelper import VirtualClock
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """Failing services get a single trial request once in a while"""
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, base_delay=10,
+                                      max_delay=60, clock=self.clock)
+
+    def open_breaker(self):
+        for _ in range(self.breaker.failure_threshold):
+            self.assertTrue(self.breaker.start_request())
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        for _ in range(self.breaker.failure_threshold - 1):
+            self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.get_state(), 'closed')
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.get_state(), 'open')
+        self.assertFalse(self.breaker.start_request())
+
+    def test_half_open_grants_single_trial(self):
+        self.open_breaker()
+        self.clock.sleep(10)
+
+        self.assertEqual(self.breaker.get_state(), 'half open')
+        self.assertTrue(self.breaker.start_request())
+        # Trial is running, everyone else has to wait for it
+        self.assertFalse(self.breaker.start_request())
+        self.assertFalse(self.breaker.allows_request())
+
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.get_state(), 'closed')
+        self.assertTrue(self.breaker.start_request())
+        self.assertTrue(self.breaker.start_request())
+
+    def test_concurrent_callers_get_single_trial(self):
+        self.open_breaker()
+        self.clock.sleep(10)
+
+        barrier = threading.Barrier(8)
+        granted = []
+
+        def claim():
+            barrier.wait()
+            granted.append(self.breaker.start_request())
+
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(granted.count(True), 1)
+
+    def test_failed_trial_reopens_for_longer(self):
+        self.open_breaker()
+        self.clock.sleep(10)
+
+        self.assertTrue(self.breaker.start_request())
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.get_state(), 'open')
+        # Delay doubled, jittered between half and full delay
+        self.assertGreaterEqual(self.breaker.retry_at - self.clock.monotonic(),
+                                10)
+
+    def test_released_trial_lets_another_caller_try(self):
+        self.open_breaker()
+        self.clock.sleep(10)
+
+        self.assertTrue(self.breaker.start_request())
+        self.breaker.release()
+
+        self.assertEqual(self.breaker.get_state(), 'half open')
+        self.assertTrue(self.breaker.start_request())
+
+    def test_delay_is_capped(self):
+        for _ in range(20):
+            self.breaker.record_failure()
+
+        self.assertLessEqual(self.breaker.retry_at - self.clock.monotonic(),
+                             60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   CORPUS TESTS - test_corpus.py
+
+   Sampling messages and reading memory-mapped message files
+"""
+
+
+# Dependencies
+import os
+import tempfile
+import unittest
+# Local dependencies
+from hydrabot_py.lib.corpus import FileCorpus, ListCorpus
+from hydrabot_py.lib.history import SendHistory
+
+
+class SampleTest(unittest.TestCase):
+    """Recently sent messages are only picked if nothing else is left"""
+
+    def setUp(self):
+        self.corpus = ListCorpus(['Message {}'.format(index)
+                                  for index in range(10)])
+
+    def test_avoids_recently_sent_messages(self):
+        history = SendHistory()
+        for index in range(7):
+            history.add('Message {}'.format(index))
+
+        for _ in range(20):
+            texts = {message.text
+                     for message in self.corpus.sample(3, history)}
+
+            self.assertEqual(texts, {'Message 7', 'Message 8', 'Message 9'})
+
+    def test_fills_up_with_recently_sent_messages(self):
+        history = SendHistory()
+        for index in range(9):
+            history.add('Message {}'.format(index))
+
+        texts = [message.text for message in self.corpus.sample(3, history)]
+
+        self.assertEqual(len(set(texts)), 3)
+        self.assertIn('Message 9', texts)
+
+    def test_sample_is_limited_to_corpus(self):
+        self.assertEqual(len(self.corpus.sample(20)), 10)
+
+
+class FileCorpusTest(unittest.TestCase):
+    """Message files keep line breaks and are indexed once"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'messages.txt')
+
+    def open_corpus(self):
+        corpus = FileCorpus(self.path)
+        self.addCleanup(corpus.close)
+        return corpus
+
+    def test_round_trip(self):
+        messages = ['Hi!', 'Two\nlines', 'Back\\slash', 'Tab\there']
+        FileCorpus.write(self.path, messages)
+
+        corpus = self.open_corpus()
+
+        self.assertEqual(len(corpus), 4)
+        self.assertEqual([corpus[index].text for index in range(4)],
+                         messages)
+        with self.assertRaises(IndexError):
+            corpus[4]
+
+    def test_skips_blank_lines(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('One\n\n   \nTwo\r\n')
+
+        corpus = self.open_corpus()
+
+        self.assertEqual([corpus[0].text, corpus[1].text], ['One', 'Two'])
+
+    def test_empty_file_is_rejected(self):
+        FileCorpus.write(self.path, [])
+
+        with self.assertRaises(ValueError):
+            FileCorpus(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
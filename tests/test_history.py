@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   HISTORY TESTS - test_history.py
+
+   Remembering, forgetting and persisting recently sent items
+"""
+
+
+# Dependencies
+import os
+import tempfile
+import unittest
+# Local dependencies
+from hydrabot_py.lib.history import HistoryStore, SendHistory
+
+
+class SendHistoryTest(unittest.TestCase):
+    """History remembers the most recent items only"""
+
+    def test_forgets_oldest_items(self):
+        history = SendHistory(capacity=10)
+
+        for index in range(25):
+            history.add('message {}'.format(index))
+
+        self.assertEqual(len(history), 10)
+        for index in range(15, 25):
+            self.assertIn('message {}'.format(index), history)
+
+        # Bloom filter may err, but not for most forgotten items
+        forgotten = sum('message {}'.format(index) in history
+                        for index in range(15))
+        self.assertLessEqual(forgotten, 1)
+
+    def test_repeated_item_stays_until_last_copy_leaves(self):
+        history = SendHistory(capacity=3)
+
+        for item in ('a', 'a', 'b', 'c'):
+            history.add(item)
+
+        self.assertIn('a', history)
+
+        history.add('d')
+        self.assertNotIn('a', history)
+
+    def test_round_trip(self):
+        history = SendHistory(capacity=5)
+
+        for item in 'abcdefg':
+            history.add(item)
+
+        restored = SendHistory.from_bytes(history.to_bytes(), capacity=5)
+
+        self.assertEqual(len(restored), 5)
+        self.assertEqual(restored.to_bytes(), history.to_bytes())
+
+        # Both forget the same items from here on
+        for history_copy in (history, restored):
+            history_copy.add('h')
+            self.assertNotIn('c', history_copy)
+            self.assertIn('d', history_copy)
+
+    def test_changed_capacity_starts_empty(self):
+        history = SendHistory(capacity=5)
+        history.add('a')
+
+        self.assertEqual(len(SendHistory.from_bytes(history.to_bytes(), 6)),
+                         0)
+        self.assertEqual(len(SendHistory.from_bytes(None, 5)), 0)
+
+
+class HistoryStoreTest(unittest.TestCase):
+    """Histories are kept per conversation and kind"""
+
+    def test_histories_survive_reopening(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'history.sqlite')
+
+        store = HistoryStore(path, capacity=5)
+        history = store.load('a', 'messages')
+        history.add('Hi!')
+        store.save('a', 'messages', history)
+        store.close()
+
+        store = HistoryStore(path, capacity=5)
+        self.addCleanup(store.close)
+
+        self.assertIn('Hi!', store.load('a', 'messages'))
+        self.assertNotIn('Hi!', store.load('a', 'images'))
+        self.assertNotIn('Hi!', store.load('b', 'messages'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   JOURNAL TESTS - test_journal.py
+
+   Replaying, compacting and resuming rounds from the send journal
+"""
+
+
+# Dependencies
+from datetime import datetime, timedelta
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+import unittest
+# Local dependencies
+from hydrabot_py.lib.chatmessages import MessageTemplate
+from hydrabot_py.lib.hydrabot import HydraBot
+from hydrabot_py.lib.journal import SendJournal
+from hydrabot_py.lib.recipient import Recipient
+from hydrabot_py.lib.timehelper import VirtualClock
+
+
+class SendJournalTest(unittest.TestCase):
+    """Journal file survives crashes and stays small"""
+    window = datetime(2026, 1, 1, 8)
+    started = datetime(2026, 1, 1, 9)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'journal.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_journal(self, **kwargs):
+        journal = SendJournal(self.path, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def record_round(self, journal, thread='a', round_num=1):
+        journal.record_round(
+            thread, round_num, self.window, self.started,
+            [60, 120, 180], [MessageTemplate(text) for text in 'xyz']
+        )
+
+    def read_lines(self):
+        with open(self.path, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def test_replay_skips_torn_last_line(self):
+        journal = self.open_journal()
+        self.record_round(journal)
+        journal.record_send('a', 1, 0)
+        journal.record_send('a', 1, 1)
+        journal.close()
+
+        # Crash while the next send was written
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"type": "send", "thread": "a", "ro')
+
+        state = self.open_journal().get('a')
+
+        self.assertEqual(state['sent'], 2)
+        self.assertEqual(state['intervals'], [60, 120, 180])
+        self.assertEqual(state['messages'], ['x', 'y', 'z'])
+
+    def test_replay_ignores_sends_of_earlier_rounds(self):
+        journal = self.open_journal()
+        self.record_round(journal, round_num=1)
+        journal.record_send('a', 1, 2)
+        self.record_round(journal, round_num=2)
+        journal.record_send('a', 1, 0)
+        journal.close()
+
+        state = self.open_journal().get('a')
+
+        self.assertEqual(state['round'], 2)
+        self.assertEqual(state['sent'], 0)
+
+    def test_compaction_keeps_latest_rounds_only(self):
+        journal = self.open_journal(compact_after=6)
+
+        for round_num in (1, 2):
+            self.record_round(journal, 'a', round_num)
+        self.record_round(journal, 'b')
+
+        for run_num in range(3):
+            journal.record_send('a', 2, run_num)
+
+        # One round and one send of "a", one round of "b"
+        records = [json.loads(line) for line in self.read_lines()]
+
+        self.assertEqual(len(records), 3)
+        self.assertEqual(
+            [(record['type'], record['thread']) for record in records],
+            [('round', 'a'), ('send', 'a'), ('round', 'b')]
+        )
+        self.assertEqual(journal.get('a')['sent'], 3)
+
+        # Compacted journal replays to the very same state
+        journal.close()
+        reopened = self.open_journal()
+
+        self.assertEqual(reopened.get('a'), journal.get('a'))
+        self.assertEqual(reopened.get('b'), journal.get('b'))
+        self.assertFalse(os.path.exists(
+            '{}.{}.tmp'.format(self.path, os.getpid())
+        ))
+
+
+class ResumeRoundTest(unittest.TestCase):
+    """Restarted bot continues journaled rounds of current timespan"""
+    window = datetime(2026, 1, 1, 8)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.journal = SendJournal(
+            os.path.join(directory.name, 'journal.jsonl')
+        )
+        self.addCleanup(self.journal.close)
+
+        self.clock = VirtualClock(self.window + timedelta(hours=2))
+        self.bot = SimpleNamespace(journal=self.journal, clock=self.clock,
+                                   start_datetime=self.window)
+
+    def resume_round(self, recipient):
+        return HydraBot.resume_round(self.bot, recipient)
+
+    def test_resumes_after_last_send(self):
+        # Round started an hour ago, two of three packages were sent
+        self.journal.record_round(
+            'a', 4, self.window, self.clock.now() - timedelta(hours=1),
+            [600, 1800, 5400], [MessageTemplate(text) for text in 'xyz']
+        )
+        self.journal.record_send('a', 4, 0)
+        self.journal.record_send('a', 4, 1)
+
+        recipient = Recipient('a')
+
+        self.assertTrue(self.resume_round(recipient))
+        self.assertEqual(recipient.round, 4)
+        self.assertEqual(recipient.run_num, 2)
+        self.assertEqual(recipient.round_intervals, [600, 1800, 5400])
+        self.assertEqual([message.text
+                          for message in recipient.round_messages],
+                         ['x', 'y', 'z'])
+        self.assertFalse(recipient.done)
+
+        # Last package is due half an hour from now
+        deadline = (recipient.round_started
+                    + recipient.round_intervals[recipient.run_num])
+        self.assertAlmostEqual(deadline - self.clock.monotonic(), 1800)
+
+    def test_finished_round_is_done(self):
+        self.journal.record_round('a', 1, self.window, self.clock.now(),
+                                  [60], [MessageTemplate('x')])
+        self.journal.record_send('a', 1, 0)
+
+        recipient = Recipient('a')
+
+        self.assertTrue(self.resume_round(recipient))
+        self.assertTrue(recipient.done)
+
+    def test_round_of_earlier_timespan_is_not_resumed(self):
+        earlier_window = self.window - timedelta(days=1)
+        self.journal.record_round('a', 7, earlier_window, earlier_window,
+                                  [60], [MessageTemplate('x')])
+
+        recipient = Recipient('a')
+
+        self.assertFalse(self.resume_round(recipient))
+        # Rounds keep counting, seeded schedules depend on them
+        self.assertEqual(recipient.round, 7)
+        self.assertEqual(recipient.run_num, 0)
+
+    def test_unknown_thread_is_not_resumed(self):
+        recipient = Recipient('b')
+
+        self.assertFalse(self.resume_round(recipient))
+        self.assertEqual(recipient.round, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
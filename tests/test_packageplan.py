@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   PACKAGE PLAN TESTS - test_packageplan.py
+
+   Coalesced Messenger calls, delays and chat message boundaries
+   of planned message packages
+"""
+
+
+# Dependencies
+import unittest
+# Local dependencies
+from hydrabot_py.lib.chatmessages import (EmojiMessage, ImageMessage,
+                                          MessageImage, TextMessage)
+from hydrabot_py.lib.chatmeta import ChatAction
+from hydrabot_py.lib.packageplan import PackagePlan
+
+
+def get_unplanned_calls(chat_messages):
+    """Counts fbchat calls of sending every part on its own, as done
+    before packages were planned: typing on and off around every text
+    and a sendRemoteFiles call per image"""
+    calls = 0
+
+    for chat_message in chat_messages:
+        for text in chat_message.texts:
+            if isinstance(text, ChatAction):
+                continue
+
+            if (isinstance(text, MessageImage)
+                    or isinstance(chat_message, ImageMessage)):
+                calls += 1
+            else:
+                calls += 3
+
+    return calls
+
+
+def get_unplanned_seconds(chat_messages):
+    """Sums delays of sending every part on its own"""
+    seconds = 0
+
+    for chat_message in chat_messages:
+        seconds += PackagePlan.pause
+
+        for text in chat_message.texts:
+            if isinstance(text, ChatAction):
+                continue
+
+            if isinstance(text, MessageImage):
+                seconds += PackagePlan.pause
+            elif isinstance(chat_message, ImageMessage):
+                seconds += PackagePlan.pause * 2
+            else:
+                seconds += (len(text) * PackagePlan.typing_speed
+                            + PackagePlan.pause)
+
+    return seconds
+
+
+def get_seconds(steps):
+    """Sums delays of planned steps"""
+    return sum(value for kind, value in steps if kind == 'sleep')
+
+
+class PackagePlanTest(unittest.TestCase):
+    """Packages need fewer calls, but take just as long"""
+
+    def test_coalesces_typing_and_images(self):
+        chat_messages = [TextMessage(
+            'One.{{SPLIT}}Two.{{SPLIT}}Three.'
+            '{{IMG:https://a/1.gif}}{{IMG:https://a/2.gif}}'
+        )]
+        plan = PackagePlan(chat_messages)
+
+        # Typing on, three texts, typing off, both images at once
+        self.assertEqual(plan.count_calls(), 6)
+        self.assertEqual(get_unplanned_calls(chat_messages), 11)
+        self.assertEqual(
+            [kind for kind, _ in plan.steps if kind != 'sleep'],
+            ['typing', 'text', 'text', 'text', 'typing', 'images']
+        )
+
+    def test_delays_match_sending_parts_on_their_own(self):
+        chat_messages = [
+            TextMessage('Hi!{{SPLIT}}{{IMG:https://a/1.gif}}'
+                        '{{IMG:https://a/2.gif}}{{DELAY}}Bye'),
+            EmojiMessage('💧💧'),
+            ImageMessage(['https://a/3.gif', 'https://a/4.gif']),
+            TextMessage('Drink!')
+        ]
+        plan = PackagePlan(chat_messages)
+
+        self.assertAlmostEqual(get_seconds(plan.steps),
+                               get_unplanned_seconds(chat_messages))
+
+    def test_images_of_chat_messages_are_kept_apart(self):
+        chat_messages = [ImageMessage('https://a/1.gif'),
+                         ImageMessage('https://a/2.gif')]
+        message_steps = PackagePlan(chat_messages).get_message_steps()
+
+        self.assertEqual(len(message_steps), 2)
+
+        for steps, url in zip(message_steps, ('https://a/1.gif',
+                                              'https://a/2.gif')):
+            self.assertEqual(steps[0], ('sleep', PackagePlan.pause))
+            self.assertIn(('images', [url]), steps)
+            self.assertAlmostEqual(get_seconds(steps),
+                                   PackagePlan.pause * 3)
+
+    def test_typing_stops_within_chat_message_of_last_text(self):
+        chat_messages = [TextMessage('Hi!'),
+                         ImageMessage('https://a/1.gif')]
+        text_steps, image_steps = PackagePlan(
+            chat_messages
+        ).get_message_steps()
+
+        self.assertEqual(text_steps[-3:], [('text', 'Hi!'),
+                                           ('typing', False),
+                                           ('sleep', PackagePlan.pause)])
+        self.assertNotIn(('typing', False), image_steps)
+
+
+if __name__ == '__main__':
+    unittest.main()
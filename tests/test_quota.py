@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   QUOTA TESTS - test_quota.py
+
+   Spreading the daily image search quota across designated timespans
+"""
+
+
+# Dependencies
+from datetime import datetime, time, timedelta
+import unittest
+# Local dependencies
+from hydrabot_py.lib.imagecache import ImageCache
+from hydrabot_py.lib.quota import QuotaBudget
+from hydrabot_py.lib.timehelper import TimeHelper, VirtualClock
+
+
+class QuotaBudgetTest(unittest.TestCase):
+    """Usage is counted once per designated timespan"""
+
+    def setUp(self):
+        self.cache = ImageCache()
+        self.addCleanup(self.cache.close)
+
+        self.clock = VirtualClock(datetime(2026, 1, 1, 21))
+        self.quota = QuotaBudget(self.cache, 1, 100, burst=3,
+                                 clock=self.clock)
+
+    def set_window(self, start_time=time(22), end_time=time(6)):
+        self.quota.set_window(*TimeHelper.get_window(
+            start_time, end_time, self.clock.now()
+        ))
+
+    def test_allowance_grows_across_timespan(self):
+        self.set_window()
+
+        # Only the burst before timespan begins
+        self.assertEqual(self.quota.get_allowance(), 3)
+
+        self.clock.sleep(3 * 60 * 60)
+        self.assertEqual(self.quota.get_allowance(), 28)
+
+        # Never more than the daily limit
+        self.clock.sleep(12 * 60 * 60)
+        self.assertEqual(self.quota.get_allowance(), 100)
+
+    def test_timespan_across_midnight_keeps_its_usage(self):
+        self.set_window()
+        self.clock.sleep(2 * 60 * 60)
+        self.quota.spend(20)
+
+        # Past midnight, still the timespan which began yesterday
+        self.assertEqual(self.quota.get_day(), '2026-01-01')
+        self.assertEqual(self.quota.get_used(), 20)
+        self.assertFalse(self.quota.can_spend())
+
+        # Next timespan starts over
+        self.clock.sleep(20 * 60 * 60)
+        self.set_window()
+
+        self.assertEqual(self.quota.get_day(), '2026-01-02')
+        self.assertEqual(self.quota.get_used(), 0)
+        self.assertTrue(self.quota.can_spend())
+
+    def test_exhausted_quota_blocks_rest_of_timespan(self):
+        self.set_window()
+        self.clock.sleep(7 * 60 * 60)
+        self.quota.exhaust()
+
+        self.assertEqual(self.quota.get_used(), 100)
+        self.assertFalse(self.quota.can_spend())
+
+    def test_usage_is_shared_through_cache(self):
+        self.set_window()
+        other = QuotaBudget(self.cache, 1, 100, clock=self.clock)
+        other.set_window(self.quota.start_datetime,
+                         self.quota.end_datetime)
+        other.spend(2)
+
+        self.assertEqual(self.quota.get_used(), 2)
+
+    def test_whole_quota_without_timespan(self):
+        self.assertEqual(self.quota.get_allowance(), 100)
+        self.assertEqual(self.quota.get_day(), '2026-01-01')
+
+        self.clock.sleep(timedelta(hours=4).total_seconds())
+        self.assertEqual(self.quota.get_day(), '2026-01-02')
+
+
+if __name__ == '__main__':
+    unittest.main()
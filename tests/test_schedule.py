@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   SCHEDULE TESTS - test_schedule.py
+
+   Reproducible schedules planned ahead for many recipients
+"""
+
+
+# Dependencies
+import math
+import unittest
+# Local dependencies
+from hydrabot_py.lib.schedule import SchedulePlanner
+
+
+class SchedulePlannerTest(unittest.TestCase):
+    """Every recipient has its own reproducible random stream"""
+    timespan_sec = 8 * 60 * 60
+
+    def plan(self, planner, recipient_ids, days=3, **kwargs):
+        return planner.plan(recipient_ids, days, self.timespan_sec,
+                            1, 3, **kwargs)
+
+    def test_same_seed_same_schedule(self):
+        first = self.plan(SchedulePlanner(seed=1), ['a', 'b'])
+        second = self.plan(SchedulePlanner(seed=1), ['a', 'b'])
+        other = self.plan(SchedulePlanner(seed=2), ['a', 'b'])
+
+        self.assertEqual(first.get_intervals(0, 1),
+                         second.get_intervals(0, 1))
+        self.assertNotEqual(first.get_intervals(0, 1),
+                            other.get_intervals(0, 1))
+
+    def test_recipients_dont_affect_each_other(self):
+        planner = SchedulePlanner(seed=1)
+        alone = self.plan(planner, ['b'])
+        together = self.plan(planner, ['a', 'b', 'c'])
+
+        for day in range(3):
+            self.assertEqual(alone.get_intervals(0, day),
+                             together.get_intervals(1, day))
+
+    def test_plan_round_matches_plan(self):
+        planner = SchedulePlanner(seed=1)
+        schedule = self.plan(planner, ['a'], days=3)
+
+        self.assertEqual(
+            planner.plan_round('a', 2, self.timespan_sec, 1, 3),
+            schedule.get_intervals(0, 2)
+        )
+
+    def test_counts_and_times(self):
+        schedule = self.plan(SchedulePlanner(seed=1), ['a', 'b'], days=5,
+                             max_count=10)
+
+        for recipient_index in range(2):
+            for day in range(5):
+                intervals = schedule.get_intervals(recipient_index, day)
+
+                self.assertTrue(8 <= len(intervals) <= 10)
+                self.assertEqual(intervals, sorted(intervals))
+                self.assertFalse(any(math.isnan(interval)
+                                     for interval in intervals))
+
+        self.assertEqual(len(schedule), int(schedule.counts.sum()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   SCHEDULER TESTS - test_scheduler.py
+
+   Deadline queue, designated timespans and planned schedules
+"""
+
+
+# Dependencies
+from datetime import datetime, time
+import unittest
+# Local dependencies
+from hydrabot_py.lib.scheduler import Scheduler
+from hydrabot_py.lib.timehelper import TimeHelper, VirtualClock
+
+
+class SchedulerTest(unittest.TestCase):
+    """Items are popped by deadline, then in insertion order"""
+
+    def test_pops_by_deadline_then_insertion(self):
+        scheduler = Scheduler()
+
+        for deadline, item in ((30, 'c'), (10, 'a'), (30, 'd'), (10, 'b')):
+            scheduler.push(deadline, item)
+
+        self.assertEqual(scheduler.next_deadline(), 10)
+        self.assertEqual([scheduler.pop() for _ in range(len(scheduler))],
+                         [(10, 'a'), (10, 'b'), (30, 'c'), (30, 'd')])
+        self.assertIsNone(scheduler.next_deadline())
+
+    def test_is_due(self):
+        scheduler = Scheduler()
+
+        self.assertFalse(scheduler.is_due(100))
+
+        scheduler.push(50, 'a')
+
+        self.assertFalse(scheduler.is_due(49))
+        self.assertTrue(scheduler.is_due(50))
+
+
+class GetWindowTest(unittest.TestCase):
+    """Running timespan is preferred over the next one"""
+
+    def get_window(self, start_time, end_time, compare_datetime):
+        return TimeHelper.get_window(start_time, end_time, compare_datetime)
+
+    def test_running_and_next_timespan(self):
+        self.assertEqual(
+            self.get_window(time(8), time(20), datetime(2026, 1, 1, 12)),
+            (datetime(2026, 1, 1, 8), datetime(2026, 1, 1, 20))
+        )
+        self.assertEqual(
+            self.get_window(time(8), time(20), datetime(2026, 1, 1, 21)),
+            (datetime(2026, 1, 2, 8), datetime(2026, 1, 2, 20))
+        )
+
+    def test_timespan_across_midnight(self):
+        # Still running after midnight
+        self.assertEqual(
+            self.get_window(time(22), time(6), datetime(2026, 1, 2, 3)),
+            (datetime(2026, 1, 1, 22), datetime(2026, 1, 2, 6))
+        )
+        # Ended in the morning, tonight's is next
+        self.assertEqual(
+            self.get_window(time(22), time(6), datetime(2026, 1, 2, 7)),
+            (datetime(2026, 1, 2, 22), datetime(2026, 1, 3, 6))
+        )
+
+
+class VirtualClockTest(unittest.TestCase):
+    """Virtual time only passes by sleeping"""
+
+    def test_deadlines_follow_virtual_time(self):
+        clock = VirtualClock(datetime(2026, 1, 1))
+        deadline = clock.deadline_at(datetime(2026, 1, 1, 1))
+
+        self.assertEqual(deadline, 3600)
+
+        clock.sleep(3600)
+
+        self.assertEqual(clock.now(), datetime(2026, 1, 1, 1))
+        self.assertEqual(clock.datetime_at(deadline), clock.now())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   SESSION TESTS - test_sessions.py
+
+   Storing session cookies of several accounts in a shared file
+"""
+
+
+# Dependencies
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+# Local dependencies
+from hydrabot_py.lib import sessions
+from hydrabot_py.lib.sessions import SessionStore
+
+
+def save_sessions(path, account, count):
+    """Saves changing cookies of account, run by worker processes"""
+    store = SessionStore(path)
+
+    for index in range(count):
+        store.save(account, {'c_user': account, 'xs': str(index)})
+
+
+class SessionStoreTest(unittest.TestCase):
+    """Accounts keep their own sessions, file is never half written"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(directory.name, 'session.json')
+
+    def read_file(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_legacy_file(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'c_user': '1', 'xs': 'legacy'}, f)
+
+    def test_accounts_keep_own_sessions(self):
+        store = SessionStore(self.path)
+
+        self.assertTrue(store.save('a', {'c_user': '1', 'xs': 'a'}))
+        self.assertTrue(store.save('b', {'c_user': '2', 'xs': 'b'}))
+        # Unchanged cookies aren't written again
+        self.assertFalse(store.save('a', {'c_user': '1', 'xs': 'a'}))
+
+        store = SessionStore(self.path)
+
+        self.assertEqual(store.load('a'), {'c_user': '1', 'xs': 'a'})
+        self.assertEqual(store.load('b'), {'c_user': '2', 'xs': 'b'})
+        self.assertIsNone(store.load('c'))
+        self.assertFalse(store.has('c'))
+
+    def test_legacy_session_is_handed_over_once(self):
+        self.write_legacy_file()
+        store = SessionStore(self.path)
+
+        self.assertTrue(store.has('a'))
+        self.assertEqual(store.load('a'), {'c_user': '1', 'xs': 'legacy'})
+        self.assertEqual(list(self.read_file()), ['a'])
+
+        # Another account doesn't get the same session
+        self.assertFalse(store.has('b'))
+        self.assertIsNone(store.load('b'))
+        self.assertEqual(store.load('a'), {'c_user': '1', 'xs': 'legacy'})
+
+    def test_saving_replaces_legacy_session(self):
+        self.write_legacy_file()
+        store = SessionStore(self.path)
+        store.save('a', {'c_user': '1', 'xs': 'new'})
+
+        self.assertEqual(list(self.read_file()), ['a'])
+        self.assertIsNone(store.load('b'))
+
+    def test_file_is_replaced_atomically(self):
+        store = SessionStore(self.path)
+        store.save('a', {'c_user': '1', 'xs': 'a'})
+        inode = os.stat(self.path).st_ino
+
+        store.save('a', {'c_user': '1', 'xs': 'b'})
+
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        self.assertFalse(any(name.endswith('.tmp')
+                             for name in os.listdir(self.directory)))
+
+    def test_broken_file_reads_as_empty(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"a": {"cook')
+
+        store = SessionStore(self.path)
+
+        self.assertIsNone(store.load('a'))
+        self.assertTrue(store.save('a', {'c_user': '1', 'xs': 'a'}))
+        self.assertEqual(store.load('a'), {'c_user': '1', 'xs': 'a'})
+
+    @unittest.skipIf(sessions.fcntl is None, 'File locks require Unix')
+    def test_concurrent_processes_dont_lose_sessions(self):
+        context = multiprocessing.get_context('spawn')
+        accounts = ['account{}'.format(index) for index in range(6)]
+        processes = [
+            context.Process(target=save_sessions,
+                            args=(self.path, account, 10))
+            for account in accounts
+        ]
+
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        stored = self.read_file()
+
+        self.assertEqual(sorted(stored), accounts)
+        for account in accounts:
+            self.assertEqual(stored[account]['cookies']['xs'], '9')
+
+    def test_is_plausible(self):
+        self.assertTrue(SessionStore.is_plausible({'c_user': '1',
+                                                   'xs': 'a'}))
+        self.assertFalse(SessionStore.is_plausible({'c_user': '1'}))
+        self.assertFalse(SessionStore.is_plausible({'c_user': '1',
+                                                    'xs': ''}))
+        self.assertFalse(SessionStore.is_plausible(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
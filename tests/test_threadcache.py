@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+   THREAD CACHE TESTS - test_threadcache.py
+
+   Batched, shared and failed fetches of thread infos
+"""
+
+
+# Dependencies
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+from fbchat import FBchatException
+# Local dependencies
+from hydrabot_py.lib.chatbot import ChatBot
+from hydrabot_py.lib.threadcache import ThreadCache
+
+
+class FetchingChatBot(ChatBot):
+    """ChatBot which doesn't log in and fetches made up threads,
+    except those which are inaccessible"""
+
+    def __init__(self, inaccessible=()):
+        self.thread_id = 'a'
+        self.thread_type = None
+        self.thread_cache = ThreadCache(ttl=60)
+        self.inaccessible = set(inaccessible)
+        self.requests = []
+
+    def fetchThreadInfo(self, *thread_ids):
+        self.requests.append(thread_ids)
+
+        if self.inaccessible.intersection(thread_ids):
+            raise FBchatException('Thread is inaccessible')
+
+        return {thread_id: SimpleNamespace(uid=thread_id)
+                for thread_id in thread_ids}
+
+
+class ThreadCacheTest(unittest.TestCase):
+    """Inaccessible threads neither fail batches nor get requested
+    again until their failure expires"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('hydrabot_py.lib.threadcache.time.monotonic',
+                             lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bot = FetchingChatBot(inaccessible=['bad'])
+
+        for thread_id in ('a', 'b', 'bad', 'c'):
+            self.bot.thread_cache.add(thread_id)
+
+    def test_added_threads_are_fetched_together(self):
+        self.bot.inaccessible.clear()
+        self.bot.get_thread_info('a')
+
+        self.assertEqual(self.bot.requests, [('a', 'b', 'bad', 'c')])
+
+        # Others are cached now
+        self.bot.get_thread_info('c')
+
+        self.assertEqual(len(self.bot.requests), 1)
+
+    def test_inaccessible_thread_is_left_out_of_batches(self):
+        thread = self.bot.get_thread_info('a')
+
+        self.assertEqual(thread.uid, 'a')
+        for thread_id in ('b', 'c'):
+            self.assertIsNotNone(self.bot.thread_cache.get(thread_id))
+
+        # Expire cached threads, failure is remembered just as long
+        self.now += 30
+        self.bot.thread_cache.invalidate('a')
+        self.bot.requests.clear()
+        self.bot.get_thread_info('a')
+
+        self.assertEqual(self.bot.requests, [('a',)])
+
+    def test_failed_thread_isnt_requested_again(self):
+        with self.assertRaises(FBchatException):
+            self.bot.get_thread_info('bad')
+
+        self.bot.requests.clear()
+
+        # Cached error is raised without another request
+        with self.assertRaises(FBchatException):
+            self.bot.get_thread_info('bad')
+
+        self.assertEqual(self.bot.requests, [])
+
+    def test_failure_expires_after_ttl(self):
+        with self.assertRaises(FBchatException):
+            self.bot.get_thread_info('bad')
+
+        self.now += 60
+        self.bot.inaccessible.clear()
+        self.bot.requests.clear()
+
+        self.assertEqual(self.bot.get_thread_info('bad').uid, 'bad')
+        self.assertEqual(self.bot.requests[0][0], 'bad')
+        self.assertIsNone(self.bot.thread_cache.get_failure('bad'))
+
+
+if __name__ == '__main__':
+    unittest.main()